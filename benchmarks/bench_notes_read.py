@@ -0,0 +1,97 @@
+"""
+Benchmark the memory-mapped notes readers on a large synthetic notes file.
+
+Generates a notes file of the requested size (one block per minute of
+synthetic time), then times reading the last N notes, a one-day range in
+the middle of the file, and a naive whole-file read for comparison. Peak
+RSS is reported to show memory stays flat for the mmap readers.
+
+    python benchmarks/bench_notes_read.py --size-mb 300
+"""
+import argparse
+import datetime
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import ruby_notes  # noqa: E402
+
+START = datetime.datetime(2020, 1, 1)
+
+
+def generate(path, size_mb):
+    """Write synthetic notes until the file reaches `size_mb`; return the block count."""
+    target = size_mb * 1024 * 1024
+    body = "Synthetic note about groceries, meetings and reminders. " * 3
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while f.tell() < target:
+            when = START + datetime.timedelta(minutes=count)
+            f.write(ruby_notes.format_note(f"#{count} {body}", when))
+            count += 1
+    return count
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, round((time.perf_counter() - started) * 1000, 3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=300, help="size of the synthetic notes file")
+    parser.add_argument("--path", help="reuse/write the notes file here instead of a temp file")
+    parser.add_argument("--last", type=int, default=10, help="number of notes for the tail read")
+    parser.add_argument("--naive", action="store_true", help="also time reading the whole file")
+    args = parser.parse_args(argv)
+
+    if args.path:
+        return run(args.path, args)
+    # The synthetic file is hundreds of MB; never leave it behind in /tmp
+    with tempfile.TemporaryDirectory(prefix="ruby-notes-") as scratch:
+        return run(os.path.join(scratch, "notes.txt"), args)
+
+
+def run(path, args):
+    if not (args.path and os.path.exists(path)):
+        blocks, gen_ms = timed(lambda: generate(path, args.size_mb))
+        print(f"generated {blocks} notes ({os.path.getsize(path) / 2**20:.0f} MB) in {gen_ms / 1000:.1f}s",
+              file=sys.stderr)
+    rss_before = peak_rss_mb()
+
+    results = {"file_mb": round(os.path.getsize(path) / 2**20, 1)}
+    last, results["last_ms"] = timed(lambda: list(ruby_notes.iter_last_notes(path, args.last)))
+    results["last_count"] = len(last)
+
+    newest = last[0].timestamp if last else START.strftime(ruby_notes.TIMESTAMP_FORMAT)
+    middle = START + (datetime.datetime.strptime(newest, ruby_notes.TIMESTAMP_FORMAT) - START) / 2
+    day = middle.date().isoformat()
+    in_range, results["range_ms"] = timed(lambda: sum(1 for _ in ruby_notes.iter_notes_between(path, day, day)))
+    results["range_count"] = in_range
+    results["mmap_peak_rss_growth_mb"] = round(peak_rss_mb() - rss_before, 1)
+
+    if args.naive:
+        def naive():
+            with open(path, "r", encoding="utf-8") as f:
+                return len(list(ruby_notes.parse_blocks(f.read().encode("utf-8"))))
+        _, results["naive_full_read_ms"] = timed(naive)
+        results["naive_peak_rss_growth_mb"] = round(peak_rss_mb() - rss_before, 1)
+
+    print(json.dumps(results, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    main()
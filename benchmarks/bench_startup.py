@@ -0,0 +1,127 @@
+"""
+Benchmark Ruby's time-to-first-prompt and fail if it regresses.
+
+Starts `ruby.py` under `python -X importtime` several times, measures how
+long it takes until the "You: " prompt is shown, and reports the slowest
+imports of the last run. Both startup paths are timed: the default one,
+which prewarms the classifier model in the background, and the one with
+RUBY_PREWARM=0. The run fails (exit status 1) when either median exceeds
+`--budget-ms`, or when a module that should only be imported on first use
+(the model client, asyncio, psutil, numpy) was loaded before the prompt
+appeared with prewarming off.
+
+    python benchmarks/bench_startup.py --runs 5 --budget-ms 500
+    python benchmarks/bench_startup.py --prewarm on
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Modules that must stay off the startup path. pyttsx3 is not listed: the
+# speech worker thread opens it in the background to speak the greeting.
+DEFERRED_MODULES = ("llm_client", "asyncio", "ollama", "psutil", "numpy")
+
+PROMPT = b"You: "
+
+
+def parse_importtime(text):
+    """Return [(module, self_us, cumulative_us)] from `-X importtime` output."""
+    rows = []
+    for line in text.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue  # the header line
+        rows.append((fields[2].strip(), self_us, cumulative_us))
+    return rows
+
+
+def time_to_prompt(python=sys.executable, script="ruby.py", timeout=30.0, prewarm=True):
+    """Run `script` once; return (seconds until the prompt, importtime rows).
+
+    With `prewarm` the model prewarm thread runs as it does by default, and
+    imports llm_client and asyncio in the background on purpose.
+    """
+    with tempfile.TemporaryDirectory(prefix="ruby-startup-") as cache_dir, tempfile.TemporaryFile() as stderr:
+        env = dict(os.environ, RUBY_CACHE_DIR=cache_dir, RUBY_PREWARM="1" if prewarm else "0")
+        started = time.perf_counter()
+        proc = subprocess.Popen(
+            [python, "-X", "importtime", script], cwd=ROOT, env=env,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr,
+        )
+        output = b""
+        try:
+            while PROMPT not in output:
+                chunk = os.read(proc.stdout.fileno(), 4096)
+                if not chunk or time.perf_counter() - started > timeout:
+                    raise RuntimeError(f"{script} exited or stalled before prompting: {output[-200:]!r}")
+                output += chunk
+            elapsed = time.perf_counter() - started
+        finally:
+            proc.kill()
+            proc.wait()
+            proc.stdin.close()
+            proc.stdout.close()
+        stderr.seek(0)
+        rows = parse_importtime(stderr.read().decode("utf-8", "replace"))
+    return elapsed, rows
+
+
+def measure(args, prewarm):
+    """Time `args.runs` cold starts with prewarming on or off."""
+    timings = []
+    rows = []
+    for _ in range(args.runs):
+        elapsed, rows = time_to_prompt(prewarm=prewarm)
+        timings.append(elapsed * 1000)
+
+    # Imports that ran before the prompt only; the background speech and
+    # plugin threads may still add a few after it. The prewarm thread loads
+    # the model client by design, so eager imports are only judged without it
+    imported = {name for name, _, _ in rows}
+    early = [] if prewarm else sorted(m for m in DEFERRED_MODULES if m in imported)
+    median = statistics.median(timings)
+    return {
+        "median_ms": round(median, 1),
+        "min_ms": round(min(timings), 1),
+        "max_ms": round(max(timings), 1),
+        "import_total_ms": round(sum(s for _, s, _ in rows) / 1000, 1),
+        "slowest_imports": [
+            {"module": name, "cumulative_ms": round(cum / 1000, 2)}
+            for name, _, cum in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]
+        ],
+        "eager_imports": early,
+        "ok": median <= args.budget_ms and not early,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="number of cold starts to time")
+    parser.add_argument("--budget-ms", type=float, default=500.0, help="fail if the median exceeds this")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--prewarm", choices=["on", "off", "both"], default="both",
+                        help="which startup path(s) to time")
+    args = parser.parse_args(argv)
+
+    settings = ["on", "off"] if args.prewarm == "both" else [args.prewarm]
+    report = {"runs": args.runs, "budget_ms": args.budget_ms, "prewarm": {}}
+    for setting in settings:
+        report["prewarm"][setting] = measure(args, prewarm=setting == "on")
+    report["ok"] = all(r["ok"] for r in report["prewarm"].values())
+    print(json.dumps(report, indent=2))
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
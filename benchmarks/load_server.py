@@ -0,0 +1,187 @@
+"""
+Load generator for Ruby's server mode (`python ruby.py --serve`).
+
+Runs many concurrent clients, each with its own session and keep-alive
+connection, replaying short conversations (including a multi-step one
+that answers a prompt), and reports throughput and per-turn latency
+percentiles as JSON along with the server's own /v1/stats.
+
+Against a running server:
+
+    python benchmarks/load_server.py --url 127.0.0.1:8765 --clients 16 --turns 50
+    python benchmarks/load_server.py --socket /tmp/ruby.sock
+
+Without --url or --socket an in-process server is started (in a scratch
+directory, never asking a model). --stub-latency-ms instead lets it ask
+the local stub model for unmatched utterances, with that much latency.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from run_benchmarks import ROOT, summarize
+
+# Conversations a client cycles through; every utterance after the first
+# answers the prompt the previous one raised. Read-only commands only, so
+# a run against a real server changes nothing.
+CONVERSATIONS = [
+    ["what time is it"],
+    ["list timers"],
+    ["cancel timer", "tea"],
+    ["please search my notes", "groceries"],
+    ["sing me a song about the sea"],
+]
+
+
+class Client:
+    """One HTTP/1.1 keep-alive connection to the server."""
+
+    def __init__(self, host=None, port=None, path=None):
+        self.host, self.port, self.path = host, port, path
+        self.reader = self.writer = None
+
+    async def connect(self):
+        if self.path:
+            self.reader, self.writer = await asyncio.open_unix_connection(self.path)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        head = (f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n")
+        self.writer.write(head.encode("latin-1") + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split(b" ", 2)[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        data = await self.reader.readexactly(length) if length else b"{}"
+        return status, json.loads(data)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def run_client(target, turns, latencies, errors):
+    client = Client(**target)
+    await client.connect()
+    try:
+        _, opened = await client.request("POST", "/v1/sessions")
+        session = opened["session"]
+        done = 0
+        while done < turns:
+            for utterance in CONVERSATIONS[done % len(CONVERSATIONS)]:
+                started = time.perf_counter()
+                status, result = await client.request("POST", "/v1/turn", {"session": session, "text": utterance})
+                latencies.append((time.perf_counter() - started) * 1000)
+                if status != 200 or "error" in result:
+                    errors.append(result.get("error", status))
+                done += 1
+                if done >= turns:
+                    break
+        await client.request("DELETE", f"/v1/sessions/{session}")
+    finally:
+        client.close()
+
+
+async def run_load(target, clients, turns):
+    latencies, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*[run_client(target, turns, latencies, errors) for _ in range(clients)])
+    elapsed = time.perf_counter() - started
+    stats_client = Client(**target)
+    await stats_client.connect()
+    try:
+        _, server_stats = await stats_client.request("GET", "/v1/stats")
+    finally:
+        stats_client.close()
+    return {
+        "clients": clients,
+        "turns": len(latencies),
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "turns_per_second": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": summarize(latencies) if latencies else {},
+        "server": server_stats,
+    }
+
+
+def start_local_server(use_llama):
+    """Run a RubyServer on its own loop thread; returns (host, port)."""
+    sys.path.insert(0, ROOT)
+    import ruby_server
+    import ruby_speech
+
+    ruby_speech.use_backends([ruby_speech.NullBackend()])
+    # Commands like search_notes read notes.txt from the working directory
+    os.chdir(tempfile.mkdtemp(prefix="ruby-load-"))
+    loop = asyncio.new_event_loop()
+    server = ruby_server.RubyServer(use_llama=use_llama, budget=2.0)
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start(port=0))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="ruby-load-server", daemon=True).start()
+    ready.wait()
+    return server.address[:2]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", metavar="HOST:PORT", help="server to load (default: start one in-process)")
+    parser.add_argument("--socket", metavar="PATH", help="load a server listening on this Unix socket")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--turns", type=int, default=40, help="turns per client")
+    parser.add_argument("--stub-latency-ms", type=float,
+                        help="with an in-process server, classify unmatched utterances with the stub model")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    stub = None
+    if args.socket:
+        target = {"path": args.socket}
+    elif args.url:
+        host, _, port = args.url.rpartition(":")
+        target = {"host": host or "127.0.0.1", "port": int(port)}
+    else:
+        use_llama = args.stub_latency_ms is not None
+        if use_llama:
+            import llm_client
+            from ollama_stub import OllamaStub
+
+            stub = OllamaStub(reply='{"command": "get_time"}', latency=args.stub_latency_ms / 1000).start()
+            llm_client._default_client = llm_client.AsyncLlamaClient(host=stub.url)
+        host, port = start_local_server(use_llama)
+        target = {"host": host, "port": port}
+
+    try:
+        report = asyncio.run(run_load(target, args.clients, args.turns))
+    finally:
+        if stub is not None:
+            stub.stop()
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+"""
+Offline benchmark suite for Ruby's hot paths.
+
+Times command matching (keyword hit, miss, and a keymap with many extra
+commands), `query_llama` and the constrained `classify_llama` against
+the local stub model server with a configurable latency, `ruby_speak`
+through a silent backend, `get_system_info`, and appending to / reading
+back a notes file. Nothing needs a network, a model or a speech engine.
+
+Each case reports percentiles in milliseconds as JSON. Save a run with
+`--output baseline.json`, then compare later runs against it:
+
+    python benchmarks/run_benchmarks.py --output baseline.json
+    python benchmarks/run_benchmarks.py --baseline baseline.json
+
+With `--baseline`, a case regresses when its p50 or p95 is more than
+`--tolerance` (default 25%) slower than the baseline's, and the exit
+status is 1 if any case regressed.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+# Keep caches and notes indexes out of the real home directory
+os.environ.setdefault("RUBY_CACHE_DIR", tempfile.mkdtemp(prefix="ruby-bench-"))
+
+import llm_client  # noqa: E402
+import ruby_keymap  # noqa: E402
+import ruby_notes  # noqa: E402
+import ruby_speech  # noqa: E402
+import ruby_tools  # noqa: E402
+from ollama_stub import OllamaStub  # noqa: E402
+from ruby_stats import percentile  # noqa: E402
+from ruby_commands import registry  # noqa: E402
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def summarize(samples_ms):
+    ordered = sorted(samples_ms)
+    summary = {"n": len(ordered), "mean": sum(ordered) / len(ordered), "min": ordered[0], "max": ordered[-1]}
+    for q in PERCENTILES:
+        summary[f"p{q}"] = percentile(ordered, q)
+    return {k: (round(v, 4) if isinstance(v, float) else v) for k, v in summary.items()}
+
+
+def measure(fn, iterations, warmup=3):
+    """Call `fn` `warmup` times untimed, then return per-call timings in ms."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+# -- cases ---------------------------------------------------------------
+# Each case takes the parsed arguments and returns per-call timings.
+
+def bench_match_hit(args):
+    return measure(lambda: ruby_keymap.match_command("please take a note", use_llama=False), args.iterations)
+
+
+def bench_match_miss(args):
+    # Runs every local tier (index, n-gram classifier, substring check)
+    return measure(lambda: ruby_keymap.match_command("sing me a song about the sea", use_llama=False),
+                   args.iterations)
+
+
+def bench_match_many(args):
+    names = [f"custom_command_{i}" for i in range(args.extra_commands)]
+    for i, name in enumerate(names):
+        registry.register(name, [f"custom phrase {i}", f"do thing number {i}"], lambda: None)
+    try:
+        texts = ["please do thing number 7", "sing me a song about the sea"]
+        return measure(lambda: [ruby_keymap.match_command(t, use_llama=False) for t in texts], args.iterations)
+    finally:
+        for name in names:
+            registry.unregister(name)
+
+
+def bench_query_llama(args):
+    previous = llm_client._default_client
+    with OllamaStub(reply="get_time", latency=args.model_latency_ms / 1000) as stub:
+        llm_client._default_client = llm_client.AsyncLlamaClient(host=stub.url)
+        try:
+            return measure(lambda: llm_client.query_llama("what time is it"), args.model_iterations, warmup=1)
+        finally:
+            llm_client.run_sync(llm_client._default_client.close())
+            llm_client._default_client = previous
+
+
+def bench_classify_llama(args):
+    # A server that rambles without `format`; the constrained call caps it
+    previous = llm_client._default_client
+    reply = lambda body: '{"command": "get_time"}' if body.get("format") else "The command is get_time. " * 10
+    with OllamaStub(reply=reply, latency=args.model_latency_ms / 1000, token_latency=0.0005) as stub:
+        llm_client._default_client = llm_client.AsyncLlamaClient(host=stub.url)
+        try:
+            return measure(lambda: llm_client.classify_llama("what time is it", ["get_time", "take_note"]),
+                           args.model_iterations, warmup=1)
+        finally:
+            llm_client.run_sync(llm_client._default_client.close())
+            llm_client._default_client = previous
+
+
+def bench_ruby_speak(args):
+    worker = ruby_speech.SpeechWorker(backends=[ruby_speech.NullBackend()])
+    previous = ruby_speech._default_worker
+    ruby_speech._default_worker = worker
+    try:
+        return measure(lambda: ruby_tools.ruby_speak("Note saved.| Anything else?"), args.iterations)
+    finally:
+        ruby_speech._default_worker = previous
+        worker.shutdown(1)
+
+
+def bench_system_info(args):
+    return measure(ruby_tools.get_system_info, args.iterations)
+
+
+def bench_notes_append(args):
+    store = ruby_notes.NotesStore(os.path.join(tempfile.mkdtemp(prefix="ruby-bench-notes-"), "notes.txt"))
+    counter = iter(range(10 ** 9))
+    return measure(lambda: store.append(f"benchmark note {next(counter)} about groceries"), args.iterations)
+
+
+def bench_notes_read(args):
+    store = ruby_notes.NotesStore(os.path.join(tempfile.mkdtemp(prefix="ruby-bench-notes-"), "notes.txt"))
+    for i in range(args.notes):
+        store.append(f"benchmark note {i} about groceries and meetings")
+    return measure(lambda: store.last(3), args.iterations)
+
+
+CASES = {
+    "match_command.hit": bench_match_hit,
+    "match_command.miss": bench_match_miss,
+    "match_command.many_commands": bench_match_many,
+    "query_llama.stub": bench_query_llama,
+    "classify_llama.stub": bench_classify_llama,
+    "ruby_speak.null_backend": bench_ruby_speak,
+    "get_system_info": bench_system_info,
+    "notes.append": bench_notes_append,
+    "notes.read_last": bench_notes_read,
+}
+
+
+def run(args):
+    names = [n for n in CASES if not args.cases or any(n.startswith(c) for c in args.cases)]
+    results = {}
+    for name in names:
+        results[name] = summarize(CASES[name](args))
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "model_latency_ms": args.model_latency_ms,
+            "extra_commands": args.extra_commands,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance=0.25, floor_ms=0.005):
+    """Compare two runs case by case.
+
+    Returns {case: {"metric": ..., "baseline": ..., "current": ..., "ratio": ...,
+    "regressed": bool}} for every case present in both. Differences under
+    `floor_ms` are treated as noise.
+    """
+    report = {}
+    for name, now in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        worst = None
+        for metric in ("p50", "p95"):
+            if metric not in before or metric not in now:
+                continue
+            ratio = now[metric] / before[metric] if before[metric] else float("inf")
+            regressed = now[metric] - before[metric] > floor_ms and ratio > 1 + tolerance
+            entry = {"metric": metric, "baseline": before[metric], "current": now[metric],
+                     "ratio": round(ratio, 3), "regressed": regressed}
+            if worst is None or (regressed, ratio) > (worst["regressed"], worst["ratio"]):
+                worst = entry
+        if worst is not None:
+            report[name] = worst
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=500, help="timed calls per local case")
+    parser.add_argument("--model-iterations", type=int, default=50, help="timed calls against the stub model")
+    parser.add_argument("--model-latency-ms", type=float, default=20.0, help="latency injected by the stub model")
+    parser.add_argument("--extra-commands", type=int, default=500, help="commands added for the many-commands case")
+    parser.add_argument("--notes", type=int, default=2000, help="notes written before timing reads")
+    parser.add_argument("--cases", nargs="*", help="only run cases whose name starts with one of these")
+    parser.add_argument("--output", help="also write the JSON results to this file (e.g. a new baseline)")
+    parser.add_argument("--baseline", help="compare against a previously saved run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging, as a fraction")
+    args = parser.parse_args(argv)
+
+    current = run(args)
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            comparison = compare(current, json.load(f), args.tolerance)
+        current["comparison"] = comparison
+        current["regressions"] = sorted(n for n, c in comparison.items() if c["regressed"])
+        status = 1 if current["regressions"] else 0
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+    print(json.dumps(current, indent=2))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
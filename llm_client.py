@@ -1,40 +1,723 @@
+import asyncio
+import json
 import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from ruby_stats import percentile
+
+# Where the Ollama server listens unless OLLAMA_HOST says otherwise
+DEFAULT_HOST = "http://127.0.0.1:11434"
+
+# How long the server should keep a model loaded after each request
+# (Ollama's `keep_alive`: "30m", "1h", seconds, or -1 for forever);
+# RUBY_KEEP_ALIVE overrides it
+KEEP_ALIVE_ENV = "RUBY_KEEP_ALIVE"
+DEFAULT_KEEP_ALIVE = "30m"
+
+# A reported load_duration above this means the model had to be loaded
+# (a resident model still reports a few ms)
+LOADED_THRESHOLD_MS = 50.0
+
+# Generation cap for classification replies: `{"command": "<key>"}` is a
+# dozen or so tokens, so anything longer is the model rambling
+CLASSIFY_NUM_PREDICT = 32
+
+# What the model answers when nothing fits
+UNKNOWN = "unknown"
+
+# Hedged classification (see `HedgedClassifier`): RUBY_HEDGE_MODELS names
+# "fast,fallback" models to enable it, RUBY_HEDGE_DELAY the seconds to wait
+# on the fast one before also asking the fallback
+HEDGE_MODELS_ENV = "RUBY_HEDGE_MODELS"
+HEDGE_DELAY_ENV = "RUBY_HEDGE_DELAY"
+DEFAULT_HEDGE_DELAY = 0.3
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_keep_alive(value):
+    """Seconds a `keep_alive` value keeps a model loaded; None means forever."""
+    if isinstance(value, (int, float)):
+        return None if value < 0 else float(value)
+    value = str(value).strip()
+    try:
+        number = float(value)
+    except ValueError:
+        pass
+    else:
+        return None if number < 0 else number
+    if value.startswith("-"):
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts or "".join(n + u for n, u in parts) != value:
+        raise ValueError(f"bad keep_alive duration: {value!r}")
+    return sum(float(n) * _UNITS[u] for n, u in parts)
+
+
+class LlamaError(Exception):
+    """Raised by `AsyncLlamaClient` when a request ultimately fails."""
+
+
+class TransientLlamaError(LlamaError):
+    """A failure worth retrying: dropped connection, HTTP 5xx or 429."""
+
+
+class InvalidReplyError(LlamaError):
+    """The model answered, but not in the shape that was asked for."""
+
+
+def _decode_reply(body):
+    """Decode one JSON object sent by the server; garbage is a transient failure."""
+    try:
+        reply = json.loads(body)
+    except ValueError:
+        reply = None
+    if not isinstance(reply, dict):
+        raise TransientLlamaError(f"model server sent a non-JSON reply: {body[:80]!r}")
+    return reply
+
+
+def choice_schema(choices):
+    """JSON schema for `{"command": <one of choices or "unknown">}`."""
+    return {
+        "type": "object",
+        "properties": {"command": {"type": "string", "enum": list(choices) + [UNKNOWN]}},
+        "required": ["command"],
+    }
+
+
+def parse_choice(content, choices):
+    """
+    Validate a constrained classification reply.
+
+    Returns the chosen key, or None if the model said "unknown". Raises
+    `InvalidReplyError` for anything else: not JSON, a missing field, or
+    a value outside `choices` (nothing is normalized or guessed).
+    """
+    try:
+        data = json.loads(content)
+    except ValueError:
+        raise InvalidReplyError(f"reply is not JSON: {content[:80]!r}") from None
+    if not isinstance(data, dict) or not isinstance(data.get("command"), str):
+        raise InvalidReplyError(f"reply has no command: {content[:80]!r}")
+    choice = data["command"]
+    if choice == UNKNOWN:
+        return None
+    if choice not in choices:
+        raise InvalidReplyError(f"reply picked {choice!r}, which is not a command")
+    return choice
+
+
+class ModelStats:
+    """Load and usage counters for one model, as seen by this client."""
+
+    def __init__(self):
+        self.requests = 0
+        self.loads = 0
+        self.last_load_ms = None
+        self.total_load_ms = 0.0
+        self.last_used = None
+        self.warming = False
+
+    def record(self, reply):
+        """Account for a finished request given its final JSON reply."""
+        self.requests += 1
+        self.last_used = time.monotonic()
+        load_ns = reply.get("load_duration")
+        if load_ns is not None:
+            load_ms = load_ns / 1e6
+            if load_ms >= LOADED_THRESHOLD_MS:
+                self.loads += 1
+                self.last_load_ms = round(load_ms, 3)
+                self.total_load_ms += load_ms
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "loads": self.loads,
+            "last_load_ms": self.last_load_ms,
+            "total_load_ms": round(self.total_load_ms, 3),
+        }
+
+
+class AsyncLlamaClient:
+    """
+    Asyncio client for the Ollama HTTP API with connection reuse.
+
+    Keeps a small pool of persistent HTTP/1.1 connections to the server,
+    bounds every request by a deadline, retries transient failures with
+    capped, jittered exponential backoff, and never runs more than
+    `max_concurrency` requests at once. Only the standard library is used.
+
+    Every request carries a `keep_alive` hint so the server keeps the
+    model loaded for that long after it; `warm()` loads a model ahead of
+    its first real request, and `model_status()` / `model_stats()` report
+    whether a model should still be resident and what loading it cost.
+
+    A client must only be used from the event loop it was first used on.
+
+    Args:
+        host (str): Server URL; defaults to $OLLAMA_HOST or DEFAULT_HOST.
+        timeout (float): Default deadline in seconds for a whole request
+            (for streams: the longest wait for the next piece).
+        connect_timeout (float): Deadline for opening a new connection.
+        retries (int): Extra attempts after a transient failure.
+        backoff (float): Base backoff in seconds, doubled per attempt.
+        max_backoff (float): Upper bound for a single backoff sleep.
+        max_concurrency (int): Requests allowed in flight at once.
+        pool_size (int): Idle connections kept open for reuse.
+        keep_alive: How long the server should keep a model loaded after
+            each request; defaults to $RUBY_KEEP_ALIVE or DEFAULT_KEEP_ALIVE.
+    """
+
+    def __init__(self, host=None, timeout=60.0, connect_timeout=3.0, retries=2,
+                 backoff=0.1, max_backoff=2.0, max_concurrency=4, pool_size=4, keep_alive=None):
+        host = host or os.environ.get("OLLAMA_HOST") or DEFAULT_HOST
+        if "://" not in host:
+            host = "http://" + host
+        url = urlsplit(host)
+        self.hostname = url.hostname or "127.0.0.1"
+        self.port = url.port or 11434
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        if keep_alive is None:
+            keep_alive = os.environ.get(KEEP_ALIVE_ENV) or DEFAULT_KEEP_ALIVE
+        self.keep_alive = keep_alive
+        self._keep_alive_seconds = parse_keep_alive(keep_alive)
+        self.models = {}
+        self.connections_opened = 0
+        self._idle = []
+        self._semaphore = None
+
+    # -- connection pool -------------------------------------------------
+
+    async def _checkout(self):
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            writer.close()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.hostname, self.port), self.connect_timeout
+        )
+        self.connections_opened += 1
+        return reader, writer
+
+    def _checkin(self, conn, reusable):
+        reader, writer = conn
+        if reusable and len(self._idle) < self.pool_size and not writer.is_closing():
+            self._idle.append(conn)
+        else:
+            writer.close()
+
+    async def close(self):
+        """Close every idle pooled connection."""
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+    def _limit(self):
+        # Created lazily so it binds to the loop the client is used on
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    # -- HTTP/1.1 framing ------------------------------------------------
+
+    async def _send(self, writer, path, payload):
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"POST {path} HTTP/1.1\r\n"
+            f"Host: {self.hostname}:{self.port}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    @staticmethod
+    async def _read_head(reader):
+        line = await reader.readline()
+        if not line:
+            # A pooled connection the server already closed
+            raise TransientLlamaError("connection closed by server")
+        try:
+            status = int(line.split(b" ", 2)[1])
+        except (IndexError, ValueError):
+            raise TransientLlamaError(f"malformed status line from server: {line[:80]!r}") from None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    @staticmethod
+    async def _iter_body(reader, headers):
+        """Yield the response body in pieces as they arrive."""
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                line = await reader.readline()
+                try:
+                    size = int(line.split(b";")[0].strip() or b"0", 16)
+                except ValueError:
+                    raise TransientLlamaError(f"malformed chunk size from server: {line[:80]!r}") from None
+                if size == 0:
+                    # Skip any trailers up to the terminating blank line
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return
+                data = await reader.readexactly(size)
+                await reader.readexactly(2)
+                yield data
+        elif "content-length" in headers:
+            try:
+                length = int(headers["content-length"])
+            except ValueError:
+                raise TransientLlamaError(
+                    f"malformed Content-Length from server: {headers['content-length'][:80]!r}") from None
+            if length:
+                yield await reader.readexactly(length)
+        else:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    return
+                yield data
+
+    @staticmethod
+    def _keep_alive(headers):
+        if headers.get("connection", "").lower() == "close":
+            return False
+        return "content-length" in headers or "transfer-encoding" in headers
+
+    async def _open(self, path, payload):
+        """Send a request and return (conn, headers) once a 200 arrives."""
+        conn = await self._checkout()
+        reader, writer = conn
+        try:
+            await self._send(writer, path, payload)
+            status, headers = await self._read_head(reader)
+            if status == 200:
+                return conn, headers
+            body = b"".join([piece async for piece in self._iter_body(reader, headers)])
+        except BaseException:
+            writer.close()
+            raise
+        self._checkin(conn, self._keep_alive(headers))
+        if status == 429 or status >= 500:
+            raise TransientLlamaError(f"HTTP {status} from model server")
+        raise LlamaError(f"HTTP {status} from model server: {body[:200]!r}")
+
+    async def _post_json(self, path, payload):
+        conn, headers = await self._open(path, payload)
+        reusable = False
+        try:
+            body = b"".join([piece async for piece in self._iter_body(conn[0], headers)])
+            reusable = self._keep_alive(headers)
+        finally:
+            self._checkin(conn, reusable)
+        return _decode_reply(body)
+
+    async def _with_retries(self, attempt, deadline):
+        loop = asyncio.get_running_loop()
+        tries = 0
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise LlamaError("deadline exceeded")
+            try:
+                return await asyncio.wait_for(attempt(), remaining)
+            except asyncio.TimeoutError:
+                raise LlamaError("deadline exceeded") from None
+            except (TransientLlamaError, OSError, asyncio.IncompleteReadError) as e:
+                if tries >= self.retries:
+                    raise LlamaError(f"giving up after {tries + 1} attempts: {e}") from e
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** tries)))
+                tries += 1
+                if loop.time() + delay >= deadline:
+                    raise LlamaError(f"deadline exceeded while retrying: {e}") from e
+                await asyncio.sleep(delay)
+
+    # -- model residency -------------------------------------------------
+
+    def _stats(self, model):
+        stats = self.models.get(model)
+        if stats is None:
+            stats = self.models[model] = ModelStats()
+        return stats
+
+    def _payload(self, model, messages, stream, fields):
+        payload = {"model": model, "messages": messages, "stream": stream, **fields}
+        payload.setdefault("keep_alive", self.keep_alive)
+        return payload
+
+    def model_status(self, model):
+        """
+        Whether `model` should be loaded on the server right now.
+
+        Returns "warming" while `warm()` runs, "warm" if the last request
+        to it finished within the keep-alive window, otherwise "cold". The
+        server may still evict a model early (e.g. under memory pressure),
+        so "warm" is a best guess.
+        """
+        stats = self.models.get(model)
+        if stats is None:
+            return "cold"
+        if stats.warming:
+            return "warming"
+        if stats.last_used is None:
+            return "cold"
+        window = self._keep_alive_seconds
+        if window is None or time.monotonic() - stats.last_used < window:
+            return "warm"
+        return "cold"
+
+    def model_stats(self):
+        """{model: {"status", "requests", "loads", "last_load_ms", "total_load_ms"}}."""
+        return {model: {"status": self.model_status(model), **stats.as_dict()}
+                for model, stats in self.models.items()}
+
+    async def warm(self, model, prompt=None, timeout=None):
+        """
+        Load `model` on the server ahead of its first real request.
+
+        Without a prompt this sends an empty chat, which only loads the
+        model. With one, the prompt is evaluated too (generating a single
+        token), which also primes the server's prompt cache for requests
+        sharing its prefix. Returns the model's stats as a dict.
+        """
+        stats = self._stats(model)
+        stats.warming = True
+        try:
+            if prompt is None:
+                await self.chat(model, [], timeout=timeout)
+            else:
+                await self.chat(model, [{"role": "user", "content": prompt}], timeout=timeout,
+                                options={"num_predict": 1})
+        finally:
+            stats.warming = False
+        return {"status": self.model_status(model), **stats.as_dict()}
+
+    # -- public API ------------------------------------------------------
+
+    async def chat(self, model, messages, timeout=None, **fields):
+        """
+        Send a non-streaming chat request and return the decoded JSON reply.
+
+        Extra keyword arguments (e.g. `options`, `format`, `keep_alive`)
+        are sent as-is. Raises `LlamaError` if the request fails or misses
+        its deadline.
+        """
+        payload = self._payload(model, messages, False, fields)
+        deadline = asyncio.get_running_loop().time() + (timeout or self.timeout)
+        async with self._limit():
+            reply = await self._with_retries(lambda: self._post_json("/api/chat", payload), deadline)
+        self._stats(model).record(reply)
+        return reply
+
+    async def classify(self, model, prompt, choices, timeout=None, num_predict=CLASSIFY_NUM_PREDICT):
+        """
+        Ask `model` to pick one of `choices` for `prompt`, with constrained output.
+
+        The server is made to answer with JSON matching `choice_schema`
+        (its grammar can only produce one of the allowed keys), at
+        temperature 0 and at most `num_predict` tokens, so generation is
+        short and deterministic. Returns the chosen key or None for
+        "unknown"; raises `LlamaError` on failure and `InvalidReplyError`
+        if the reply doesn't validate.
+        """
+        reply = await self.chat(
+            model, [{"role": "user", "content": prompt}], timeout=timeout,
+            format=choice_schema(choices), options={"temperature": 0, "num_predict": num_predict},
+        )
+        return parse_choice(reply.get("message", {}).get("content", ""), choices)
+
+    async def chat_stream(self, model, messages, timeout=None, **fields):
+        """
+        Send a streaming chat request and yield each decoded JSON part.
+
+        Connecting is retried like `chat`; once parts start arriving,
+        `timeout` bounds the wait for each next part.
+        """
+        payload = self._payload(model, messages, True, fields)
+        timeout = timeout or self.timeout
+        loop = asyncio.get_running_loop()
+        async with self._limit():
+            conn, headers = await self._with_retries(
+                lambda: self._open("/api/chat", payload), loop.time() + timeout
+            )
+            reusable = False
+            body = self._iter_body(conn[0], headers)
+            try:
+                buffer = b""
+                while True:
+                    try:
+                        data = await asyncio.wait_for(body.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise LlamaError("model server stalled mid-stream") from None
+                    buffer += data
+                    *lines, buffer = buffer.split(b"\n")
+                    for line in lines:
+                        if line.strip():
+                            part = _decode_reply(line)
+                            if part.get("done"):
+                                self._stats(model).record(part)
+                            yield part
+                if buffer.strip():
+                    part = _decode_reply(buffer)
+                    if part.get("done"):
+                        self._stats(model).record(part)
+                    yield part
+                reusable = self._keep_alive(headers)
+            finally:
+                await body.aclose()
+                self._checkin(conn, reusable)
+
+
+class HedgeStats:
+    """Latency and outcome counters for one model in a `HedgedClassifier`."""
+
+    def __init__(self, window=500):
+        self.requests = 0
+        self.wins = 0
+        self.errors = 0
+        self.cancelled = 0
+        # Latencies (ms) of answers that completed, won or not
+        self.latencies = deque(maxlen=window)
+
+    def as_dict(self):
+        ordered = sorted(self.latencies)
+        pick = lambda q: round(percentile(ordered, q), 3) if ordered else None
+        return {
+            "requests": self.requests,
+            "wins": self.wins,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "win_rate": round(self.wins / self.requests, 3) if self.requests else 0.0,
+            "p50_ms": pick(50),
+            "p90_ms": pick(90),
+            "p95_ms": pick(95),
+        }
+
+
+class HedgedClassifier:
+    """
+    Constrained classification hedged across a fast and a fallback model.
+
+    The request goes to the fast model first. If it hasn't produced a
+    valid answer after `delay` seconds (or fails sooner), the same request
+    also goes to the fallback model; the first valid answer wins and the
+    other request is cancelled, which closes its connection so the server
+    stops generating. "unknown" only wins once the other model has had
+    its say, so a quick shrug from the fast model never cancels a
+    fallback that could have answered. Per-model latency and win rates are kept in
+    `stats()`; a good `delay` is around the fast model's p90, see
+    `suggest_delay()`.
+
+    Args:
+        fast_model (str): Small model asked first.
+        fallback_model (str): Model asked when the fast one is slow.
+        delay (float): Seconds to wait on the fast model before hedging.
+        fast_client (AsyncLlamaClient): Client for the fast model;
+            defaults to the shared client.
+        fallback_client (AsyncLlamaClient): Client for the fallback model;
+            defaults to `fast_client`.
+    """
+
+    def __init__(self, fast_model, fallback_model, delay=DEFAULT_HEDGE_DELAY, fast_client=None,
+                 fallback_client=None):
+        self.fast_model = fast_model
+        self.fallback_model = fallback_model
+        self.delay = delay
+        self.fast_client = fast_client
+        self.fallback_client = fallback_client
+        self.hedged = 0
+        self.models = {fast_model: HedgeStats(), fallback_model: HedgeStats()}
+
+    def _clients(self):
+        fast = self.fast_client or default_client()
+        return fast, self.fallback_client or fast
+
+    async def _ask(self, client, model, prompt, choices, timeout):
+        stats = self.models[model]
+        stats.requests += 1
+        started = time.monotonic()
+        try:
+            choice = await client.classify(model, prompt, choices, timeout=timeout)
+        except asyncio.CancelledError:
+            stats.cancelled += 1
+            raise
+        except Exception:
+            stats.errors += 1
+            raise
+        stats.latencies.append((time.monotonic() - started) * 1000)
+        return model, choice
+
+    async def classify(self, prompt, choices, timeout=None):
+        """
+        Pick one of `choices` for `prompt`; returns (model, choice).
+
+        `choice` is None if no model picked a command. Raises
+        `LlamaError` if both models fail or `timeout` runs out.
+        """
+        loop = asyncio.get_running_loop()
+        fast_client, fallback_client = self._clients()
+        timeout = timeout or fast_client.timeout
+        deadline = loop.time() + timeout
+        pending = {asyncio.ensure_future(self._ask(fast_client, self.fast_model, prompt, choices, timeout))}
+        hedged = False
+        error = None
+        unknown = None
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise LlamaError("deadline exceeded")
+                wait = remaining if hedged else min(remaining, self.delay)
+                done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                answers = []
+                for task in done:
+                    try:
+                        answers.append(task.result())
+                    except LlamaError as e:
+                        error = e
+                # A real choice beats an "unknown" that finished alongside it
+                for model, choice in sorted(answers, key=lambda answer: answer[1] is None):
+                    if choice is None and (pending or not hedged):
+                        # Let the other model answer before settling on "unknown"
+                        unknown = model
+                        continue
+                    self.models[model].wins += 1
+                    return model, choice
+                if not hedged:
+                    # The fast model is slow or failed; ask the fallback too
+                    hedged = True
+                    self.hedged += 1
+                    pending.add(asyncio.ensure_future(self._ask(
+                        fallback_client, self.fallback_model, prompt, choices, max(deadline - loop.time(), 0.001))))
+            if unknown is not None:
+                self.models[unknown].wins += 1
+                return unknown, None
+            raise LlamaError(f"both models failed: {error}")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        """{"hedged": n, "models": {model: HedgeStats.as_dict()}}."""
+        return {"hedged": self.hedged, "models": {m: s.as_dict() for m, s in self.models.items()}}
+
+    def suggest_delay(self, q=0.90):
+        """The fast model's q-quantile latency in seconds, or None without data."""
+        ordered = sorted(self.models[self.fast_model].latencies)
+        if not ordered:
+            return None
+        return percentile(ordered, q * 100) / 1000
+
+
+class _LoopThread:
+    """A private event loop on a daemon thread, for the synchronous wrappers.
+
+    Keeping one loop alive lets pooled connections survive between calls.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loop = None
+
+    def _ensure(self):
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name="ruby-llm", daemon=True).start()
+            return self.loop
+
+    def submit(self, coro):
+        """Schedule `coro` on the loop and return a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure())
+
+    def run(self, coro):
+        return self.submit(coro).result()
+
+
+_runner = _LoopThread()
+_default_client = None
+
+
+def default_client():
+    """Return the shared client used by the synchronous helpers."""
+    global _default_client
+    if _default_client is None:
+        _default_client = AsyncLlamaClient()
+    return _default_client
+
+
+_default_hedge = None
+_default_hedge_setting = None
+
+
+def default_hedge():
+    """Return the hedged classifier configured by $RUBY_HEDGE_MODELS, or None when hedging is off."""
+    global _default_hedge, _default_hedge_setting
+    setting = (os.environ.get(HEDGE_MODELS_ENV, ""), os.environ.get(HEDGE_DELAY_ENV, ""))
+    if setting != _default_hedge_setting:
+        _default_hedge_setting = setting
+        models = [m.strip() for m in setting[0].split(",") if m.strip()]
+        if len(models) != 2:
+            if models:
+                logging.warning(f"{HEDGE_MODELS_ENV} needs two models (fast,fallback); hedging is off")
+            _default_hedge = None
+        else:
+            delay = float(setting[1]) if setting[1] else DEFAULT_HEDGE_DELAY
+            _default_hedge = HedgedClassifier(models[0], models[1], delay=delay)
+    return _default_hedge
+
+
+def run_sync(coro):
+    """Run `coro` on the shared background loop and return its result."""
+    return _runner.run(coro)
 
-try:
-    import ollama
-except ImportError as e:
-    ollama = None
-    logging.warning(f"ollama module not found: {e}")
 
 def query_llama(prompt: str, model: str = "mistral") -> str:
     """
-    Query the local Ollama model if available, otherwise return a safe fallback.
+    Query the local Ollama model, or return a safe fallback on failure.
 
-    This function avoids performing network or model calls at import time so the
-    rest of the program can import this module safely in environments where
-    `ollama` isn't installed or available.
+    This is a blocking wrapper around `AsyncLlamaClient.chat` running on a
+    shared background event loop, so connections are reused between calls
+    and a stalled server can't hang the caller past the client's deadline.
+    Nothing touches the network at import time.
 
     Args:
         prompt (str): The prompt to send to the model.
         model (str): The name of the model to query (default "mistral").
 
     Returns:
-        str: The model response, or "unknown" if Ollama is not available or on error.
+        str: The model response, or "unknown" if the server is unreachable or on error.
     """
-    if ollama is None:
-        # Ollama isn't available in this environment; return a conservative fallback.
-        logging.error("ollama package is not available.")
-        return "unknown"
-
     try:
-        response = ollama.chat(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            stream=False
-        )
+        response = run_sync(default_client().chat(model, [{"role": "user", "content": prompt}]))
         # Ollama's response expected structure: {"message": {"content": "..."}}
         return response.get("message", {}).get("content", "").strip()
-    except (AttributeError, ValueError, ConnectionError) as e:
+    except LlamaError as e:
         logging.error(f"Error querying ollama model: {e}")
         return "unknown"
     except Exception as e:
@@ -43,10 +726,143 @@ def query_llama(prompt: str, model: str = "mistral") -> str:
         return "unknown"
 
 
+def prewarm(model: str = "mistral", prompt: str = None):
+    """
+    Start loading `model` on the server without waiting for it.
+
+    Runs `AsyncLlamaClient.warm` on the shared background loop, so the
+    first real request doesn't pay the model's load time. Failures (e.g.
+    no server running) are logged, not raised.
+
+    Returns:
+        concurrent.futures.Future: Resolves to the model's stats dict, or None on failure.
+    """
+
+    async def warm():
+        try:
+            stats = await default_client().warm(model, prompt=prompt)
+            logging.debug(f"Warmed {model}: {stats}")
+            return stats
+        except LlamaError as e:
+            logging.info(f"Could not prewarm ollama model {model}: {e}")
+        except Exception as e:
+            logging.exception(f"Unexpected error prewarming ollama model {model}: {e}")
+        return None
+
+    return _runner.submit(warm())
+
+
+def model_status(model: str = "mistral") -> str:
+    """"warm", "warming" or "cold" for `model` on the shared client."""
+    return default_client().model_status(model)
+
+
+def classify_llama(prompt: str, choices, model: str = "mistral") -> str:
+    """
+    Classify `prompt` into one of `choices` with the local Ollama model.
+
+    Blocking wrapper around `AsyncLlamaClient.classify`: the reply is
+    constrained to JSON naming one of `choices`, capped at a few tokens
+    and generated at temperature 0. When hedging is configured (see
+    `default_hedge`), its two models answer instead of `model`.
+
+    Args:
+        prompt (str): The classification prompt.
+        choices (list): The allowed answers (e.g. the command keys).
+        model (str): The name of the model to query (default "mistral").
+
+    Returns:
+        str: One of `choices`, or "unknown" if the model found no match,
+        gave an invalid reply, or couldn't be reached.
+    """
+    return classify_llama_with_model(prompt, choices, model)[1]
+
+
+def classify_llama_with_model(prompt: str, choices, model: str = "mistral"):
+    """
+    Like `classify_llama`, but also report which model answered.
+
+    Under hedging the answer may come from either hedge model, so callers
+    that cache or trace answers per model should use this.
+
+    Returns:
+        tuple: (model name, choice). The model is None when a hedged call
+        got no answer from either model.
+    """
+    choices = list(choices)
+    hedge = default_hedge()
+    answered_by = model if hedge is None else None
+    try:
+        if hedge is not None:
+            answered_by, choice = run_sync(hedge.classify(prompt, choices))
+        else:
+            choice = run_sync(default_client().classify(model, prompt, choices))
+    except InvalidReplyError as e:
+        logging.warning(f"Discarding ollama classification: {e}")
+        return answered_by, UNKNOWN
+    except LlamaError as e:
+        logging.error(f"Error querying ollama model: {e}")
+        return answered_by, UNKNOWN
+    except Exception as e:
+        logging.exception(f"Unexpected error querying ollama model: {e}")
+        return answered_by, UNKNOWN
+    return answered_by, UNKNOWN if choice is None else choice
+
+
+def classifier_models(model: str = "mistral"):
+    """The models that may answer `classify_llama(..., model)`: both hedge models, or just `model`."""
+    hedge = default_hedge()
+    if hedge is None:
+        return [model]
+    return [hedge.fast_model, hedge.fallback_model]
+
+
+_STREAM_END = object()
+
+
+def stream_llama(prompt: str, model: str = "mistral"):
+    """
+    Stream the local Ollama model's reply as it is generated.
+
+    Yields pieces of the response text (usually a few tokens each) as soon
+    as the server produces them. Yields nothing if the server can't be
+    reached; stops early, with an error logged, if the stream breaks.
+
+    Args:
+        prompt (str): The prompt to send to the model.
+        model (str): The name of the model to query (default "mistral").
+
+    Yields:
+        str: The next piece of the model's reply.
+    """
+    pieces = queue.Queue()
+
+    async def pump():
+        try:
+            async for part in default_client().chat_stream(model, [{"role": "user", "content": prompt}]):
+                content = part.get("message", {}).get("content", "")
+                if content:
+                    pieces.put(content)
+        except LlamaError as e:
+            logging.error(f"Error streaming from ollama model: {e}")
+        except Exception as e:
+            logging.exception(f"Unexpected error streaming from ollama model: {e}")
+        finally:
+            pieces.put(_STREAM_END)
+
+    future = _runner.submit(pump())
+    try:
+        while True:
+            piece = pieces.get()
+            if piece is _STREAM_END:
+                break
+            yield piece
+    finally:
+        # Stop generation if the consumer gives up early
+        future.cancel()
+
+
 if __name__ == "__main__":
     # Example usage when running this module directly.
-    if ollama is None:
-        print("ollama package not available; example query skipped.")
-    else:
-        result = query_llama("Explain machine learning in simple terms", model="mistral")
-        print(result)
+    result = query_llama("Explain machine learning in simple terms", model="mistral")
+    print(result)
@@ -1,76 +1,211 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
 
+import ruby_speech
+import ruby_stats
 import ruby_tools
-import ruby_keymap
-from ruby_keymap import match_command
-from llm_client import query_llama
-#program startup greeting from ruby
-ruby_tools.ruby_speak("Hi, I am Ruby, your personal virtual assistant.| Even though i am still a project under progress, how shall i assist you today?")
-
-
-
-#the control flow for the several tasks ruby can perfrom.
-while True:
-    command = input("You: ")
-    cmd_name = match_command(command, use_llama=True)
-    print(f"[DEBUG] Detected command: {cmd_name}")
-
-    if cmd_name is None:
-        # Ask LLaMA to clarify
-        prompt = f"""
-        The user said: "{command}".
-        Which command from {list(ruby_keymap.keyword_map.keys())} best matches this?
-        Respond with only the command key or 'unknown'.
-        """
-        clarified_cmd = query_llama(prompt).strip().lower().replace(" ", "_")
-        if clarified_cmd in ruby_keymap.keyword_map:
-            cmd_name = clarified_cmd
-            ruby_tools.ruby_speak(f"I think you meant '{cmd_name.replace('_', ' ')}'.")
-        else:
-            ruby_tools.ruby_speak("Sorry, I couldn't understand that.")
-            continue  # skip execution if still unknown
-
-    if cmd_name == "take_note":
-        ruby_tools.take_note()
-    
-    elif cmd_name == "clear_notes":
-        ruby_tools.ruby_speak("Are you sure you want to clear all notes from notes.txt")
-        resp = input("Y/N: ").lower().strip()
-        if resp == 'y':
-            ruby_tools.clear_notes()
-        elif resp == 'n':
-            ruby_tools.ruby_speak("Ok, I won't clear notes.")
-        else:
-            ruby_tools.ruby_speak("Enter a valid input.")
-            
-    elif cmd_name == "get_time":
-        ruby_tools.get_time()
-
-    elif cmd_name == "countdown":
-        ruby_tools.ruby_speak("How long should I countdown?")
-        secs = input("Duration: ")
-        ruby_tools.countdown(secs)
-
-    elif cmd_name == "open_app":
-        ruby_tools.ruby_speak("What app would you like for me to open for you?")
-        app = input("App: ")
-        ruby_tools.open_app(app)
-
-    elif cmd_name == "open_folder":
-        ruby_tools.open_folder()
-
-    elif cmd_name == "del_files":
-        ruby_tools.del_files()
-
-    elif cmd_name == "get_system_info":
-        
-        info = ruby_tools.get_system_info()
-        print("\n=== System Info ===")
-        for k, v in info.items():
-            print(f"{k}: {v}")
-        print("=====================")
-
-    elif any (kw in command for kw in ["bye", "quit", "exit"]):
-        ruby_tools.ruby_speak("Goodbye.")
-        break
-    else: 
-        ruby_tools.ruby_speak("Sorry, I didn't understand that.")
+from ruby_commands import registry
+from ruby_keymap import prewarm_classifier
+from ruby_turns import TURN_BUDGET, run_turn
+
+GREETING = "Hi, I am Ruby, your personal virtual assistant.| Even though i am still a project under progress, how shall i assist you today?"
+
+# Set RUBY_PREWARM=0 to skip loading the classifier model at startup
+PREWARM_ENV = "RUBY_PREWARM"
+
+
+# Function to start loading the classifier model while the user is still typing.
+def start_prewarm():
+    if os.environ.get(PREWARM_ENV, "1") == "0":
+        return None
+    # The thread also keeps importing llm_client (and asyncio) off the prompt's path
+    thread = threading.Thread(target=prewarm_classifier, name="ruby-prewarm-model", daemon=True)
+    thread.start()
+    return thread
+
+
+# Function to build the folder index in the background so open_folder never waits on a crawl.
+def start_folder_index():
+    def run():
+        import ruby_folders
+
+        ruby_folders.default_index()
+
+    thread = threading.Thread(target=run, name="ruby-folders-start", daemon=True)
+    thread.start()
+    return thread
+
+
+# Function to run the interactive loop: greet, then handle typed commands until goodbye.
+def repl():
+    #program startup greeting from ruby, spoken in the background so the
+    #prompt below is already accepting input (typing cuts the greeting off)
+    ruby_tools.ruby_speak(GREETING, block=False)
+
+    # Commands contributed by installed packages (entry point group "ruby.commands").
+    # Scanning installed distributions is slow, so it happens while the user types.
+    plugins = threading.Thread(target=registry.load_plugins, name="ruby-plugins", daemon=True)
+    plugins.start()
+    start_prewarm()
+    start_folder_index()
+
+    #the control flow for the several tasks ruby can perfrom.
+    while True:
+        command = input("You: ")
+        # New input cuts off whatever Ruby was still saying
+        ruby_tools.stop_speaking()
+        plugins.join()
+        if run_turn(command)["exit"]:
+            break
+
+
+def parse_batch_line(line):
+    """Turn one batch input line into (utterance, {prompt: answer}).
+
+    Lines are either plain utterances or JSON objects such as
+    {"text": "set a timer", "answers": {"Duration": "5"}}. Answers may be
+    keyed by a prompt's key ("duration") or its label ("Duration:").
+    """
+    line = line.strip()
+    if line.startswith("{"):
+        item = json.loads(line)
+        return item.get("text", ""), item.get("answers") or {}
+    return line, {}
+
+
+def _answer_key(name):
+    return name.strip().rstrip(":").strip().lower()
+
+
+# Function to run utterances from a file or pipe without a keyboard or speakers.
+def run_batch(lines, out=sys.stdout, use_llama=True, budget=TURN_BUDGET):
+    """Run each utterance in `lines` and write one JSON result per line to `out`.
+
+    Prompt answers come from the line itself (missing ones are blank), and
+    everything Ruby says is captured into the result's "spoken" list.
+    Stops after an exit word like a REPL session would. Returns the results.
+    """
+    results = []
+    for index, line in enumerate(lines):
+        try:
+            text, supplied = parse_batch_line(line)
+        except ValueError as e:
+            result = {"index": index, "error": f"bad input line: {e}"}
+            results.append(result)
+            out.write(json.dumps(result) + "\n")
+            continue
+        if not text:
+            continue
+        supplied = {_answer_key(k): str(v) for k, v in supplied.items()}
+        spoken = []
+
+        def batch_ask(prompt, question, answers):
+            ruby_tools.ruby_speak(question)
+            return supplied.get(prompt.key, supplied.get(_answer_key(prompt.label), ""))
+
+        with ruby_tools.redirect_speech(spoken.append):
+            try:
+                result = run_turn(text, ask=batch_ask, use_llama=use_llama, budget=budget, debug=False)
+            except Exception as e:
+                result = {"text": text, "error": f"{type(e).__name__}: {e}"}
+        result["index"] = index
+        result["spoken"] = spoken
+        results.append(result)
+        out.write(json.dumps(result) + "\n")
+        if result.get("exit"):
+            break
+    out.flush()
+    return results
+
+
+def _summary(results, elapsed):
+    # Lines that failed to parse never became turns; they are counted apart
+    turns = [r for r in results if "text" in r]
+    totals = sorted(r["ms"]["total"] for r in turns if "ms" in r)
+    pick = lambda q: round(ruby_stats.percentile(totals, q), 3)
+    return {
+        "turns": len(turns),
+        "errors": sum(1 for r in turns if "error" in r),
+        "parse_errors": len(results) - len(turns),
+        "seconds": round(elapsed, 3),
+        "turns_per_minute": round(len(turns) / elapsed * 60, 1) if elapsed else 0.0,
+        "p50_ms": pick(50),
+        "p95_ms": pick(95),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ruby, your personal virtual assistant.")
+    parser.add_argument("--batch", metavar="FILE", nargs="?", const="-",
+                        help="run utterances from FILE (or stdin) instead of the interactive prompt")
+    parser.add_argument("--output", metavar="FILE", help="write batch results here instead of stdout")
+    parser.add_argument("--serve", metavar="HOST:PORT", nargs="?", const="",
+                        help="serve a JSON API for many clients instead of the interactive prompt "
+                             "(loopback only; default 127.0.0.1:8765)")
+    parser.add_argument("--socket", metavar="PATH", help="serve the JSON API on a Unix socket instead")
+    parser.add_argument("--speech", choices=["voice", "text", "null"],
+                        help="where speech from background work (e.g. timers) goes; "
+                             "defaults to voice interactively and null in batch and server mode")
+    parser.add_argument("--no-llama", action="store_true", help="never ask the model to classify")
+    parser.add_argument("--budget", type=float, default=TURN_BUDGET, help="seconds per turn for classification")
+    args = parser.parse_args(argv)
+
+    serving = args.serve is not None or args.socket is not None
+    speech = args.speech or ("null" if args.batch or serving else "voice")
+    if args.batch or serving:
+        # stdout carries only results; on-screen text from timers goes to stderr
+        ruby_tools.set_console(sys.stderr)
+    if speech == "null":
+        ruby_speech.use_backends([ruby_speech.NullBackend()])
+    elif speech == "text":
+        ruby_speech.use_backends([ruby_speech.PrintBackend()])
+
+    if serving:
+        import ruby_server
+
+        host, _, port = (args.serve or "").rpartition(":")
+        if host and not ruby_server.is_loopback(host.strip("[]")):
+            parser.error(f"--serve only listens on loopback addresses, not {host!r}")
+        if not args.no_llama:
+            start_prewarm()
+        start_folder_index()
+        registry.load_plugins()
+        ruby_server.serve(host.strip("[]") or ruby_server.DEFAULT_HOST, int(port or ruby_server.DEFAULT_PORT),
+                          path=args.socket, use_llama=not args.no_llama, budget=args.budget)
+        return 0
+
+    if not args.batch:
+        repl()
+        return 0
+
+    try:
+        source = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+    except OSError as e:
+        parser.error(f"cannot read --batch file: {e}")
+    try:
+        out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    except OSError as e:
+        if source is not sys.stdin:
+            source.close()
+        parser.error(f"cannot write --output file: {e}")
+    if not args.no_llama:
+        start_prewarm()
+    registry.load_plugins()
+    started = time.perf_counter()
+    try:
+        results = run_batch(source, out, use_llama=not args.no_llama, budget=args.budget)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    print(json.dumps(_summary(results, time.perf_counter() - started)), file=sys.stderr)
+    return 1 if any("error" in r for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
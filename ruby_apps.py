@@ -0,0 +1,243 @@
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import threading
+from collections import Counter, namedtuple
+
+from ruby_intent_cache import default_cache_dir
+
+INDEX_VERSION = 1
+
+# One launchable application: display name, where it was found and the
+# argv that starts it (never run through a shell)
+App = namedtuple("App", ["name", "path", "argv"])
+
+# Words people add around an app name ("open the visual studio app")
+_FILLER = {"the", "app", "application", "please", "open", "launch", "start", "run", "my"}
+
+# Desktop Entry Exec field codes (%f, %U, ...) that a launcher would expand
+_FIELD_CODE = re.compile(r"^%[fFuUdDnNickvm]$")
+
+
+def default_roots():
+    """Directories holding applications on this platform."""
+    home = os.path.expanduser("~")
+    if sys.platform == "darwin":
+        return ["/Applications", "/Applications/Utilities", "/System/Applications",
+                "/System/Applications/Utilities", os.path.join(home, "Applications")]
+    data_dirs = os.environ.get("XDG_DATA_DIRS", "/usr/local/share:/usr/share").split(":")
+    data_home = os.environ.get("XDG_DATA_HOME", os.path.join(home, ".local", "share"))
+    roots = [os.path.join(d, "applications") for d in [data_home] + data_dirs if d]
+    roots += ["/var/lib/flatpak/exports/share/applications", "/var/lib/snapd/desktop/applications"]
+    return list(dict.fromkeys(roots))
+
+
+def normalize_name(text):
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def _trigrams(text):
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def parse_desktop_file(path):
+    """Return an App for a `.desktop` file, or None if it isn't launchable."""
+    fields = {}
+    section = None
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("["):
+                    section = line
+                elif section == "[Desktop Entry]" and "=" in line:
+                    key, _, value = line.partition("=")
+                    fields.setdefault(key.strip(), value.strip())
+    except OSError:
+        return None
+    if fields.get("Type", "Application") != "Application":
+        return None
+    if fields.get("NoDisplay", "").lower() == "true" or fields.get("Hidden", "").lower() == "true":
+        return None
+    name, command = fields.get("Name"), fields.get("Exec")
+    if not name or not command:
+        return None
+    try:
+        argv = [arg for arg in shlex.split(command) if not _FIELD_CODE.match(arg)]
+    except ValueError:
+        return None
+    return App(name, path, argv) if argv else None
+
+
+def scan_directory(directory):
+    """Apps directly inside `directory` (`.app` bundles or `.desktop` files)."""
+    apps = []
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return apps
+    for entry in entries:
+        if entry.name.endswith(".app") and entry.is_dir():
+            apps.append(App(entry.name[:-4], entry.path, ["open", "-a", entry.path]))
+        elif entry.name.endswith(".desktop") and entry.is_file():
+            app = parse_desktop_file(entry.path)
+            if app is not None:
+                apps.append(app)
+    return apps
+
+
+class AppIndex:
+    """
+    Application index with incremental refresh and fuzzy name lookup.
+
+    Scanned apps are persisted per directory together with the directory's
+    mtime; `refresh()` only rescans directories whose mtime changed (an app
+    was installed or removed), so keeping the index current costs one
+    `stat` per directory. Lookups go through an in-memory token and
+    trigram index and never touch the disk.
+
+    Args:
+        roots (list): Directories to index; defaults to the platform's.
+        path (str): Where to persist the index; defaults to
+            `<cache dir>/apps.json`.
+    """
+
+    def __init__(self, roots=None, path=None):
+        self.roots = list(roots) if roots is not None else default_roots()
+        self.path = path or os.path.join(default_cache_dir(), "apps.json")
+        self.scanned = 0
+        self._lock = threading.Lock()
+        self._dirs = self._load()
+        self._build()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != INDEX_VERSION:
+            return {}
+        return {d: {"mtime": v["mtime"], "apps": [App(*a) for a in v["apps"]]}
+                for d, v in data.get("dirs", {}).items()}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION,
+                       "dirs": {d: {"mtime": v["mtime"], "apps": [list(a) for a in v["apps"]]}
+                                for d, v in self._dirs.items()}}, f)
+        os.replace(tmp, self.path)
+
+    def refresh(self):
+        """Rescan directories that changed since the last scan; returns how many were rescanned."""
+        with self._lock:
+            rescanned = 0
+            dirs = {}
+            for root in self.roots:
+                try:
+                    mtime = os.stat(root).st_mtime
+                except OSError:
+                    continue
+                cached = self._dirs.get(root)
+                if cached is not None and cached["mtime"] == mtime:
+                    dirs[root] = cached
+                    continue
+                dirs[root] = {"mtime": mtime, "apps": scan_directory(root)}
+                rescanned += 1
+            changed = rescanned or set(dirs) != set(self._dirs)
+            self._dirs = dirs
+            self.scanned += rescanned
+            if changed:
+                self._build()
+                try:
+                    self._save()
+                except OSError:
+                    pass
+            return rescanned
+
+    def _build(self):
+        apps = {}
+        # Earlier roots win when two directories offer the same name
+        for root in self.roots:
+            for app in self._dirs.get(root, {}).get("apps", []):
+                apps.setdefault(normalize_name(app.name), app)
+        self.apps = list(apps.values())
+        self._names = list(apps.keys())
+        self._exact = {name: i for i, name in enumerate(self._names)}
+        self._tokens = {}
+        self._grams = {}
+        for i, name in enumerate(self._names):
+            for token in name.split():
+                self._tokens.setdefault(token, set()).add(i)
+            for gram in _trigrams(name):
+                self._grams.setdefault(gram, []).append(i)
+        self._gram_counts = [len(_trigrams(name)) for name in self._names]
+
+    def lookup(self, query, limit=5, threshold=0.45):
+        """Rank apps whose names resemble `query`; returns [(score, App)], best first."""
+        words = [w for w in normalize_name(query).split() if w not in _FILLER]
+        if not words:
+            return []
+        text = " ".join(words)
+        exact = self._exact.get(text)
+        if exact is not None:
+            return [(1.0, self.apps[exact])]
+
+        # Share of query words that start some word of the name ("calc" ->
+        # "calculator", "visual studio" -> "visual studio code")
+        word_hits = Counter()
+        for word in words:
+            matched = set(self._tokens.get(word, ()))
+            for token, ids in self._tokens.items():
+                if token.startswith(word):
+                    matched |= ids
+            word_hits.update(matched)
+
+        # Trigram overlap catches typos ("spotfy")
+        query_grams = _trigrams(text)
+        gram_hits = Counter()
+        for gram in query_grams:
+            gram_hits.update(self._grams.get(gram, ()))
+
+        scored = []
+        for i in set(word_hits) | set(gram_hits):
+            shared = gram_hits[i]
+            similarity = shared / (len(query_grams) + self._gram_counts[i] - shared)
+            # A close spelling alone is enough; matching words adds to it
+            score = max(similarity, 0.6 * word_hits[i] / len(words) + 0.4 * similarity)
+            if score >= threshold:
+                # Prefer shorter names on ties ("Chrome" over "Chrome Remote Desktop")
+                scored.append((round(score, 4), -len(self._names[i]), i))
+        scored.sort(reverse=True)
+        return [(score, self.apps[i]) for score, _, i in scored[:limit]]
+
+    def find(self, query):
+        """The best matching app for `query`, or None."""
+        matches = self.lookup(query, limit=1)
+        return matches[0][1] if matches else None
+
+
+def launch(app):
+    """Start `app` detached from Ruby, without a shell."""
+    return subprocess.Popen(app.argv, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def default_index():
+    """Return the shared app index, refreshed (incrementally) on each call."""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = AppIndex()
+    _default_index.refresh()
+    return _default_index
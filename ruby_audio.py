@@ -0,0 +1,351 @@
+import abc
+import hashlib
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+from ruby_intent_cache import default_cache_dir
+
+# Fixed phrases Ruby says often; rendered ahead of time by `prewarm`
+PREWARM_PHRASES = [
+    "Note saved.", "Time's up!", "Goodbye.", "Sorry, I couldn't understand that.",
+    "Do you want to start a new session?", "What should I write?",
+    "How long should I countdown?", "What app would you like for me to open for you?",
+    "Hi, I am Ruby, your personal virtual assistant.",
+    "Even though i am still a project under progress, how shall i assist you today?",
+] + [str(n) for n in range(1, 11)]
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Renderers use the system voice unless RUBY_SPEECH_VOICE names another
+VOICE_ENV = "RUBY_SPEECH_VOICE"
+
+# Longer segments are one-off sentences; rendering them still works but
+# they are not kept, so the cache holds the phrases that actually repeat
+MAX_CACHED_CHARS = 120
+
+
+class CommandRenderer(abc.ABC):
+    """Renders text to an audio file by running a TTS command (no shell).
+
+    `argv(text, path)` builds the command line. `voice` and `rate` are
+    part of the cache key, so changing them renders fresh audio.
+    """
+
+    name = "command"
+    extension = ".wav"
+
+    def __init__(self, executable, voice=None, rate=None):
+        self.executable = executable
+        self.voice = voice
+        self.rate = rate
+
+    def available(self):
+        return bool(self.executable)
+
+    @abc.abstractmethod
+    def argv(self, text, path):
+        """The command line that renders `text` into `path`."""
+
+    def render(self, text, path):
+        subprocess.run(self.argv(text, path), check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class SayRenderer(CommandRenderer):
+    """macOS `say -o file.aiff`."""
+
+    name = "say"
+    extension = ".aiff"
+
+    def __init__(self, voice=None, rate=180, executable=None):
+        super().__init__(executable or shutil.which("say"), voice, rate)
+
+    def available(self):
+        if not self.executable:
+            return False
+        # An unknown voice would make every render fail; use the system one
+        if self.voice and self.voice not in self.voices():
+            logging.info(f"say voice {self.voice!r} is not installed; using the default voice")
+            self.voice = None
+        return True
+
+    def voices(self):
+        """Names of the installed `say` voices."""
+        try:
+            listing = subprocess.run([self.executable, "-v", "?"], capture_output=True, text=True, check=True).stdout
+        except (OSError, subprocess.CalledProcessError):
+            return []
+        # Lines look like "Samantha            en_US    # Hello, my name is Samantha."
+        return [m.group(1) for m in re.finditer(r"^(.+?)\s{2,}\S+\s+#", listing, re.MULTILINE)]
+
+    def argv(self, text, path):
+        argv = [self.executable, "-o", path]
+        if self.voice:
+            argv += ["-v", self.voice]
+        if self.rate:
+            argv += ["-r", str(self.rate)]
+        return argv + ["--", text]
+
+
+class EspeakRenderer(CommandRenderer):
+    """espeak-ng / espeak writing a WAV file; works headless on Linux."""
+
+    name = "espeak"
+    extension = ".wav"
+
+    def __init__(self, voice=None, rate=180, executable=None):
+        super().__init__(executable or shutil.which("espeak-ng") or shutil.which("espeak"), voice, rate)
+
+    def argv(self, text, path):
+        argv = [self.executable, "-w", path]
+        if self.voice:
+            argv += ["-v", self.voice]
+        if self.rate:
+            argv += ["-s", str(self.rate)]
+        return argv + ["--", text]
+
+
+class CommandPlayer:
+    """Plays an audio file with `afplay`, `paplay` or `aplay`, killable mid-file."""
+
+    def __init__(self, argv=None):
+        if argv is None:
+            for candidate in (["afplay"], ["paplay"], ["aplay", "-q"]):
+                if shutil.which(candidate[0]):
+                    argv = candidate
+                    break
+        self.argv = argv
+        self._proc = None
+        self._lock = threading.Lock()
+
+    def available(self):
+        return bool(self.argv)
+
+    def play(self, path):
+        proc = subprocess.Popen(self.argv + [path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with self._lock:
+            self._proc = proc
+        try:
+            proc.wait()
+        finally:
+            with self._lock:
+                self._proc = None
+
+    def stop(self):
+        with self._lock:
+            proc = self._proc
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+
+
+class PhraseCache:
+    """
+    Size-bounded on-disk cache of rendered phrase audio with LRU eviction.
+
+    Audio is keyed by renderer, voice, rate and text. A hit refreshes the
+    file's mtime, so recency survives restarts; when the directory grows
+    past `max_bytes` the least recently used files are deleted.
+
+    Args:
+        renderer: Object with `render(text, path)`, `name`, `extension`,
+            `voice` and `rate`.
+        directory (str): Where audio files live; defaults to
+            `<cache dir>/speech`.
+        max_bytes (int): Upper bound for the total size of cached audio.
+    """
+
+    def __init__(self, renderer, directory=None, max_bytes=DEFAULT_MAX_BYTES, max_chars=MAX_CACHED_CHARS):
+        self.renderer = renderer
+        self.directory = directory or os.path.join(default_cache_dir(), "speech")
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._rendering = {}
+        os.makedirs(self.directory, exist_ok=True)
+        self._entries = OrderedDict()
+        self._size = 0
+        self._load()
+
+    def _load(self):
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith("."):
+                st = entry.stat()
+                found.append((st.st_mtime, entry.name, st.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._size += size
+
+    def key(self, text):
+        r = self.renderer
+        raw = f"{r.name}|{getattr(r, 'voice', None)}|{getattr(r, 'rate', None)}|{text}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest() + r.extension
+
+    def path(self, text):
+        return os.path.join(self.directory, self.key(text))
+
+    def cacheable(self, text):
+        return len(text) <= self.max_chars
+
+    def lookup(self, text):
+        """Return the cached audio path for `text`, or None on a miss."""
+        name = self.key(text)
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+        path = os.path.join(self.directory, name)
+        try:
+            os.utime(path)
+        except OSError:
+            # Deleted behind our back; forget it
+            with self._lock:
+                self._size -= self._entries.pop(name, 0)
+            return None
+        return path
+
+    def get(self, text):
+        """Return a path to audio for `text`, rendering and caching it on a miss."""
+        path = self.lookup(text)
+        if path is not None:
+            self.hits += 1
+            return path
+        self.misses += 1
+        name = self.key(text)
+        # Concurrent requests for the same phrase share one render
+        with self._lock:
+            pending = self._rendering.get(name)
+            if pending is None:
+                pending = self._rendering[name] = threading.Lock()
+        with pending:
+            path = self.lookup(text)
+            if path is not None:
+                return path
+            path = os.path.join(self.directory, name)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".render-", suffix=self.renderer.extension)
+            os.close(fd)
+            try:
+                self.renderer.render(text, tmp)
+                os.replace(tmp, path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            finally:
+                with self._lock:
+                    self._rendering.pop(name, None)
+            self._add(name, os.path.getsize(path))
+        return path
+
+    def _add(self, name, size):
+        evicted = []
+        with self._lock:
+            self._size += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                old, old_size = self._entries.popitem(last=False)
+                self._size -= old_size
+                evicted.append(old)
+        for old in evicted:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except OSError:
+                pass
+
+    def prewarm(self, phrases=None):
+        """Render every phrase that isn't cached yet; returns how many were rendered."""
+        rendered = 0
+        for phrase in phrases if phrases is not None else PREWARM_PHRASES:
+            if self.cacheable(phrase) and self.lookup(phrase) is None:
+                try:
+                    self.get(phrase)
+                    rendered += 1
+                except Exception as e:
+                    logging.debug(f"Could not prewarm {phrase!r}: {e}")
+        return rendered
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size, "hits": self.hits, "misses": self.misses}
+
+
+class CachedBackend:
+    """
+    Speech backend that renders phrases to audio files once and replays them.
+
+    Short segments go through a `PhraseCache`; longer ones are rendered to
+    a temporary file and played without being kept. With `prewarm=True`
+    (or a list of phrases), opening the backend renders the common phrases
+    on a background thread.
+    """
+
+    name = "cached"
+
+    def __init__(self, renderer, player=None, cache=None, prewarm=False):
+        self.renderer = renderer
+        self.player = player or CommandPlayer()
+        self.cache = cache
+        self.prewarm = prewarm
+
+    def open(self):
+        if not self.renderer.available():
+            raise OSError(f"{self.renderer.name} renderer not found")
+        if not self.player.available():
+            raise OSError("no audio player found")
+        if self.cache is None:
+            self.cache = PhraseCache(self.renderer)
+        if self.prewarm:
+            phrases = None if self.prewarm is True else self.prewarm
+            threading.Thread(target=self.cache.prewarm, args=(phrases,), name="ruby-prewarm", daemon=True).start()
+
+    def prepare(self, segment):
+        """Render `segment` (or find it cached); returns what `play` needs."""
+        if self.cache.cacheable(segment):
+            return self.cache.get(segment), False
+        fd, tmp = tempfile.mkstemp(prefix="ruby-speech-", suffix=self.renderer.extension)
+        os.close(fd)
+        try:
+            self.renderer.render(segment, tmp)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        return tmp, True
+
+    def play(self, prepared):
+        path, temporary = prepared
+        try:
+            self.player.play(path)
+        finally:
+            if temporary:
+                self.discard(prepared)
+
+    def discard(self, prepared):
+        """Drop a rendered segment that won't be played (or was played)."""
+        path, temporary = prepared
+        if temporary and os.path.exists(path):
+            os.remove(path)
+
+    def speak(self, segment):
+        self.play(self.prepare(segment))
+
+    def stop(self):
+        self.player.stop()
+
+
+def default_renderer(voice=None):
+    """The file renderer for this platform, or None if there isn't one.
+
+    `voice` defaults to $RUBY_SPEECH_VOICE, else the system voice.
+    """
+    voice = voice or os.environ.get(VOICE_ENV) or None
+    renderer = SayRenderer(voice=voice) if sys.platform == "darwin" else EspeakRenderer(voice=voice)
+    return renderer if renderer.available() else None
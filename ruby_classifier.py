@@ -0,0 +1,144 @@
+import functools
+import math
+import re
+import threading
+from collections import Counter
+
+
+# Optional dependency: numpy, imported the first time a classifier is
+# trained. Falls back to pure-Python sparse vectors when missing.
+@functools.lru_cache(maxsize=None)
+def optional_numpy():
+    try:
+        import numpy
+    except Exception:
+        return None
+    return numpy
+
+
+def char_ngrams(text, n_min=2, n_max=4):
+    """Character n-grams of `text`, padded so word edges form their own grams."""
+    text = " " + re.sub(r"[^a-z0-9]+", " ", text.lower()).strip() + " "
+    grams = []
+    for n in range(n_min, n_max + 1):
+        grams.extend(text[i:i + n] for i in range(len(text) - n + 1))
+    return grams
+
+
+class IntentClassifier:
+    """
+    Character n-gram TF-IDF classifier trained from a keyword map.
+
+    Each command is represented by the L2-normalized centroid of its trigger
+    phrases (plus its own name, e.g. "get time"). An utterance is scored by
+    cosine similarity against every centroid, and the best command is
+    returned only if it clears `threshold` and beats the runner-up by at
+    least `margin` (so a word shared by two commands, like "notes", picks
+    neither). With NumPy installed, a batch of
+    utterances is scored with a single matrix multiply.
+
+    Args:
+        mapping (dict): {command: [phrases]} to train from.
+        threshold (float): Minimum cosine similarity to accept a match.
+        margin (float): How far the best command must score above the next.
+    """
+
+    def __init__(self, mapping, threshold=0.5, n_min=2, n_max=4, margin=0.0):
+        self.threshold = threshold
+        self.margin = margin
+        self.n_min = n_min
+        self.n_max = n_max
+        self.np = optional_numpy()
+        self._lock = threading.Lock()
+        self.consulted = 0
+        self.resolved = 0
+        self.fit(mapping)
+
+    def fit(self, mapping):
+        """(Re)train from `mapping`."""
+        self.commands = list(mapping.keys())
+        docs = []
+        for cmd_name in self.commands:
+            phrases = list(mapping[cmd_name]) + [cmd_name.replace("_", " ")]
+            docs.append([Counter(char_ngrams(p, self.n_min, self.n_max)) for p in phrases])
+
+        df = Counter()
+        for phrases in docs:
+            for grams in phrases:
+                df.update(grams.keys())
+        total = sum(len(phrases) for phrases in docs)
+        self.vocab = {gram: i for i, gram in enumerate(sorted(df))}
+        self.idf = {gram: math.log((1 + total) / (1 + count)) + 1 for gram, count in df.items()}
+
+        centroids = []
+        for phrases in docs:
+            centroid = Counter()
+            for grams in phrases:
+                for gram, weight in self._weights(grams).items():
+                    centroid[gram] += weight / len(phrases)
+            centroids.append(_normalize(centroid))
+
+        np = self.np
+        if np is not None:
+            self._matrix = np.zeros((len(self.commands), len(self.vocab)))
+            for row, centroid in enumerate(centroids):
+                for gram, weight in centroid.items():
+                    self._matrix[row, self.vocab[gram]] = weight
+        self._centroids = centroids
+
+    def _weights(self, grams):
+        # Unit-length TF-IDF weights; n-grams never seen in training are dropped
+        return _normalize({g: c * self.idf[g] for g, c in grams.items() if g in self.idf})
+
+    def _vectorize(self, texts):
+        np = self.np
+        if np is None:
+            return [self._weights(Counter(char_ngrams(t, self.n_min, self.n_max))) for t in texts]
+        matrix = np.zeros((len(texts), len(self.vocab)))
+        for row, text in enumerate(texts):
+            for gram, weight in self._weights(Counter(char_ngrams(text, self.n_min, self.n_max))).items():
+                matrix[row, self.vocab[gram]] = weight
+        return matrix
+
+    def scores(self, texts):
+        """Return a (len(texts) x len(commands)) table of cosine similarities."""
+        vectors = self._vectorize(texts)
+        if self.np is not None:
+            return vectors @ self._matrix.T
+        return [[sum(w * c.get(g, 0.0) for g, w in v.items()) for c in self._centroids] for v in vectors]
+
+    def classify_batch(self, texts):
+        """Classify many utterances at once.
+
+        Returns a list of (command or None, score) pairs, one per text.
+        """
+        results = []
+        for row in self.scores(texts):
+            row = [float(v) for v in row]
+            ranked = sorted(range(len(row)), key=row.__getitem__, reverse=True)
+            score = row[ranked[0]] if ranked else 0.0
+            runner_up = row[ranked[1]] if len(ranked) > 1 else 0.0
+            accepted = ranked and score >= self.threshold and score - runner_up >= self.margin
+            results.append((self.commands[ranked[0]] if accepted else None, score))
+        with self._lock:
+            self.consulted += len(results)
+            self.resolved += sum(1 for cmd_name, _ in results if cmd_name is not None)
+        return results
+
+    def classify(self, text):
+        """Return (command or None, score) for a single utterance."""
+        return self.classify_batch([text])[0]
+
+    def stats(self):
+        """How many turns reached this tier and the fraction it kept from the model."""
+        with self._lock:
+            return {
+                "consulted": self.consulted,
+                "resolved": self.resolved,
+                "saved_fraction": self.resolved / self.consulted if self.consulted else 0.0,
+            }
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    return {g: w / norm for g, w in vector.items()} if norm else {}
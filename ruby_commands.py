@@ -0,0 +1,235 @@
+import importlib
+import logging
+import threading
+from collections import namedtuple
+
+# Entry-point group third-party packages use to contribute commands. Each
+# entry point must resolve to a callable taking the registry, e.g.
+#
+#   [project.entry-points."ruby.commands"]
+#   weather = "ruby_weather:register"
+#
+ENTRY_POINT_GROUP = "ruby.commands"
+
+# A question asked before a command runs. The answer is passed to the
+# handler as keyword argument `key`. `say` is spoken (it may use earlier
+# answers as {placeholders}, or be a function of them), `label` is the
+# input prompt, and `when` optionally decides from the earlier answers
+# whether to ask at all.
+class Prompt(namedtuple("Prompt", ["key", "say", "label", "when"], defaults=[None])):
+    __slots__ = ()
+
+    def text(self, answers):
+        """What to say before asking, given the earlier `answers`."""
+        say = self.say(answers) if callable(self.say) else self.say
+        return say.format(**answers)
+
+
+def _yes(key):
+    return lambda answers: answers.get(key, "").strip().lower() == "y"
+
+
+def _note_question(answers):
+    # take_note's status line comes before the note is asked for, as when
+    # the handler asks for everything itself
+    if not _yes("session")(answers):
+        return "Continuing in existing session.| What should I write?"
+    if not answers.get("filename", "").strip():
+        return "No file name given, using notes.txt| What should I write?"
+    return "What should I write?"
+
+
+class Command:
+    """One assistant command: trigger phrases, argument prompts and a handler.
+
+    `handler` is a "module:function" string resolved on first use, so
+    declaring a command never imports the code behind it. `destructive`
+    commands (deleting notes or files) are only triggered by their own
+    phrases or the model, never by a fuzzy guess.
+    """
+
+    def __init__(self, name, phrases, handler, prompts=(), destructive=False):
+        self.name = name
+        self.phrases = list(phrases)
+        self.handler_path = handler
+        self.prompts = list(prompts)
+        self.destructive = destructive
+        self._handler = None
+
+    @property
+    def handler(self):
+        if self._handler is None:
+            if callable(self.handler_path):
+                self._handler = self.handler_path
+            else:
+                module, _, attr = self.handler_path.partition(":")
+                self._handler = getattr(importlib.import_module(module), attr)
+        return self._handler
+
+    def next_prompt(self, answers):
+        """The next prompt to ask given the `answers` collected so far, or None."""
+        for prompt in self.prompts:
+            if prompt.key not in answers and (prompt.when is None or prompt.when(answers)):
+                return prompt
+        return None
+
+    def collect(self, ask, answers=None):
+        """Ask every applicable prompt in order via `ask(prompt, text, answers)`.
+
+        Prompts whose key is already in `answers` are skipped.
+        """
+        answers = dict(answers or {})
+        prompt = self.next_prompt(answers)
+        while prompt is not None:
+            answers[prompt.key] = ask(prompt, prompt.text(answers), answers)
+            prompt = self.next_prompt(answers)
+        return answers
+
+    def run(self, answers=None):
+        """Call the handler with the collected answers as keyword arguments."""
+        return self.handler(**(answers or {}))
+
+
+class CommandRegistry:
+    """Ordered set of commands; earlier registrations win phrase ties."""
+
+    def __init__(self):
+        self._commands = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._plugins_loaded = False
+
+    def register(self, name, phrases, handler, prompts=(), replace=False, destructive=False):
+        """Declare a command and return it."""
+        with self._lock:
+            if name in self._commands and not replace:
+                raise ValueError(f"command {name!r} is already registered")
+            command = self._commands[name] = Command(name, phrases, handler, prompts, destructive)
+        self._changed()
+        return command
+
+    def unregister(self, name):
+        with self._lock:
+            self._commands.pop(name, None)
+        self._changed()
+
+    def add_phrases(self, name, phrases):
+        """Teach an existing command more trigger phrases."""
+        with self._lock:
+            command = self._commands.get(name)
+            if command is None:
+                raise ValueError(f"command {name!r} is not registered")
+            command.phrases.extend(p for p in phrases if p not in command.phrases)
+        self._changed()
+        return command
+
+    def replace_phrases(self, name, phrases):
+        """Set the trigger phrases of an existing command to exactly `phrases`."""
+        with self._lock:
+            command = self._commands.get(name)
+            if command is None:
+                raise ValueError(f"command {name!r} is not registered")
+            command.phrases = list(phrases)
+        self._changed()
+        return command
+
+    def get(self, name):
+        return self._commands.get(name)
+
+    def __contains__(self, name):
+        return name in self._commands
+
+    def __iter__(self):
+        return iter(list(self._commands.values()))
+
+    def keyword_map(self):
+        """{command name: trigger phrases}, in registration order."""
+        return {name: list(cmd.phrases) for name, cmd in self._commands.items()}
+
+    def on_change(self, listener):
+        """Call `listener()` whenever commands are added or removed."""
+        self._listeners.append(listener)
+
+    def _changed(self):
+        for listener in self._listeners:
+            listener()
+
+    def load_plugins(self, group=ENTRY_POINT_GROUP):
+        """Let installed packages register their commands (once per registry)."""
+        if self._plugins_loaded:
+            return
+        self._plugins_loaded = True
+        from importlib.metadata import entry_points
+
+        for entry_point in entry_points(group=group):
+            try:
+                entry_point.load()(self)
+            except Exception:
+                logging.exception(f"Failed to load command plugin {entry_point.name!r}")
+
+
+registry = CommandRegistry()
+
+registry.register("take_note", [
+    "take a note", "make a note", "note down",
+    "write down", "remember this", "jot this down"
+], "ruby_tools:take_note", [
+    Prompt("session", "Do you want to start a new session?", "Y/N: "),
+    Prompt("filename", "Starting new session.", "file name: ", when=_yes("session")),
+    Prompt("note", _note_question, "Note: "),
+])
+registry.register("read_notes", [
+    "read my notes", "read notes", "read my last notes",
+    "last notes", "recent notes"
+], "ruby_tools:read_last_notes")
+registry.register("search_notes", [
+    "search notes", "search my notes", "find notes",
+    "find in notes", "look up notes"
+], "ruby_tools:search_notes", [
+    Prompt("query", "What should I look for? You can add from:YYYY-MM-DD or to:YYYY-MM-DD.", "Search: "),
+])
+registry.register("clear_notes", [
+    "clear notes", "delete notes", "erase notes",
+    "remove all notes", "reset notes"
+], "ruby_tools:confirm_clear_notes", [
+    Prompt("confirm", "Are you sure you want to clear all notes from notes.txt", "Y/N: "),
+], destructive=True)
+registry.register("open_app", [
+    "open app", "launch app", "start app",
+    "run app", "execute app"
+], "ruby_tools:open_app", [
+    Prompt("app_name", "What app would you like for me to open for you?", "App: "),
+])
+registry.register("get_time", [
+    "what time is it", "current time", "tell me the time"
+], "ruby_tools:get_time")
+# Listed before "countdown" so "cancel countdown" isn't read as a new one
+registry.register("list_timers", [
+    "list timers", "show timers", "active timers", "running timers"
+], "ruby_tools:list_timers")
+registry.register("cancel_timer", [
+    "cancel timer", "stop timer", "cancel countdown", "stop countdown"
+], "ruby_tools:cancel_timer", [
+    Prompt("name", "Which timer should I cancel? Leave it blank for the latest one.", "Timer: "),
+])
+registry.register("countdown", [
+    "set timer", "start timer", "countdown", "start countdown"
+], "ruby_tools:countdown", [
+    Prompt("duration", "How long should I countdown?", "Duration: "),
+])
+registry.register("open_folder", [
+    "open folder", "show folder", "explore folder",
+    "open directory", "explore directory"
+], "ruby_tools:open_folder", [
+    Prompt("folder", "What folder should I open?", "Folder: "),
+])
+registry.register("del_files", [
+    "delete file", "remove file", "erase file"
+], "ruby_tools:del_files", [
+    Prompt("filename", "What files do you want me to delete?", "File name: "),
+    Prompt("confirm", "Are you sure you want to delete {filename}.txt?", "Y/N: ",
+           when=lambda answers: bool(answers.get("filename", "").strip())),
+], destructive=True)
+registry.register("get_system_info", [
+    "system info", "device info", "system status", "computer info"
+], "ruby_tools:print_system_info")
@@ -0,0 +1,334 @@
+import bisect
+import fnmatch
+import os
+import queue
+import re
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+from ruby_intent_cache import default_cache_dir
+
+# Directory names never worth offering (matched with fnmatch); hidden
+# directories are skipped as well unless `include_hidden` is set
+DEFAULT_IGNORE = [
+    "node_modules", "__pycache__", "venv", ".venv", "site-packages", "build", "dist",
+    "Library", "Caches", "*.app", "*.photoslibrary", "*.egg-info",
+]
+
+DEFAULT_MAX_DEPTH = 6
+
+# Seconds a persisted index is trusted before `default_index` refreshes it
+# in the background
+REFRESH_INTERVAL = 300
+
+# Words around a folder name ("open my invoices folder")
+_FILLER = {"my", "the", "folder", "folders", "directory", "dir", "open", "show", "please", "in", "of"}
+
+_WORD = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+
+
+def folder_tokens(name):
+    """Words of a folder name: "TaxReturns_2023" -> ["tax", "returns", "2023"]."""
+    return [w.lower() for w in _WORD.findall(name)]
+
+
+class FolderIndex:
+    """
+    Persistent index of directories under some roots, for fuzzy lookup.
+
+    The crawler lists directories with `os.scandir` on several threads,
+    honouring ignore patterns and a depth limit. Every directory is
+    stored in SQLite with its mtime. A refresh stats each known directory
+    (in parallel) and only re-lists those whose mtime changed, i.e. where
+    a subfolder was added, removed or renamed; unchanged directories keep
+    their stored listing.
+
+    Lookups use an in-memory word index (with prefix matching over a
+    sorted word list), so they stay fast with hundreds of thousands of
+    folders.
+
+    Args:
+        roots (list): Directories to crawl; defaults to the home directory.
+        path (str): SQLite file; defaults to `<cache dir>/folders.sqlite3`.
+        max_depth (int): How many levels below a root to descend.
+        ignore (list): fnmatch patterns for directory names to skip.
+        include_hidden (bool): Also index directories starting with ".".
+        workers (int): Threads used for crawling.
+    """
+
+    def __init__(self, roots=None, path=None, max_depth=DEFAULT_MAX_DEPTH, ignore=None,
+                 include_hidden=False, workers=8):
+        self.roots = [os.path.abspath(os.path.expanduser(r)) for r in (roots or ["~"])]
+        self.path = path or os.path.join(default_cache_dir(), "folders.sqlite3")
+        self.max_depth = max_depth
+        self.ignore = list(DEFAULT_IGNORE if ignore is None else ignore)
+        self.include_hidden = include_hidden
+        self.workers = workers
+        self.last_refresh = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._refresher = None
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS folders ("
+            " path TEXT PRIMARY KEY, parent TEXT, name TEXT, depth INTEGER, mtime REAL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+        self._folders = {}
+        if self._meta("settings") == self._settings():
+            self._folders = {row[0]: row[1:] for row in self._db.execute(
+                "SELECT path, parent, name, depth, mtime FROM folders")}
+        self._build()
+
+    # -- persistence -------------------------------------------------------
+
+    def _settings(self):
+        # A different crawl configuration invalidates the stored folders
+        return repr((self.roots, self.max_depth, self.ignore, self.include_hidden))
+
+    def _meta(self, key):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def refreshed_at(self):
+        """Wall-clock time of the last completed refresh, or None."""
+        value = self._meta("refreshed_at")
+        return float(value) if value else None
+
+    def _save(self, folders, changed):
+        with self._db:
+            removed = [(p,) for p in self._folders if p not in folders]
+            self._db.executemany("DELETE FROM folders WHERE path = ?", removed)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO folders (path, parent, name, depth, mtime) VALUES (?, ?, ?, ?, ?)",
+                [(p,) + folders[p] for p in changed],
+            )
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('settings', ?)", (self._settings(),))
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('refreshed_at', ?)", (str(time.time()),))
+
+    # -- crawling ----------------------------------------------------------
+
+    def _ignored(self, name):
+        if name.startswith(".") and not self.include_hidden:
+            return True
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.ignore)
+
+    def _visit(self, path, depth, known_mtime, known_children):
+        """Stat `path`; re-list it only if its mtime changed.
+
+        Returns (mtime, child paths, listed) or None if it is gone.
+        """
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        if known_mtime == mtime:
+            return mtime, known_children, False
+        children = []
+        if depth < self.max_depth:
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False) and not self._ignored(entry.name):
+                                children.append(entry.path)
+                        except OSError:
+                            continue
+            except OSError:
+                pass
+        return mtime, children, True
+
+    def refresh(self):
+        """Bring the index up to date; returns {"visited", "listed", "seconds"}."""
+        with self._lock:
+            started = time.monotonic()
+            known = self._folders
+            children_of = {}
+            for path, (parent, _, _, _) in known.items():
+                children_of.setdefault(parent, []).append(path)
+
+            folders = {}
+            changed = []
+            listed = 0
+            results = []
+            work = queue.Queue()
+
+            def crawl():
+                while True:
+                    item = work.get()
+                    if item is None:
+                        return
+                    path, parent, depth = item
+                    try:
+                        record = known.get(path)
+                        # A stored record at another depth (e.g. a changed root) is re-listed
+                        mtime = record[3] if record is not None and record[2] == depth else None
+                        result = self._visit(path, depth, mtime, children_of.get(path, []))
+                        if result is not None:
+                            results.append((path, parent, depth) + result)
+                            if depth < self.max_depth:
+                                for child in result[1]:
+                                    work.put((child, path, depth + 1))
+                    finally:
+                        work.task_done()
+
+            for root in self.roots:
+                work.put((root, None, 0))
+            threads = [threading.Thread(target=crawl, name="ruby-folders", daemon=True)
+                       for _ in range(self.workers)]
+            for thread in threads:
+                thread.start()
+            work.join()
+            for _ in threads:
+                work.put(None)
+
+            for path, parent, depth, mtime, _, was_listed in results:
+                record = (parent, os.path.basename(path) or path, depth, mtime)
+                folders[path] = record
+                if was_listed or known.get(path) != record:
+                    changed.append(path)
+                listed += was_listed
+
+            if changed or len(folders) != len(known):
+                self._save(folders, changed)
+                self._folders = folders
+                self._build()
+            else:
+                with self._db:
+                    self._db.execute("INSERT OR REPLACE INTO meta VALUES ('refreshed_at', ?)", (str(time.time()),))
+            self.last_refresh = {"visited": len(folders), "listed": listed,
+                                 "seconds": round(time.monotonic() - started, 3)}
+            return self.last_refresh
+
+    def refresh_in_background(self):
+        """Start `refresh()` on a daemon thread unless one is already running."""
+        with self._start_lock:
+            if self._refresher is None or not self._refresher.is_alive():
+                self._refresher = threading.Thread(target=self.refresh, name="ruby-folders-refresh", daemon=True)
+                self._refresher.start()
+            return self._refresher
+
+    @property
+    def refreshing(self):
+        """True while a refresh (e.g. the first crawl) is in progress."""
+        refresher = self._refresher
+        return self._lock.locked() or (refresher is not None and refresher.is_alive())
+
+    # -- lookup ------------------------------------------------------------
+
+    def _build(self):
+        folders = self._folders
+        paths = [p for p, record in folders.items() if record[0] is not None]
+        tokens = {}
+        names = {}
+        for i, path in enumerate(paths):
+            words = folder_tokens(folders[path][1])
+            names.setdefault(" ".join(words), []).append(i)
+            for token in set(words):
+                tokens.setdefault(token, []).append(i)
+        # Swapped in one assignment so lookups never see half an update
+        self._view = (folders, paths, tokens, sorted(tokens), names)
+
+    def __len__(self):
+        return len(self._view[1])
+
+    def lookup(self, query, limit=5):
+        """Rank folders whose names match `query`; returns [(score, path)], best first.
+
+        A folder whose whole name matches scores highest; otherwise each
+        query word that equals (or starts) a word of the folder name counts.
+        Shallower and more recently changed folders win ties.
+        """
+        folders, paths, tokens, sorted_tokens, names = self._view
+        words = [w for w in folder_tokens(query) if w not in _FILLER]
+        if not words:
+            return []
+        scores = Counter()
+        for word in words:
+            best = {}
+            # Every indexed word starting with `word`, via the sorted word list
+            pos = bisect.bisect_left(sorted_tokens, word)
+            while pos < len(sorted_tokens) and sorted_tokens[pos].startswith(word):
+                token = sorted_tokens[pos]
+                weight = 1.0 if token == word else 0.8
+                for i in tokens[token]:
+                    if best.get(i, 0) < weight:
+                        best[i] = weight
+                pos += 1
+            for i, weight in best.items():
+                scores[i] += weight / len(words)
+        for i in names.get(" ".join(words), ()):
+            scores[i] = 1.5
+
+        ranked = []
+        for i, score in scores.items():
+            if score >= 0.5:
+                _, _, depth, mtime = folders[paths[i]]
+                ranked.append((round(score - 0.01 * depth, 4), mtime, paths[i]))
+        ranked.sort(reverse=True)
+        return [(score, path) for score, _, path in ranked[:limit]]
+
+    def find(self, query):
+        """Best matching folder path for `query`, or None."""
+        matches = self.lookup(query, limit=1)
+        return matches[0][1] if matches else None
+
+    def close(self):
+        self._db.close()
+
+
+def open_path(path):
+    """Show `path` in the platform's file manager, without a shell."""
+    opener = ["open"] if sys.platform == "darwin" else ["xdg-open"]
+    return subprocess.Popen(opener + [path], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def default_index():
+    """Return the shared home-directory index without ever waiting on a crawl.
+
+    A missing or stale (older than REFRESH_INTERVAL) index is crawled on a
+    background thread; until the first crawl finishes lookups only see
+    what was persisted before, so callers can fall back to `find_shallow`.
+    Call this at startup to have the index ready by the first lookup.
+    """
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = FolderIndex()
+        index = _default_index
+    refreshed = index.refreshed_at
+    if refreshed is None or time.time() - refreshed > REFRESH_INTERVAL:
+        index.refresh_in_background()
+    return index
+
+
+def find_shallow(query, root="~"):
+    """Direct child of `root` whose name matches `query` word for word, or None.
+
+    A single `scandir`; answers "documents" or "my downloads folder" while
+    the full index is still being built.
+    """
+    words = [w for w in folder_tokens(query) if w not in _FILLER]
+    if not words:
+        return None
+    try:
+        with os.scandir(os.path.expanduser(root)) as entries:
+            for entry in entries:
+                if folder_tokens(entry.name) == words and entry.is_dir():
+                    return entry.path
+    except OSError:
+        pass
+    return None
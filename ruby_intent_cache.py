@@ -0,0 +1,242 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Politeness around a request that doesn't change what is asked for; only
+# stripped from the start or the end, never from the middle
+LEADING_FILLER = {"please", "pls", "plz", "hey", "ok", "okay", "ruby"}
+TRAILING_FILLER = {"please", "pls", "plz", "thanks", "ruby"}
+
+DEFAULT_TTL = 7 * 24 * 3600
+
+
+def normalize_utterance(text):
+    """Reduce an utterance to a canonical form for cache lookups.
+
+    Case-folds, drops apostrophes and punctuation (letters of any script
+    are kept), and strips politeness words from the start and end, so
+    that "What's the time, pls?" and "whats the time" share an entry.
+    Returns "" for an utterance with no words; such keys are never cached.
+    """
+    text = text.casefold().replace("'", "").replace("’", "")
+    words = re.sub(r"[\W_]+", " ", text).split()
+    start, end = 0, len(words)
+    while start < end and words[start] in LEADING_FILLER:
+        start += 1
+    while start < end:
+        if words[end - 1] in TRAILING_FILLER:
+            end -= 1
+        elif end - start >= 2 and words[end - 2:end] == ["thank", "you"]:
+            end -= 2
+        else:
+            break
+    # An utterance that is nothing but politeness keeps its words
+    return " ".join(words[start:end] or words)
+
+
+def keymap_fingerprint(mapping):
+    """Return a short stable hash of a keyword map ({command: [phrases]})."""
+    blob = json.dumps(mapping, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def default_cache_dir():
+    """Directory for Ruby's on-disk caches (override with RUBY_CACHE_DIR)."""
+    return os.environ.get("RUBY_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "ruby")
+
+
+class IntentCache:
+    """Two-tier cache of LLM command classifications.
+
+    Entries are keyed on the normalized utterance, the model name and a
+    fingerprint of the keyword map. The memory tier is a small LRU; the
+    disk tier is a SQLite table that survives restarts. Both tiers honour
+    `ttl` (seconds) and a maximum entry count. Whenever a lookup arrives
+    with a new keyword-map fingerprint, entries made for any other command
+    set are dropped from both tiers.
+
+    Pass `path=None` for a memory-only cache.
+    """
+
+    def __init__(self, path=None, max_memory=512, max_disk=20000, ttl=DEFAULT_TTL, clock=time.time):
+        self.path = path
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._fingerprint = None
+        self._db = None
+        self._disk_count = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if path:
+            self._open_disk(path)
+
+    def _open_disk(self, path):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS intents ("
+                "key TEXT PRIMARY KEY, command TEXT NOT NULL, fingerprint TEXT NOT NULL, "
+                "created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS intents_last_used ON intents(last_used)")
+            self._disk_count = db.execute("SELECT COUNT(*) FROM intents").fetchone()[0]
+            self._db = db
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(f"Intent cache disk tier unavailable ({path}): {e}")
+            self._db = None
+
+    @staticmethod
+    def make_key(utterance, model, fingerprint):
+        raw = f"{fingerprint}\x00{model}\x00{normalize_utterance(utterance)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _check_fingerprint(self, fingerprint):
+        # Invalidate everything cached for a different command set
+        if fingerprint == self._fingerprint:
+            return
+        self._fingerprint = fingerprint
+        self._memory.clear()
+        if self._db is not None:
+            self._db.execute("DELETE FROM intents WHERE fingerprint != ?", (fingerprint,))
+            self._disk_count = self._db.execute("SELECT COUNT(*) FROM intents").fetchone()[0]
+
+    def get(self, utterance, model, fingerprint):
+        """Return the cached command for `utterance`, or None on a miss."""
+        return self.get_any(utterance, [model], fingerprint)
+
+    def get_any(self, utterance, models, fingerprint):
+        """Return the command cached for `utterance` under the first of `models` that has one.
+
+        However many models are tried, this counts as one hit or one miss,
+        so hedged lookups don't skew the hit rate.
+        """
+        if not normalize_utterance(utterance):
+            return None
+        now = self._clock()
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            for model in models:
+                found = self._lookup(self.make_key(utterance, model, fingerprint), now)
+                if found is not None:
+                    command, tier = found
+                    if tier == "memory":
+                        self.memory_hits += 1
+                    else:
+                        self.disk_hits += 1
+                    return command
+            self.misses += 1
+            return None
+
+    def _lookup(self, key, now):
+        # (command, "memory" or "disk") for a live entry, else None; caller holds the lock
+        entry = self._memory.get(key)
+        if entry is not None:
+            command, created = entry
+            if now - created <= self.ttl:
+                self._memory.move_to_end(key)
+                return command, "memory"
+            del self._memory[key]
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT command, created FROM intents WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                command, created = row
+                if now - created <= self.ttl:
+                    self._db.execute("UPDATE intents SET last_used = ? WHERE key = ?", (now, key))
+                    self._remember(key, command, created)
+                    return command, "disk"
+                self._db.execute("DELETE FROM intents WHERE key = ?", (key,))
+                self._disk_count -= 1
+        return None
+
+    def put(self, utterance, model, fingerprint, command):
+        """Store the classification `command` for `utterance`."""
+        if not normalize_utterance(utterance):
+            return
+        key = self.make_key(utterance, model, fingerprint)
+        now = self._clock()
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            self._remember(key, command, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO intents (key, command, fingerprint, created, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, command, fingerprint, now, now),
+                )
+                self._evict_disk(now)
+
+    def _remember(self, key, command, created):
+        self._memory[key] = (command, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now):
+        self._db.execute("DELETE FROM intents WHERE created < ?", (now - self.ttl,))
+        self._disk_count = self._db.execute("SELECT COUNT(*) FROM intents").fetchone()[0]
+        if self._disk_count > self.max_disk:
+            # Trim a little below the cap so eviction doesn't run on every put
+            excess = self._disk_count - int(self.max_disk * 0.9)
+            self._db.execute(
+                "DELETE FROM intents WHERE key IN "
+                "(SELECT key FROM intents ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+            self._disk_count = self._db.execute("SELECT COUNT(*) FROM intents").fetchone()[0]
+
+    def clear(self):
+        """Drop every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM intents")
+                self._disk_count = 0
+
+    def stats(self):
+        """Return hit/miss counters and current tier sizes."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_count,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """Return the process-wide intent cache, creating it on first use."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            path = os.path.join(default_cache_dir(), "intents.sqlite3")
+            _default_cache = IntentCache(path)
+        return _default_cache
@@ -0,0 +1,609 @@
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import lzma
+import mmap
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from collections import deque, namedtuple
+
+from ruby_intent_cache import default_cache_dir
+
+# Notes files are plain text made of blocks like:
+#
+#   ----------------------------------------
+#   [2024-05-01 09:30:00]
+#   the note text
+#
+NOTE_SEPARATOR = "-" * 40
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_BLOCK_HEAD = re.compile(rb"\n-{40}\n\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\]\n")
+_WORD = re.compile(r"[a-z0-9]+")
+
+# One parsed note: byte offset of its block in the file, timestamp string, body
+Note = namedtuple("Note", ["offset", "timestamp", "body"])
+
+
+def format_note(text, when=None):
+    """Render `text` as a notes-file block stamped with `when` (default: now)."""
+    when = when or datetime.datetime.now()
+    return f"\n{NOTE_SEPARATOR}\n[{when.strftime(TIMESTAMP_FORMAT)}]\n{text.strip()}\n"
+
+
+def parse_blocks(data, base_offset=0):
+    """Yield a `Note` for every complete block in `data` (bytes).
+
+    `base_offset` is the file position `data` was read from, so offsets in
+    the results are absolute.
+    """
+    heads = list(_BLOCK_HEAD.finditer(data))
+    for i, head in enumerate(heads):
+        end = heads[i + 1].start() if i + 1 < len(heads) else len(data)
+        body = data[head.end():end].decode("utf-8", errors="replace")
+        if body.endswith("\n"):
+            body = body[:-1]
+        yield Note(base_offset + head.start(), head.group(1).decode("ascii"), body)
+
+
+def tokenize(text):
+    return _WORD.findall(text.lower())
+
+
+def _day_bound(value, end=False):
+    # Accept "YYYY-MM-DD", "YYYY-MM-DD HH:MM:SS" or datetime objects
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    if isinstance(value, datetime.date):
+        value = value.isoformat()
+    value = str(value).strip()
+    if len(value) == 10:
+        value += " 23:59:59" if end else " 00:00:00"
+    return value
+
+
+class NotesIndex:
+    """
+    Incremental inverted index over one notes file, stored in SQLite.
+
+    The text file stays the source of truth. The index remembers how many
+    bytes of it have been indexed; `sync()` only parses what was appended
+    since, and rebuilds from scratch if the file shrank or was replaced.
+
+    Notes from the active file have an empty `segment`; when the file is
+    rotated, `seal()` relabels them with the sealed segment's name so they
+    stay searchable.
+    """
+
+    def __init__(self, notes_path, index_path=None):
+        self.notes_path = os.path.abspath(notes_path)
+        if index_path is None:
+            digest = hashlib.sha1(self.notes_path.encode("utf-8")).hexdigest()[:16]
+            index_path = os.path.join(default_cache_dir(), "notes-index", f"{digest}.sqlite3")
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        self.index_path = index_path
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(index_path, check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS notes (
+                id INTEGER PRIMARY KEY, offset INTEGER NOT NULL,
+                ts TEXT NOT NULL, body TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS notes_ts ON notes(ts);
+            CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, note_id INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS postings_term ON postings(term, note_id);
+            """
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(notes)")]
+        if "segment" not in columns:
+            self._db.execute("ALTER TABLE notes ADD COLUMN segment TEXT NOT NULL DEFAULT ''")
+
+    def _meta(self, key, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    @staticmethod
+    def _head_digest(f, length):
+        # Fingerprint of the file's first bytes so a replaced file is noticed
+        f.seek(0)
+        return hashlib.sha1(f.read(length)).hexdigest()
+
+    def _remember_head(self, f, size):
+        length = min(256, size)
+        self._set_meta("head_len", length)
+        self._set_meta("head", self._head_digest(f, length))
+
+    def _delete_segment(self, segment):
+        self._db.execute(
+            "DELETE FROM postings WHERE note_id IN (SELECT id FROM notes WHERE segment = ?)", (segment,)
+        )
+        self._db.execute("DELETE FROM notes WHERE segment = ?", (segment,))
+
+    def reset(self):
+        """Forget what was indexed from the active file."""
+        with self._lock, self._db:
+            self._delete_segment("")
+            self._db.execute("DELETE FROM meta")
+
+    def reset_all(self):
+        """Forget everything, sealed segments included."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM notes")
+            self._db.execute("DELETE FROM postings")
+            self._db.execute("DELETE FROM meta")
+
+    def seal(self, segment):
+        """The active file was rotated into `segment` and is now empty."""
+        with self._lock, self._db:
+            self._db.execute("UPDATE notes SET segment = ? WHERE segment = ''", (segment,))
+            self._db.execute("DELETE FROM meta")
+
+    def drop_segment(self, segment):
+        """Remove the notes of a sealed segment that was deleted."""
+        with self._lock, self._db:
+            self._delete_segment(segment)
+
+    def _insert(self, note):
+        cur = self._db.execute(
+            "INSERT INTO notes (offset, ts, body) VALUES (?, ?, ?)",
+            (note.offset, note.timestamp, note.body),
+        )
+        terms = set(tokenize(note.body))
+        self._db.executemany(
+            "INSERT INTO postings (term, note_id) VALUES (?, ?)",
+            [(term, cur.lastrowid) for term in terms],
+        )
+
+    def sync(self):
+        """Index whatever was appended to the notes file since the last call."""
+        with self._lock:
+            try:
+                size = os.path.getsize(self.notes_path)
+            except OSError:
+                size = 0
+            indexed = int(self._meta("indexed_size", 0))
+            if size == indexed:
+                return 0
+            if size == 0:
+                self.reset()
+                return 0
+            with open(self.notes_path, "rb") as f:
+                replaced = indexed and self._head_digest(f, int(self._meta("head_len", 0))) != self._meta("head")
+                if size < indexed or replaced:
+                    self.reset()
+                    indexed = 0
+                # Only the bytes appended since the last sync are parsed
+                f.seek(indexed)
+                data = f.read(size - indexed)
+                notes = list(parse_blocks(data, indexed))
+                with self._db:
+                    for note in notes:
+                        self._insert(note)
+                    self._set_meta("indexed_size", size)
+                    self._remember_head(f, size)
+            return len(notes)
+
+    def add(self, note, new_size):
+        """Index a block the caller just appended, without rereading the file."""
+        with self._lock, self._db:
+            self._insert(note)
+            self._set_meta("indexed_size", new_size)
+            if int(self._meta("head_len", 0)) < 256:
+                with open(self.notes_path, "rb") as f:
+                    self._remember_head(f, new_size)
+
+    def search(self, query=None, start=None, end=None, limit=50):
+        """
+        Find notes containing every word of `query`, newest first.
+
+        `start`/`end` bound the note timestamps (inclusive); plain dates
+        cover the whole day.
+        """
+        self.sync()
+        terms = sorted(set(tokenize(query or "")))
+        sql = "SELECT offset, ts, body FROM notes WHERE 1=1"
+        args = []
+        if terms:
+            sql += " AND id IN (" + " INTERSECT ".join(
+                ["SELECT note_id FROM postings WHERE term = ?"] * len(terms)
+            ) + ")"
+            args.extend(terms)
+        if start is not None:
+            sql += " AND ts >= ?"
+            args.append(_day_bound(start))
+        if end is not None:
+            sql += " AND ts <= ?"
+            args.append(_day_bound(end, end=True))
+        sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            return [Note(*row) for row in self._db.execute(sql, args)]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# -- memory-mapped readers ------------------------------------------------
+#
+# These walk the notes file through mmap one block at a time, so memory use
+# stays flat however large the file gets. Range reads assume blocks were
+# appended in timestamp order, which is how take_note writes them.
+
+_HEAD_MARK = b"\n" + NOTE_SEPARATOR.encode("ascii") + b"\n["
+
+
+def _find_head(mm, pos):
+    """Offset of the first real block header at or after `pos`, or -1."""
+    while True:
+        i = mm.find(_HEAD_MARK, pos)
+        if i < 0 or _BLOCK_HEAD.match(mm, i):
+            return i
+        pos = i + 1
+
+
+def _rfind_head(mm, end):
+    """Offset of the last real block header starting before `end`, or -1."""
+    while True:
+        i = mm.rfind(_HEAD_MARK, 0, end)
+        if i < 0 or _BLOCK_HEAD.match(mm, i):
+            return i
+        end = i
+
+
+def _read_block(mm, start, end):
+    head = _BLOCK_HEAD.match(mm, start)
+    body = mm[head.end():end].decode("utf-8", errors="replace")
+    if body.endswith("\n"):
+        body = body[:-1]
+    return Note(start, head.group(1).decode("ascii"), body)
+
+
+class _Mapped:
+    """Context manager yielding a read-only mmap of `path` (None if empty)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._mm = None
+
+    def __enter__(self):
+        try:
+            self._file = open(self.path, "rb")
+        except FileNotFoundError:
+            return None
+        if os.fstat(self._file.fileno()).st_size == 0:
+            return None
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mm
+
+    def __exit__(self, *exc):
+        if self._mm is not None:
+            self._mm.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def iter_notes(path, start_offset=0):
+    """Yield every note in `path` from `start_offset` onwards, oldest first."""
+    with _Mapped(path) as mm:
+        if mm is None:
+            return
+        pos = _find_head(mm, start_offset)
+        while pos >= 0:
+            nxt = _find_head(mm, pos + 1)
+            yield _read_block(mm, pos, nxt if nxt >= 0 else len(mm))
+            pos = nxt
+
+
+def iter_last_notes(path, n=5):
+    """Yield the last `n` notes in `path`, newest first, scanning backwards."""
+    with _Mapped(path) as mm:
+        if mm is None:
+            return
+        end = len(mm)
+        while n > 0:
+            start = _rfind_head(mm, end)
+            if start < 0:
+                return
+            yield _read_block(mm, start, end)
+            end = start
+            n -= 1
+
+
+def _first_block_at_or_after(mm, timestamp):
+    """Binary search for the first block whose timestamp is >= `timestamp`."""
+    # Invariant: blocks starting before `lo` are older than `timestamp`,
+    # blocks starting at or after `hi` are not.
+    lo, hi = 0, len(mm)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        pos = _find_head(mm, mid)
+        if pos < 0 or pos >= hi:
+            hi = mid
+        elif _BLOCK_HEAD.match(mm, pos).group(1).decode("ascii") < timestamp:
+            lo = pos + 1
+        else:
+            hi = pos
+    return _find_head(mm, lo)
+
+
+def iter_notes_between(path, start=None, end=None):
+    """
+    Yield notes with `start <= timestamp <= end`, oldest first.
+
+    The first matching block is located by binary search over byte
+    offsets; blocks are then streamed until one falls past `end`. Plain
+    dates cover the whole day.
+    """
+    start, end = _day_bound(start), _day_bound(end, end=True)
+    with _Mapped(path) as mm:
+        if mm is None:
+            return
+        pos = _find_head(mm, 0) if start is None else _first_block_at_or_after(mm, start)
+        while pos >= 0:
+            nxt = _find_head(mm, pos + 1)
+            note = _read_block(mm, pos, nxt if nxt >= 0 else len(mm))
+            if end is not None and note.timestamp > end:
+                return
+            yield note
+            pos = nxt
+
+
+def iter_blocks_stream(fileobj, chunk_size=1 << 20):
+    """Yield notes from a binary stream (e.g. a gzip file) chunk by chunk."""
+    buffer = b""
+    consumed = 0
+    while True:
+        data = fileobj.read(chunk_size)
+        buffer += data
+        heads = list(_BLOCK_HEAD.finditer(buffer))
+        # Hold back the last block until the next header (or EOF) ends it
+        cut = heads[-1].start() if data and heads else len(buffer)
+        for note in parse_blocks(buffer[:cut], consumed):
+            yield note
+        consumed += cut
+        buffer = buffer[cut:]
+        if not data:
+            return
+
+
+_OPENERS = {"gzip": (gzip.open, ".gz"), "lzma": (lzma.open, ".xz"), None: (open, "")}
+
+# Rotation defaults used by notes_store(); see NotesStore for the meaning.
+# Rotation is opt-in: it empties notes.txt into compressed segments, which
+# breaks anything else reading the plain file. RUBY_NOTES_ROTATE=size or
+# RUBY_NOTES_ROTATE=day turns it on.
+ROTATE_ENV = "RUBY_NOTES_ROTATE"
+ROTATION = {
+    "rotate": None,
+    "max_bytes": 8 * 1024 * 1024,
+    "compression": "gzip",
+    "retention_days": None,
+    "max_segments": None,
+}
+
+
+class NotesStore:
+    """
+    Segmented, append-only notes log plus its search index.
+
+    `path` is the active segment: `append` writes the usual text block to it
+    and indexes it in the same call, so searches never rescan files. When
+    the active file passes `max_bytes` (rotate="size") or a note arrives on
+    a new day (rotate="day"), it is sealed: compressed (gzip or lzma) into
+    `<name>.segments/` and recorded in that directory's `manifest.json`
+    with its time range, so range reads only open the segments they need.
+
+    Sealed segments older than `retention_days`, or beyond the newest
+    `max_segments`, are deleted after each rotation. Segments keep the
+    plain-text block format inside the compression.
+    """
+
+    def __init__(self, path="notes.txt", index_path=None, rotate=None, max_bytes=8 * 1024 * 1024,
+                 compression="gzip", retention_days=None, max_segments=None):
+        if rotate not in (None, "size", "day"):
+            raise ValueError(f"unknown rotation policy: {rotate!r}")
+        if compression not in _OPENERS:
+            raise ValueError(f"unknown compression: {compression!r}")
+        self.path = path
+        self.rotate = rotate
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.retention_days = retention_days
+        self.max_segments = max_segments
+        self.segments_dir = os.path.splitext(path)[0] + ".segments"
+        self.index = NotesIndex(path, index_path)
+        self._lock = threading.RLock()
+
+    # -- manifest --------------------------------------------------------
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.segments_dir, "manifest.json")
+
+    def segments(self):
+        """Sealed segments, oldest first: dicts with file/seq/start/end/notes/bytes."""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)["segments"]
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def _write_manifest(self, segments):
+        os.makedirs(self.segments_dir, exist_ok=True)
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"segments": segments}, f, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+    def _open_segment(self, segment):
+        name = segment["file"]
+        opener = lzma.open if name.endswith(".xz") else gzip.open if name.endswith(".gz") else open
+        return opener(os.path.join(self.segments_dir, name), "rb")
+
+    # -- rotation --------------------------------------------------------
+
+    def _needs_rotation(self, block_size, when):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return False
+        if size == 0 or self.rotate is None:
+            return False
+        if self.rotate == "size":
+            return size + block_size > self.max_bytes
+        first = next(iter_notes(self.path), None)
+        return first is not None and first.timestamp[:10] != when.strftime("%Y-%m-%d")
+
+    def seal(self):
+        """Compress the active file into a new sealed segment and empty it."""
+        with self._lock:
+            notes = iter_notes(self.path)
+            first = next(notes, None)
+            if first is None:
+                return None
+            count, last = 1, first
+            for last in notes:
+                count += 1
+            segments = self.segments()
+            opener, ext = _OPENERS[self.compression]
+            stem = os.path.basename(os.path.splitext(self.path)[0])
+            stamp = first.timestamp.replace("-", "").replace(":", "").replace(" ", "T")
+            seq = segments[-1].get("seq", len(segments)) + 1 if segments else 1
+            name = f"{stem}-{stamp}-{seq:05d}.txt{ext}"
+            os.makedirs(self.segments_dir, exist_ok=True)
+            target = os.path.join(self.segments_dir, name)
+            with open(self.path, "rb") as src, opener(target + ".tmp", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(target + ".tmp", target)
+            segment = {
+                "file": name, "seq": seq, "start": first.timestamp, "end": last.timestamp,
+                "notes": count, "bytes": os.path.getsize(target),
+            }
+            self._write_manifest(segments + [segment])
+            self.index.seal(name)
+            with open(self.path, "w", encoding="utf-8"):
+                pass
+            self.apply_retention()
+            return segment
+
+    def apply_retention(self, now=None):
+        """Delete sealed segments past `retention_days` / `max_segments`."""
+        with self._lock:
+            segments = self.segments()
+            keep = segments
+            if self.retention_days is not None:
+                now = now or datetime.datetime.now()
+                cutoff = (now - datetime.timedelta(days=self.retention_days)).strftime(TIMESTAMP_FORMAT)
+                keep = [s for s in keep if s["end"] >= cutoff]
+            if self.max_segments is not None:
+                keep = keep[-self.max_segments:] if self.max_segments else []
+            dropped = [s for s in segments if s not in keep]
+            for segment in dropped:
+                try:
+                    os.remove(os.path.join(self.segments_dir, segment["file"]))
+                except FileNotFoundError:
+                    pass
+                self.index.drop_segment(segment["file"])
+            if dropped:
+                self._write_manifest(keep)
+            return dropped
+
+    # -- notes -----------------------------------------------------------
+
+    def append(self, text, when=None):
+        """Append a note to the active segment and return it as a `Note`."""
+        when = when or datetime.datetime.now()
+        block = format_note(text, when).encode("utf-8")
+        with self._lock:
+            if self._needs_rotation(len(block), when):
+                self.seal()
+            # Pick up anything written by other means first
+            self.index.sync()
+            with open(self.path, "ab") as f:
+                offset = f.tell()
+                f.write(block)
+            note = next(parse_blocks(block, offset))
+            self.index.add(note, offset + len(block))
+        return note
+
+    def search(self, query=None, start=None, end=None, limit=50):
+        return self.index.search(query, start, end, limit)
+
+    def last(self, n=5):
+        """The last `n` notes across all segments, newest first."""
+        notes = list(iter_last_notes(self.path, n))
+        for segment in reversed(self.segments()):
+            if len(notes) >= n:
+                break
+            with self._open_segment(segment) as f:
+                # Only the newest few blocks of a segment are kept in memory
+                older = deque(iter_blocks_stream(f), maxlen=n - len(notes))
+            notes.extend(reversed(older))
+        return notes
+
+    def between(self, start=None, end=None):
+        """Stream notes in a date range, oldest first.
+
+        Only sealed segments whose recorded time range overlaps the query
+        are decompressed; the active file is read through mmap.
+        """
+        lo, hi = _day_bound(start), _day_bound(end, end=True)
+        for segment in self.segments():
+            if (lo is not None and segment["end"] < lo) or (hi is not None and segment["start"] > hi):
+                continue
+            with self._open_segment(segment) as f:
+                for note in iter_blocks_stream(f):
+                    if (lo is None or note.timestamp >= lo) and (hi is None or note.timestamp <= hi):
+                        yield note
+        yield from iter_notes_between(self.path, start, end)
+
+    def clear(self):
+        """Empty the notes file, delete every sealed segment and the index."""
+        with self._lock:
+            with open(self.path, "w", encoding="utf-8"):
+                pass
+            for segment in self.segments():
+                try:
+                    os.remove(os.path.join(self.segments_dir, segment["file"]))
+                except FileNotFoundError:
+                    pass
+            if os.path.exists(self.manifest_path):
+                os.remove(self.manifest_path)
+            self.index.reset_all()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def notes_store(path="notes.txt"):
+    """Return the shared `NotesStore` for `path`, configured from `ROTATION`.
+
+    $RUBY_NOTES_ROTATE ("size" or "day") overrides `ROTATION["rotate"]`.
+    """
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            settings = dict(ROTATION)
+            rotate = os.environ.get(ROTATE_ENV, "").strip().lower()
+            if rotate in ("size", "day"):
+                settings["rotate"] = rotate
+            elif rotate:
+                logging.warning(f"Ignoring {ROTATE_ENV}={rotate!r}; use 'size' or 'day'")
+            store = _stores[key] = NotesStore(path, **settings)
+        return store
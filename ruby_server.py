@@ -0,0 +1,405 @@
+"""
+Ruby as a local multi-client service.
+
+Serves a small JSON-over-HTTP/1.1 API on a loopback port or a Unix
+socket, so several terminals or tools share one process: one warm model
+connection pool, one intent cache and one speech stack. Each client
+talks within a session, which remembers a command that is still waiting
+for prompt answers (e.g. take_note's "file name:" question):
+
+    POST   /v1/sessions        -> {"session": id}
+    POST   /v1/turn            {"text": ..., "session": id} -> turn result
+    DELETE /v1/sessions/<id>   -> {"closed": id}
+    GET    /v1/stats           -> sessions, turns and latency percentiles
+    GET    /v1/health          -> {"ok": true}
+
+A turn result carries what Ruby said ("spoken"), the detected command
+and, while a command still needs input, the next "prompt"; the next
+turn's text is taken as the answer to it.
+
+Commands can delete notes and files or launch apps, so the server only
+listens on loopback addresses, answers TCP requests only when their Host
+header names the local machine (which defeats DNS rebinding), and
+refuses any request carrying an Origin header, i.e. one a web page made.
+
+    python ruby.py --serve 127.0.0.1:8765
+    python ruby.py --socket /tmp/ruby.sock
+"""
+import asyncio
+import ipaddress
+import json
+import logging
+import secrets
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import ruby_stats
+import ruby_tools
+import ruby_trace
+import ruby_turns
+from ruby_commands import registry
+from ruby_keymap import classify
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Sessions idle for longer than this are dropped (seconds)
+SESSION_TTL = 30 * 60
+
+# Largest request body accepted; utterances are short
+MAX_BODY = 64 * 1024
+
+# Host header names accepted on TCP connections (any port)
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    """An error answered with `status` and a JSON {"error": message} body."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Session:
+    """One client's conversation: the command waiting on prompt answers, if any."""
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.command = None
+        self.answers = {}
+        self.turns = 0
+        self.last_active = time.monotonic()
+        # Turns of one session run one at a time, in arrival order
+        self.lock = asyncio.Lock()
+
+    def reset(self):
+        self.command = None
+        self.answers = {}
+
+
+async def read_request(reader):
+    """Read one HTTP/1.1 request; returns (method, path, headers, body) or None at EOF."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "malformed request line") from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HttpError(400, "invalid Content-Length") from None
+    if length < 0:
+        raise HttpError(400, "invalid Content-Length")
+    if length > MAX_BODY:
+        raise HttpError(413, "request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+
+def is_loopback(host):
+    """True if `host` is "localhost" or a loopback IP address."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def host_name(value):
+    """The name part of a Host header: "[::1]:8765" -> "::1", "localhost:80" -> "localhost"."""
+    value = value.strip().lower()
+    if value.startswith("["):
+        return value[1:value.find("]")]
+    return value.rsplit(":", 1)[0] if value.count(":") == 1 else value
+
+
+def check_origin(headers, tcp=True):
+    """Refuse requests a browser could have been tricked into sending.
+
+    Any Origin header means a web page made the request. Over TCP the
+    Host header must also name this machine; a rebound DNS name would not.
+    Unix socket peers can't be reached from a browser, so Host isn't checked.
+    """
+    if "origin" in headers:
+        raise HttpError(403, "cross-origin requests are not allowed")
+    if tcp and host_name(headers.get("host", "")) not in LOCAL_HOSTS:
+        raise HttpError(403, "Host must be localhost")
+
+
+def write_response(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+
+
+class RubyServer:
+    """
+    Asyncio front end running Ruby turns for many sessions at once.
+
+    Connections and sessions are handled on the event loop; classifying
+    and running a command (which may wait on the model, the disk or a
+    subprocess) happen on a thread pool, so a slow turn never holds up
+    other clients. Everything Ruby says during a turn is returned to the
+    client instead of being spoken.
+
+    Args:
+        use_llama (bool): Let the model classify what keywords don't match.
+        budget (float): Seconds per turn for classification.
+        workers (int): Threads running turns.
+        session_ttl (float): Seconds an idle session is kept.
+    """
+
+    def __init__(self, use_llama=True, budget=ruby_turns.TURN_BUDGET, workers=8, session_ttl=SESSION_TTL):
+        self.use_llama = use_llama
+        self.budget = budget
+        self.session_ttl = session_ttl
+        self.sessions = {}
+        self.turns = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=10000)
+        self.started = time.monotonic()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ruby-serve")
+        self._server = None
+        self._tcp = True
+
+    # -- sessions --------------------------------------------------------
+
+    def open_session(self):
+        self._expire()
+        session = Session(secrets.token_hex(8))
+        self.sessions[session.id] = session
+        return session
+
+    def close_session(self, session_id):
+        return self.sessions.pop(session_id, None) is not None
+
+    def _expire(self):
+        now = time.monotonic()
+        for session in list(self.sessions.values()):
+            if now - session.last_active > self.session_ttl and not session.lock.locked():
+                del self.sessions[session.id]
+
+    # -- turns -----------------------------------------------------------
+
+    def _step(self, session, text):
+        """Advance `session` by one utterance; runs on a worker thread."""
+        spoken = []
+        result = {"session": session.id, "text": text, "command": session.command, "source": "prompt",
+                  "confidence": None, "spoken": spoken, "prompt": None, "done": True, "exit": False,
+                  "ms": {}}
+        started = time.perf_counter()
+        with ruby_tools.redirect_speech(spoken.append), ruby_trace.turn(text, session=session.id):
+            if session.command is None:
+                with ruby_trace.span("match") as span:
+                    match = classify(text, use_llama=self.use_llama, budget=self.budget)
+                    span.set(source=match.source, confidence=round(match.confidence, 3), command=match.command)
+                result.update(command=match.command, source=match.source, confidence=round(match.confidence, 3))
+                result["ms"]["match"] = round((time.perf_counter() - started) * 1000, 3)
+                if match.command is None:
+                    result["exit"] = ruby_turns.respond_unmatched(text)
+                    return self._finish(result, started)
+                if match.source == "model":
+                    ruby_tools.ruby_speak(f"I think you meant '{match.command.replace('_', ' ')}'.")
+                session.command = match.command
+            else:
+                # This utterance answers the question asked last turn
+                spec = registry.get(session.command)
+                prompt = spec.next_prompt(session.answers) if spec is not None else None
+                if prompt is not None:
+                    session.answers[prompt.key] = text
+
+            spec = registry.get(session.command)
+            if spec is None:
+                session.reset()
+                ruby_tools.ruby_speak("Sorry, I didn't understand that.")
+                return self._finish(result, started)
+            prompt = spec.next_prompt(session.answers)
+            if prompt is not None:
+                ruby_tools.ruby_speak(prompt.text(session.answers))
+                result.update(prompt={"key": prompt.key, "label": prompt.label}, done=False)
+                return self._finish(result, started)
+
+            answers = session.answers
+            session.reset()
+            result["answers"] = answers
+            acted = time.perf_counter()
+            with ruby_trace.span("action", command=spec.name):
+                spec.run(answers)
+            result["ms"]["action"] = round((time.perf_counter() - acted) * 1000, 3)
+        return self._finish(result, started)
+
+    @staticmethod
+    def _finish(result, started):
+        result["ms"]["total"] = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+    async def turn(self, text, session_id=None):
+        """Run one utterance for a session (a new one if `session_id` is None)."""
+        # Prune on every turn too, or sessions nobody reopens would live forever
+        self._expire()
+        if session_id is None:
+            session = self.open_session()
+        else:
+            session = self.sessions.get(session_id)
+            if session is None:
+                raise HttpError(404, f"no session {session_id!r}")
+        loop = asyncio.get_running_loop()
+        async with session.lock:
+            started = time.perf_counter()
+            session.last_active = time.monotonic()
+            try:
+                result = await loop.run_in_executor(self._pool, self._step, session, text)
+            except Exception as e:
+                logging.exception(f"Turn failed for session {session.id}: {e}")
+                session.reset()
+                self.errors += 1
+                result = {"session": session.id, "text": text, "error": f"{type(e).__name__}: {e}"}
+            session.turns += 1
+            session.last_active = time.monotonic()
+            self.turns += 1
+            self.latencies.append((time.perf_counter() - started) * 1000)
+        return result
+
+    def stats(self):
+        ordered = sorted(self.latencies)
+        pick = lambda q: round(ruby_stats.percentile(ordered, q), 3) if ordered else None
+        stats = {
+            "sessions": len(self.sessions),
+            "turns": self.turns,
+            "errors": self.errors,
+            "uptime_s": round(time.monotonic() - self.started, 3),
+            "latency_ms": {"p50": pick(50), "p95": pick(95), "p99": pick(99)},
+        }
+        # Only report on the model if some turn actually needed it
+        llm_client = sys.modules.get("llm_client")
+        if llm_client is not None:
+            stats["models"] = llm_client.default_client().model_stats()
+            hedge = llm_client.default_hedge()
+            if hedge is not None:
+                stats["hedge"] = hedge.stats()
+        return stats
+
+    # -- HTTP ------------------------------------------------------------
+
+    async def dispatch(self, method, path, body):
+        """Route one request; returns (status, payload) or raises HttpError."""
+        path = path.split("?", 1)[0].rstrip("/")
+        if path == "/v1/turn":
+            if method != "POST":
+                raise HttpError(405, "use POST")
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError:
+                raise HttpError(400, "body is not JSON") from None
+            text = request.get("text") if isinstance(request, dict) else None
+            if not isinstance(text, str):
+                raise HttpError(400, "missing \"text\"")
+            session_id = request.get("session")
+            if session_id is not None and not isinstance(session_id, str):
+                raise HttpError(400, "\"session\" must be a string")
+            return 200, await self.turn(text, session_id)
+        if path == "/v1/sessions" and method == "POST":
+            return 201, {"session": self.open_session().id}
+        if path.startswith("/v1/sessions/") and method == "DELETE":
+            session_id = path.rsplit("/", 1)[1]
+            if not self.close_session(session_id):
+                raise HttpError(404, f"no session {session_id!r}")
+            return 200, {"closed": session_id}
+        if path == "/v1/stats" and method == "GET":
+            return 200, self.stats()
+        if path == "/v1/health" and method == "GET":
+            return 200, {"ok": True}
+        raise HttpError(404, f"no route for {method} {path}")
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                # A request that can't be read leaves the stream in an
+                # unknown state, so the connection is closed after answering
+                keep_alive = False
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    check_origin(headers, tcp=self._tcp)
+                    status, payload = await self.dispatch(method, path, body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    # Answer instead of dropping the client without a word
+                    logging.exception(f"Request failed: {e}")
+                    status, payload, keep_alive = 500, {"error": "internal server error"}, False
+                write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT, path=None):
+        """Start listening on `host:port`, or on the Unix socket `path` if given.
+
+        Raises ValueError for a `host` that isn't a loopback address.
+        """
+        self._tcp = path is None
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self.handle_connection, path=path)
+        else:
+            if not is_loopback(host):
+                raise ValueError(f"refusing to listen on {host!r}: only loopback addresses are allowed")
+            self._server = await asyncio.start_server(self.handle_connection, host, port)
+        return self._server
+
+    @property
+    def address(self):
+        """Where the server listens: (host, port) or the socket path."""
+        return self._server.sockets[0].getsockname()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._pool.shutdown(wait=False)
+
+
+# Function to run the server until interrupted.
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, path=None, use_llama=True, budget=ruby_turns.TURN_BUDGET):
+    async def main():
+        server = RubyServer(use_llama=use_llama, budget=budget)
+        await server.start(host, port, path)
+        where = path or "{}:{}".format(*server.address[:2])
+        print(f"Ruby is listening on {where}", file=sys.stderr)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,408 @@
+import importlib.util
+import logging
+import os
+import queue
+import re
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def has_pyttsx3():
+    """Whether pyttsx3 is installed, checked without importing it.
+
+    The module itself is only imported when the engine is opened on the
+    speech worker thread, so it never delays startup.
+    """
+    return importlib.util.find_spec("pyttsx3") is not None
+
+
+def split_segments(text):
+    """Split `text` on `|` into the non-empty segments to be spoken."""
+    return [s.strip() for s in text.split('|') if s.strip()]
+
+
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s")
+_CLAUSE_END = re.compile(r"[,;:]\s")
+
+
+def chunk_sentences(pieces, clause_min=60, max_chars=200):
+    """Regroup a stream of text pieces into speakable chunks.
+
+    A chunk is emitted as soon as a sentence ends. Long sentences are also
+    cut at a clause boundary (`,` `;` `:`) once `clause_min` characters
+    are buffered, and at the last space once `max_chars` are buffered, so
+    speech can start long before the whole reply has been generated.
+    """
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        while True:
+            match = _SENTENCE_END.search(buffer)
+            if match is None and len(buffer) >= clause_min:
+                clauses = list(_CLAUSE_END.finditer(buffer))
+                # Prefer the first boundary that leaves a chunk of clause_min
+                match = next((m for m in clauses if m.end() >= clause_min), clauses[-1] if clauses else None)
+            if match is not None:
+                cut = match.end()
+            elif len(buffer) >= max_chars:
+                cut = buffer.rfind(" ", 0, max_chars) + 1 or max_chars
+            else:
+                break
+            chunk, buffer = buffer[:cut].strip(), buffer[cut:]
+            if chunk:
+                yield chunk
+    if buffer.strip():
+        yield buffer.strip()
+
+
+class Pyttsx3Backend:
+    """pyttsx3 engine, initialised once with the preferred voice and rate."""
+
+    name = "pyttsx3"
+
+    def __init__(self, driver='nsss', rate=180):
+        self.driver = driver
+        self.rate = rate
+        self.engine = None
+
+    def open(self):
+        import pyttsx3
+
+        self.engine = pyttsx3.init(self.driver)
+        # Try to prefer a female voice if available
+        try:
+            for voice in self.engine.getProperty('voices'):
+                if "female" in getattr(voice, 'name', '').lower() or 'samantha' in getattr(voice, 'id', '').lower():
+                    self.engine.setProperty('voice', voice.id)
+                    break
+        except Exception:
+            # non-fatal: voice selection may not be supported on all engines
+            pass
+        self.engine.setProperty('rate', self.rate)
+
+    def speak(self, segment):
+        self.engine.say(segment)
+        self.engine.runAndWait()
+
+    def stop(self):
+        if self.engine is not None:
+            self.engine.stop()
+
+
+class SayBackend:
+    """macOS `say` command, run directly (no shell) and killable mid-phrase.
+
+    Each segment starts its own `say` process: `say` cannot take phrases
+    one at a time on a long-lived process and report when each has ended,
+    which pauses and interrupts depend on.
+    """
+
+    name = "say"
+
+    def __init__(self, executable=None):
+        self.executable = executable or shutil.which("say")
+        self._proc = None
+
+    def open(self):
+        if not self.executable:
+            raise OSError("`say` command not found")
+
+    def speak(self, segment):
+        self._proc = subprocess.Popen([self.executable, segment])
+        try:
+            self._proc.wait()
+        finally:
+            self._proc = None
+
+    def stop(self):
+        proc = self._proc
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+
+
+class PrintBackend:
+    """Last resort: print what Ruby would have said to the console."""
+
+    name = "print"
+
+    def open(self):
+        pass
+
+    def speak(self, segment):
+        print("Ruby says:", segment)
+
+    def stop(self):
+        pass
+
+
+class NullBackend:
+    """Speaks nothing; for benchmarks and scripted runs."""
+
+    name = "null"
+
+    def open(self):
+        pass
+
+    def speak(self, segment):
+        pass
+
+    def stop(self):
+        pass
+
+
+def default_backends():
+    """Backends to try, best first, for the current environment.
+
+    The on-disk phrase cache (see `ruby_audio`) is opt-in: with
+    RUBY_SPEECH_CACHE=1, and a file renderer and audio player available,
+    phrases are rendered once and replayed from disk. Each new sentence
+    then costs a render plus a player process, so it only pays off for
+    short prompts that repeat. RUBY_SPEECH_PREWARM=1 also renders the
+    common phrases in the background when speech starts.
+    """
+    backends = []
+    if os.environ.get("RUBY_SPEECH_CACHE", "0") == "1":
+        import ruby_audio
+
+        renderer = ruby_audio.default_renderer()
+        if renderer is not None:
+            prewarm = os.environ.get("RUBY_SPEECH_PREWARM", "0") == "1"
+            backends.append(ruby_audio.CachedBackend(renderer, prewarm=prewarm))
+    if has_pyttsx3():
+        backends.append(Pyttsx3Backend())
+    backends.append(SayBackend())
+    backends.append(PrintBackend())
+    return backends
+
+
+class SpeechHandle:
+    """Tracks one queued utterance; lets callers wait for or cancel it."""
+
+    def __init__(self, segments, pause=0):
+        self.segments = segments
+        self.pause = pause
+        self._position = 0
+        self._done = threading.Event()
+        self._cancelled = threading.Event()
+        self._worker = None
+
+    @classmethod
+    def completed(cls, segments):
+        """A handle for speech that was handled synchronously (e.g. by a sink)."""
+        handle = cls(segments)
+        handle._done.set()
+        return handle
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the utterance finished or was cancelled.
+
+        Returns True if it completed within `timeout` seconds.
+        """
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        """Drop the utterance, cutting it off if it is being spoken now."""
+        if self._done.is_set():
+            return
+        self._cancelled.set()
+        if self._worker is not None:
+            self._worker._cancel_current(self)
+
+
+class SpeechWorker:
+    """Single long-lived thread that owns the speech engine.
+
+    The engine is opened (and its voice picked) once, on the worker thread,
+    the first time something is spoken. Utterances are queued and spoken in
+    order; `interrupt()` cuts off the current one and drops the backlog.
+    If the engine fails mid-utterance, the rest of that utterance is
+    printed instead; the next one tries the engine again.
+
+    Pauses between segments are measured with `clock` from the end of the
+    previous segment, so they last `pause` seconds whatever the engine did.
+    """
+
+    def __init__(self, backends=None, clock=time.monotonic):
+        self._candidates = backends
+        self._clock = clock
+        self.backend = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._current = None
+        self._thread = None
+        self._renderer = None
+        self._fallback = PrintBackend()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ruby-speech", daemon=True)
+                self._thread.start()
+
+    def _open_backend(self):
+        for backend in (self._candidates if self._candidates is not None else default_backends()):
+            try:
+                backend.open()
+                return backend
+            except Exception as e:
+                logging.debug(f"Speech backend {getattr(backend, 'name', backend)!r} unavailable: {e}")
+        return PrintBackend()
+
+    def _run(self):
+        if self.backend is None:
+            self.backend = self._open_backend()
+        while True:
+            handle = self._queue.get()
+            if handle is None:
+                break
+            with self._lock:
+                self._current = handle
+            try:
+                backend = self.backend
+                if hasattr(backend, "prepare"):
+                    try:
+                        self._speak_pipelined(handle)
+                    except Exception:
+                        logging.exception("Speech backend failed; printing the rest of this utterance")
+                        backend = self._fallback
+                self._speak_sequential(handle, backend)
+            finally:
+                with self._lock:
+                    self._current = None
+                handle._done.set()
+
+    def _gap(self, handle, until):
+        """Wait out the pause before the next segment; True if cancelled meanwhile."""
+        if until is None:
+            return handle.cancelled
+        # A cancelled handle wakes up from its pause immediately
+        return handle._cancelled.wait(max(0.0, until - self._clock()))
+
+    def _speak_sequential(self, handle, backend):
+        until = None
+        while handle._position < len(handle.segments):
+            if self._gap(handle, until):
+                return
+            segment = handle.segments[handle._position]
+            try:
+                backend.speak(segment)
+            except Exception:
+                # Only this utterance falls back; the next one retries the engine
+                logging.exception("Speech backend failed; printing the rest of this utterance")
+                backend = self._fallback
+                backend.speak(segment)
+            handle._position += 1
+            # The pause is measured from the end of this segment
+            until = self._clock() + handle.pause
+
+    def _render_pool(self):
+        if self._renderer is None:
+            self._renderer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ruby-render")
+        return self._renderer
+
+    def _speak_pipelined(self, handle):
+        """Speak with a backend that renders (`prepare`) and plays separately.
+
+        Segment N+1 is rendered on a helper thread while segment N plays, so
+        the gap between segments is just `pause`, not pause plus synthesis.
+        """
+        backend = self.backend
+        segments = handle.segments
+        pool = self._render_pool()
+        upcoming = pool.submit(backend.prepare, segments[handle._position]) if segments else None
+        until = None
+        try:
+            while upcoming is not None:
+                prepared = upcoming.result()
+                nxt = handle._position + 1
+                upcoming = pool.submit(backend.prepare, segments[nxt]) if nxt < len(segments) else None
+                if self._gap(handle, until):
+                    backend.discard(prepared)
+                    return
+                backend.play(prepared)
+                handle._position += 1
+                until = self._clock() + handle.pause
+        finally:
+            if upcoming is not None:
+                # Clean up a render nobody is going to play
+                upcoming.add_done_callback(
+                    lambda f: f.exception() is None and backend.discard(f.result()))
+
+    def _cancel_current(self, handle):
+        with self._lock:
+            speaking = self._current is handle
+        if speaking and self.backend is not None:
+            try:
+                self.backend.stop()
+            except Exception:
+                pass
+
+    def submit(self, text, pause=0):
+        """Queue `text` (segments separated by `|`) and return its handle."""
+        handle = SpeechHandle(split_segments(text), pause)
+        handle._worker = self
+        self._ensure_started()
+        self._queue.put(handle)
+        return handle
+
+    def interrupt(self):
+        """Stop the current utterance and discard everything still queued."""
+        pending = []
+        while True:
+            try:
+                pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for handle in pending:
+            if handle is None:
+                self._queue.put(None)
+                continue
+            handle._cancelled.set()
+            handle._done.set()
+        with self._lock:
+            current = self._current
+        if current is not None:
+            current.cancel()
+
+    def shutdown(self, timeout=None):
+        """Finish queued speech and stop the worker thread."""
+        with self._lock:
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout)
+
+
+_default_worker = None
+_default_lock = threading.Lock()
+
+
+def default_worker():
+    """Return the process-wide speech worker, creating it on first use."""
+    global _default_worker
+    with _default_lock:
+        if _default_worker is None:
+            _default_worker = SpeechWorker()
+        return _default_worker
+
+
+def use_backends(backends):
+    """Replace the process-wide worker with one using `backends` (e.g. silent)."""
+    global _default_worker
+    with _default_lock:
+        previous, _default_worker = _default_worker, SpeechWorker(backends)
+    if previous is not None:
+        previous.interrupt()
+        previous.shutdown(1)
+    return _default_worker
@@ -0,0 +1,12 @@
+def percentile(ordered, q):
+    """Linearly interpolated `q`th percentile (0-100) of an already sorted list.
+
+    Every latency summary in Ruby (traces, batch runs, the server, hedged
+    models and the benchmarks) uses this, so their numbers line up.
+    """
+    if not ordered:
+        return 0.0
+    pos = (len(ordered) - 1) * q / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
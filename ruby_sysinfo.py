@@ -0,0 +1,232 @@
+import functools
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+from collections import deque
+
+
+# Optional dependency: psutil. Imported on first use so it doesn't slow
+# down startup; safe fallbacks are used when it is missing.
+@functools.lru_cache(maxsize=None)
+def optional_psutil():
+    try:
+        import psutil
+    except Exception:
+        return None
+    return psutil
+
+# Fields that get min/avg/max summaries over a window
+NUMERIC_FIELDS = ("CPU Usage %", "RAM Used (GB)", "Disk Free (GB)", "Battery%")
+
+_static_info = None
+
+
+def local_ip():
+    """Return the primary local IPv4 address without any DNS lookup.
+
+    Connecting a UDP socket only selects a route; no packet is sent.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.connect(("10.255.255.255", 1))
+        return sock.getsockname()[0]
+    except OSError:
+        return "127.0.0.1"
+    finally:
+        sock.close()
+
+
+def static_info():
+    """Platform fields that never change while Ruby runs (computed once)."""
+    global _static_info
+    if _static_info is None:
+        import platform
+
+        psutil = optional_psutil()
+        info = {}
+        info["OS"] = platform.system()
+        info["OS Version"] = platform.version()
+        info["Release"] = platform.release()
+        info["Machine"] = platform.machine()
+        info["CPU"] = platform.processor()
+        info["Cores"] = psutil.cpu_count(logical=True) if psutil is not None else os.cpu_count()
+        info["Hostname"] = socket.gethostname()
+        _static_info = info
+    return dict(_static_info)
+
+
+def psutil_fallback(info: dict):
+    """Populate basic system info when psutil is not available."""
+    # Cannot get CPU percent or RAM info without psutil
+    info["CPU Usage %"] = None
+    info["RAM Total (GB)"] = None
+    info["RAM Used (GB)"] = None
+    try:
+        disk = shutil.disk_usage('/')
+        info["Disk Total (GB)"] = round(disk.total / (1024**3), 2)
+        info["Disk Free (GB)"] = round(disk.free / (1024**3), 2)
+    except Exception:
+        info["Disk Total (GB)"] = None
+        info["Disk Free (GB)"] = None
+
+
+def collect_sample():
+    """Take one non-blocking reading of the changing system metrics."""
+    sample = {"time": time.time()}
+    psutil = optional_psutil()
+    if psutil is not None:
+        try:
+            # interval=None compares against the previous call instead of sleeping
+            sample["CPU Usage %"] = psutil.cpu_percent(interval=None)
+            mem = psutil.virtual_memory()
+            sample["RAM Total (GB)"] = round(mem.total / (1024**3), 2)
+            sample["RAM Used (GB)"] = round(mem.used / (1024**3), 2)
+            disk = psutil.disk_usage('/')
+            sample["Disk Total (GB)"] = round(disk.total / (1024**3), 2)
+            sample["Disk Free (GB)"] = round(disk.free / (1024**3), 2)
+        except Exception:
+            psutil_fallback(sample)
+    else:
+        psutil_fallback(sample)
+    sample["Local IP"] = local_ip()
+    if psutil is not None and hasattr(psutil, "sensors_battery"):
+        try:
+            battery = psutil.sensors_battery()
+        except Exception:
+            battery = None
+        if battery:
+            sample["Battery%"] = battery.percent
+    return sample
+
+
+def prime_cpu():
+    """Start psutil's CPU measurement; its first non-blocking reading is always 0.0."""
+    psutil = optional_psutil()
+    if psutil is not None:
+        try:
+            psutil.cpu_percent(interval=None)
+        except Exception:
+            pass
+
+
+class SystemSampler:
+    """Background thread that samples system metrics into a ring buffer.
+
+    `snapshot()` returns the static fields merged with the latest sample
+    without waiting; `stats(window)` summarizes the last `window` seconds.
+    Before the first sample the CPU counter is primed and given `warmup`
+    seconds, so the first reading is a real one rather than 0.0.
+    """
+
+    def __init__(self, interval=2.0, history=300, collect=collect_sample, prime=prime_cpu, warmup=0.1):
+        self.interval = interval
+        self.warmup = warmup
+        self._collect = collect
+        self._prime_counters = prime
+        self._samples = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._first = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ruby-sysinfo", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _prime(self):
+        self._prime_counters()
+        self._stop.wait(self.warmup)
+
+    def _record(self):
+        sample = self._collect()
+        with self._lock:
+            self._samples.append(sample)
+        self._first.set()
+        return sample
+
+    def _run(self):
+        self._prime()
+        while not self._stop.is_set():
+            self._record()
+            self._stop.wait(self.interval)
+
+    def latest(self):
+        """Most recent sample; waits for the first one (or takes it) if none exists yet."""
+        with self._lock:
+            if self._samples:
+                return self._samples[-1]
+        if self._thread is not None and self._thread.is_alive() and self._first.wait(self.warmup + 1.0):
+            with self._lock:
+                return self._samples[-1]
+        self._prime()
+        return self._record()
+
+    def snapshot(self):
+        info = static_info()
+        sample = self.latest()
+        info.update((k, v) for k, v in sample.items() if k != "time")
+        return info
+
+    def stats(self, window):
+        """Return {field: {"min", "avg", "max"}} over the last `window` seconds."""
+        cutoff = time.time() - window
+        with self._lock:
+            recent = [s for s in self._samples if s["time"] >= cutoff]
+        summary = {}
+        for field in NUMERIC_FIELDS:
+            values = [s[field] for s in recent if s.get(field) is not None]
+            if values:
+                summary[field] = {
+                    "min": min(values),
+                    "avg": round(sum(values) / len(values), 2),
+                    "max": max(values),
+                }
+        return summary
+
+
+INTERVAL_ENV = "RUBY_SYSINFO_INTERVAL"
+DEFAULT_INTERVAL = 2.0
+
+_default_sampler = None
+_default_lock = threading.Lock()
+
+
+def sample_interval():
+    """Seconds between background samples: $RUBY_SYSINFO_INTERVAL, else 2."""
+    value = os.environ.get(INTERVAL_ENV, "")
+    try:
+        interval = float(value) if value else DEFAULT_INTERVAL
+    except ValueError:
+        interval = -1
+    if interval <= 0:
+        logging.warning(f"Ignoring {INTERVAL_ENV}={value!r}; sampling every {DEFAULT_INTERVAL:g}s")
+        return DEFAULT_INTERVAL
+    return interval
+
+
+def default_sampler(interval=None):
+    """Return the shared sampler, starting its thread on first use.
+
+    `interval` (seconds between samples) defaults to `sample_interval()`;
+    passing one retunes an already running sampler from its next sample on.
+    """
+    global _default_sampler
+    with _default_lock:
+        if _default_sampler is None:
+            _default_sampler = SystemSampler(interval=interval or sample_interval())
+            _default_sampler.start()
+        elif interval:
+            _default_sampler.interval = interval
+        return _default_sampler
@@ -0,0 +1,130 @@
+import threading
+import time
+
+
+class Timer:
+    """One running countdown. Use `wait()` to block until it ends."""
+
+    def __init__(self, name, seconds, started, tick, named=True):
+        self.name = name
+        self.named = named
+        self.seconds = seconds
+        self.started = started
+        self.deadline = started + seconds * tick
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self.thread = None
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+
+class TimerService:
+    """Runs named countdown timers in the background against a monotonic clock.
+
+    Each tick is scheduled at an absolute deadline (`start + k * tick`), so
+    time spent speaking never stretches the countdown. When an announcement
+    overruns the next tick, the stale numbers are skipped and only the
+    latest remaining count is spoken. "Time's up!" lands on the deadline.
+
+    `speak` is called from the timer threads with the text to announce,
+    and `show` with the "Time's up!" line to put on screen.
+    """
+
+    def __init__(self, speak, clock=time.monotonic, tick=1.0, show=print):
+        self._speak = speak
+        self._show = show
+        self._clock = clock
+        self.tick = tick
+        self._lock = threading.Lock()
+        self._timers = {}
+        self._counter = 0
+
+    def start(self, seconds, name=None):
+        """Start a countdown of `seconds` ticks and return its `Timer`."""
+        with self._lock:
+            named = bool(name)
+            if not named:
+                # Skip numbers whose name a user already picked for their own timer
+                self._counter += 1
+                while f"timer {self._counter}" in self._timers:
+                    self._counter += 1
+                name = f"timer {self._counter}"
+            if name in self._timers:
+                raise ValueError(f"A timer named {name!r} is already running.")
+            timer = Timer(name, int(seconds), self._clock(), self.tick, named)
+            self._timers[name] = timer
+        timer.thread = threading.Thread(target=self._run, args=(timer,), name=f"ruby-{name}", daemon=True)
+        timer.thread.start()
+        return timer
+
+    def _sleep_until(self, timer, deadline):
+        # Returns True if the timer was cancelled before or while waiting
+        if timer._cancelled.is_set():
+            return True
+        delay = deadline - self._clock()
+        return delay > 0 and timer._cancelled.wait(delay)
+
+    def _run(self, timer):
+        try:
+            next_tick = 0
+            while next_tick < timer.seconds:
+                if self._sleep_until(timer, timer.started + next_tick * self.tick):
+                    return
+                now = self._clock()
+                if now >= timer.deadline:
+                    break
+                # Coalesce: announce only the latest tick that has come due
+                due = min(int((now - timer.started) / self.tick), timer.seconds - 1)
+                due = max(due, next_tick)
+                self._speak(str(timer.seconds - due))
+                next_tick = due + 1
+            if self._sleep_until(timer, timer.deadline):
+                return
+            message = f"Time's up for {timer.name}!" if timer.named else "Time's up!"
+            self._show(message)
+            self._speak(message)
+        finally:
+            with self._lock:
+                if self._timers.get(timer.name) is timer:
+                    del self._timers[timer.name]
+            timer._done.set()
+
+    def list(self):
+        """Return the running timers, soonest deadline first."""
+        with self._lock:
+            return sorted(self._timers.values(), key=lambda t: t.deadline)
+
+    def remaining(self, timer):
+        """Seconds left on `timer`."""
+        return max(0.0, (timer.deadline - self._clock()) / self.tick)
+
+    def cancel(self, name=None):
+        """Cancel the timer called `name` (or the most recent one).
+
+        Returns the cancelled `Timer`, or None if there was nothing to cancel.
+        """
+        with self._lock:
+            if name is None:
+                if not self._timers:
+                    return None
+                timer = max(self._timers.values(), key=lambda t: t.started)
+            else:
+                timer = self._timers.get(name)
+                if timer is None:
+                    return None
+            del self._timers[timer.name]
+        timer._cancelled.set()
+        return timer
+
+    def cancel_all(self):
+        for timer in self.list():
+            self.cancel(timer.name)
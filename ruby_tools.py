@@ -1,131 +1,212 @@
 import os
-import time
+import contextlib
+import contextvars
 import datetime
-import platform
-import socket
-import uuid
-import shlex
-
-# Optional dependencies: psutil and pyttsx3. Use safe fallbacks when missing.
-try:
-    import psutil
-except Exception:
-    psutil = None
-
-try:
-    import pyttsx3
-except Exception:
-    pyttsx3 = None
-
-# Function to convert text to speech using pyttsx3 on macOS.
+import sys
+
+import ruby_notes
+import ruby_speech
+import ruby_sysinfo
+import ruby_timers
+import ruby_trace
+from ruby_commands import registry
+
+# Where speech goes instead of the speech worker while set (see redirect_speech)
+_speech_sink = contextvars.ContextVar("ruby_speech_sink", default=None)
+
+# Stream for on-screen text when no sink is set; None means sys.stdout
+_console = None
+
+# Function to convert text to speech through Ruby's background speech worker.
 # Speaks the given text with optional pause between segments.
-def ruby_speak(text, pause=0):
+def ruby_speak(text, pause=0, block=True):
     """Speak the given `text`.
 
-    Tries to use `pyttsx3` when available, falls back to the macOS
-    `say` command, and finally prints to stdout if neither is available.
-    Text may include `|` to separate speaking segments.
+    Speech runs on a long-lived worker thread that opens the engine once:
+    `pyttsx3` when available, then the macOS `say` command, and finally
+    printing to stdout. Text may include `|` to separate speaking segments.
+
+    With `block=False` this returns immediately; the returned handle can be
+    used to `wait()` for or `cancel()` the utterance.
     """
-    segments = [s.strip() for s in text.split('|') if s.strip()]
+    sink = _speech_sink.get()
+    if sink is not None:
+        # `|` only marks pauses for the speech engine
+        segments = ruby_speech.split_segments(text)
+        sink(" ".join(segments))
+        return ruby_speech.SpeechHandle.completed(segments)
+    with ruby_trace.span("speech", blocking=block):
+        handle = ruby_speech.default_worker().submit(text, pause)
+        if block:
+            handle.wait()
+    return handle
 
-    # Prefer pyttsx3 if installed and usable
-    if pyttsx3 is not None:
-        try:
-            engine = pyttsx3.init('nsss')
-            # Try to prefer a female voice if available
-            try:
-                for voice in engine.getProperty('voices'):
-                    if "female" in getattr(voice, 'name', '').lower() or 'samantha' in getattr(voice, 'id', '').lower():
-                        engine.setProperty('voice', voice.id)
-                        break
-            except Exception:
-                # non-fatal: voice selection may not be supported on all engines
-                pass
-            engine.setProperty('rate', 180)
-            for segment in segments:
-                engine.say(segment)
-                engine.runAndWait()
-                time.sleep(pause)
-            return
-        except Exception:
-            # Fall through to other fallbacks
-            pass
 
-    # macOS native `say` command fallback
+def stop_speaking():
+    """Interrupt whatever Ruby is saying and drop any queued speech."""
+    ruby_speech.default_worker().interrupt()
+
+
+# Function to show text on screen (note listings, system info, timer alerts).
+def ruby_show(text):
+    """Display `text` without speaking it.
+
+    Inside `redirect_speech` the text goes to the sink along with the
+    speech, so batch results and server replies include it; otherwise it
+    is printed to the console stream (see `set_console`).
+    """
+    sink = _speech_sink.get()
+    if sink is not None:
+        sink(text)
+    else:
+        print(text, file=_console or sys.stdout)
+
+
+def set_console(stream):
+    """Send on-screen text from outside any redirect (e.g. timers) to `stream`.
+
+    Batch and server mode point this at stderr so stdout carries nothing
+    but results. Returns the previous stream.
+    """
+    global _console
+    previous, _console = _console, stream
+    return previous
+
+
+@contextlib.contextmanager
+def redirect_speech(sink):
+    """Send everything `ruby_speak` says in this context to `sink(text)`.
+
+    Used for batch runs and server sessions, where replies are collected
+    as text instead of spoken. Speech from other threads (e.g. timers)
+    still goes to the speech worker.
+    """
+    token = _speech_sink.set(sink)
     try:
-        for segment in segments:
-            safe = shlex.quote(segment)
-            os.system(f"say {safe}")
-            time.sleep(pause)
-        return
-    except Exception:
-        pass
+        yield sink
+    finally:
+        _speech_sink.reset(token)
+
+
+# Function to speak streamed text (e.g. a model reply) sentence by sentence.
+def speak_stream(pieces, block=True):
+    """Speak text arriving as a stream of pieces, one sentence at a time.
+
+    Each complete sentence or clause is queued for speech immediately, so
+    Ruby starts talking while the rest is still being generated. Returns
+    the full text.
+    """
+    spoken = []
+    handle = None
+    for chunk in ruby_speech.chunk_sentences(pieces):
+        spoken.append(chunk)
+        handle = ruby_speak(chunk, block=False)
+    if block and handle is not None:
+        handle.wait()
+    return " ".join(spoken)
+
+
+# Function to ask the local model something and speak the answer as it streams in.
+def speak_llm_reply(prompt, model="mistral"):
+    import llm_client
+
+    return speak_stream(llm_client.stream_llama(prompt, model=model))
+
+# Function to ask for a command's missing arguments with its registry prompts.
+# Handlers use it when called directly, so each question is written only once.
+def _collect(command, **given):
+    def ask(prompt, text, answers):
+        ruby_speak(text)
+        return input(prompt.label)
 
-    # Last resort: print to console
-    for segment in segments:
-        print("Ruby says:", segment)
-        time.sleep(pause)
+    answers = {key: value for key, value in given.items() if value is not None}
+    return registry.get(command).collect(ask, answers)
 
 # Function to prompt user to take notes and save them to a timestamped text file.
 # Can start new session or continue existing notes file.
-def take_note():
-    """Interactively append a timestamped note to a file.
+def take_note(session=None, note=None, filename=None):
+    """Append a timestamped note to a file.
 
     If user chooses to start a new session, prompt for filename; otherwise
-    append to `notes.txt`.
+    append to `notes.txt`. Answers already collected (e.g. by the command
+    registry) can be passed in; anything missing is asked for interactively
+    with the command's registry prompts.
     """
-    ruby_speak("Do you want to start a new session?")
-    session = input("Y/N: ").lower().strip()
-    if session == 'y':
-        ruby_speak("Starting new session.")
-        filename = input("file name: ").strip()
-        if not filename:
-            ruby_speak("No file name given, using notes.txt")
-            filepath = "notes.txt"
-        else:
-            filepath = filename + ".txt"
-    else:
-        ruby_speak("Continuing in existing session.")
-        filepath = "notes.txt"
-
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    ruby_speak("What should I write?")
-    note = input("Note: ")
-    note = f"\n{'-'*40}\n[{timestamp}]\n{note.strip()}\n"
+    answers = _collect("take_note", session=session, filename=filename, note=note)
+    filepath = "notes.txt"
+    if answers["session"].lower().strip() == 'y' and answers.get("filename", "").strip():
+        filepath = answers["filename"].strip() + ".txt"
+    note = answers["note"]
 
     try:
-        with open(filepath, "a", encoding="utf-8") as f:
-            f.write(note)
+        ruby_notes.notes_store(filepath).append(note)
         ruby_speak("Note saved.")
     except Exception:
         ruby_speak("Failed to save note.")
 
-# Function to open common applications on macOS based on app name.
-# Uses 'open -a' shell command compatible with macOS.
+# Function to search a notes file by keywords and/or date range using its index.
+def search_notes(query, filepath="notes.txt"):
+    """Search notes for `query` and read out how many matched.
+
+    The query may contain `from:YYYY-MM-DD` and `to:YYYY-MM-DD` to limit
+    the date range; the remaining words must all appear in a note.
+    Matching notes are printed newest first and returned.
+    """
+    start = end = None
+    words = []
+    for word in (query or "").split():
+        if word.lower().startswith("from:"):
+            start = word[5:]
+        elif word.lower().startswith("to:"):
+            end = word[3:]
+        else:
+            words.append(word)
+    try:
+        results = ruby_notes.notes_store(filepath).search(" ".join(words), start=start, end=end)
+    except Exception:
+        ruby_speak("I couldn't search the notes.")
+        return []
+    if not results:
+        ruby_speak("I found no matching notes.")
+        return []
+    for note in results:
+        ruby_show(f"[{note.timestamp}] {note.body}")
+    ruby_speak(f"I found {len(results)} matching note{'s' if len(results) != 1 else ''}.")
+    return results
+
+# Function to read out the most recent notes without loading the whole file.
+def read_last_notes(count=3, filepath="notes.txt"):
+    notes = ruby_notes.notes_store(filepath).last(count)
+    if not notes:
+        ruby_speak("You don't have any notes yet.")
+        return []
+    for note in notes:
+        ruby_show(f"[{note.timestamp}] {note.body}")
+        ruby_speak(note.body)
+    return notes
+
+# Function to open an installed application by (approximate) name.
+# Looks the name up in the cached application index (see ruby_apps).
 def open_app(app_name):
-    """Open a macOS application by name (best-effort).
+    """Open an installed application by name (best-effort).
 
-    This function is intentionally forgiving and will speak a message
-    if it doesn't recognize the requested application.
+    Names are matched fuzzily against `.app` bundles (macOS) or `.desktop`
+    entries (Linux), so "visual studio" finds "Visual Studio Code". This
+    function is intentionally forgiving and will speak a message if no
+    installed application matches.
     """
-    app_name = (app_name or "").lower()
-    if "spotify" in app_name:
-        ruby_speak("Opening Spotify.")
-        os.system("open -a Spotify")
-    elif "chrome" in app_name:
-        ruby_speak("Opening Chrome.")
-        os.system("open -a 'Google Chrome'")
-    elif "brave" in app_name:
-        ruby_speak("Opening Brave.")
-        os.system("open -a Brave")
-    elif "calc" in app_name or "calculator" in app_name:
-        ruby_speak("Opening Calculator.")
-        os.system("open -a Calculator")
-    elif "notes" in app_name:
-        ruby_speak("Opening Notes.")
-        os.system("open -a Notes")
-    else:
+    import ruby_apps
+
+    app = ruby_apps.default_index().find(app_name or "")
+    if app is None:
         ruby_speak("Sorry, I don't know that app yet.")
+        return None
+    ruby_speak(f"Opening {app.name}.")
+    try:
+        ruby_apps.launch(app)
+    except OSError:
+        ruby_speak(f"I couldn't open {app.name}.")
+    return app
 
 # Function to tell the current system time in 12-hour format.
 def get_time():
@@ -136,19 +217,29 @@ def get_time():
 def clear_notes():
     """Clear the default `notes.txt` file contents."""
     try:
-        with open("notes.txt", "w", encoding="utf-8"):
-            pass
+        ruby_notes.notes_store("notes.txt").clear()
         ruby_speak("All notes have been cleared.")
     except Exception:
         ruby_speak("I couldn't clear the notes.")
 
-# Function to start a countdown for given duration in seconds or minutes.
-# Speaks countdown numbers at one second intervals.
-def countdown(duration):
-    """Start a spoken countdown.
+# Function to clear notes only after the user answered Y to the confirmation.
+def confirm_clear_notes(confirm):
+    resp = (confirm or "").lower().strip()
+    if resp == 'y':
+        clear_notes()
+    elif resp == 'n':
+        ruby_speak("Ok, I won't clear notes.")
+    else:
+        ruby_speak("Enter a valid input.")
+
+# Function to start a background countdown for given duration in seconds or minutes.
+# Speaks countdown numbers at one second intervals while the REPL stays usable.
+def countdown(duration, name=None):
+    """Start a spoken countdown in the background.
 
     `duration` may be a number of seconds (string or numeric) or contain the
-    word "minute(s)"; e.g. "2 minutes".
+    word "minute(s)"; e.g. "2 minutes". Returns the running timer, or None
+    if the duration could not be understood.
     """
     try:
         duration = str(duration).strip().lower()
@@ -157,41 +248,104 @@ def countdown(duration):
             seconds = int(number * 60)
         else:
             seconds = int(float(duration))
-        ruby_speak(f"Starting countdown for {seconds} seconds now.")
-        while seconds > 0:
-            print(seconds)
-            ruby_speak(str(seconds))
-            time.sleep(1)
-            seconds -= 1
-        print("Time's up!")
-        ruby_speak("Time's up!")
     except Exception:
         ruby_speak("Please enter a valid number.")
+        return None
+    if name and any(t.name == name for t in timer_service().list()):
+        ruby_speak(f"A timer called {name} is already running.")
+        return None
+    ruby_speak(f"Starting {name or 'countdown'} for {seconds} seconds now.")
+    try:
+        return timer_service().start(seconds, name=name)
+    except ValueError:
+        # Another turn started a timer with this name since the check above
+        ruby_speak(f"A timer called {name} is already running.")
+        return None
+
+# Function to speak the names and remaining time of all running timers.
+def list_timers():
+    timers = timer_service().list()
+    if not timers:
+        ruby_speak("There are no timers running.")
+        return []
+    for timer in timers:
+        ruby_speak(f"{timer.name}: {int(timer_service().remaining(timer))} seconds left.")
+    return timers
+
+# Function to cancel a running timer by name, or the most recent one.
+def cancel_timer(name=None):
+    name = (name or "").strip().lower()
+    if name:
+        # Names are matched case-insensitively ("Timer 1" -> "timer 1")
+        matches = [t.name for t in timer_service().list() if t.name.lower() == name]
+        timer = timer_service().cancel(matches[0]) if matches else None
+    else:
+        timer = timer_service().cancel()
+    if timer is None:
+        ruby_speak("I couldn't find that timer.")
+    else:
+        ruby_speak(f"Cancelled {timer.name}.")
+    return timer
+
+
+_timer_service = None
+
+
+def timer_service():
+    """Return the shared background timer service."""
+    global _timer_service
+    if _timer_service is None:
+        # Resolve ruby_speak at call time so it can be swapped out (e.g. in tests)
+        _timer_service = ruby_timers.TimerService(speak=lambda text: ruby_speak(text),
+                                                  show=lambda text: ruby_show(text))
+    return _timer_service
 
 # Function to open a user specified folder located in home directory.
-# Uses macOS 'open' command for folder navigation.
-def open_folder():
-    ruby_speak("What folder should I open?")
-    folder = input("Folder: ").strip()
+# Names that aren't a path under home are looked up in the folder index.
+def open_folder(folder=None):
+    """Open a folder by relative path or by (approximate) name.
+
+    "Documents/taxes" opens that path under the home directory; otherwise
+    the name is resolved through the home-directory folder index (see
+    `ruby_folders`), so "invoices" finds ~/Work/Invoices. Returns the path
+    opened, or None.
+    """
+    import ruby_folders
+
+    folder = _collect("open_folder", folder=folder)["folder"].strip()
     if not folder:
         ruby_speak("No folder provided.")
-        return
-    ruby_speak("Opening your folder.")
+        return None
     user_home = os.path.expanduser("~")
     path = os.path.join(user_home, folder)
-    safe = shlex.quote(path)
-    os.system(f"open {safe}")
+    if not os.path.isdir(path):
+        index = ruby_folders.default_index()
+        path = index.find(folder)
+        if path is None and index.refreshing:
+            # The first crawl is still running; top-level folders still work
+            path = ruby_folders.find_shallow(folder)
+            if path is None:
+                ruby_speak("I'm still indexing your folders. Please try again in a moment.")
+                return None
+    if path is None:
+        ruby_speak("I couldn't find that folder.")
+        return None
+    ruby_speak("Opening your folder.")
+    try:
+        ruby_folders.open_path(path)
+    except OSError:
+        ruby_speak("I couldn't open the folder.")
+    return path
 
 # Function to delete a specified text file after user confirmation.
-def del_files():
-    ruby_speak("What files do you want me to delete?")
-    filename = input("File name: ").strip()
+def del_files(filename=None, confirm=None):
+    answers = _collect("del_files", filename=filename, confirm=confirm)
+    filename = answers["filename"].strip()
     if not filename:
         ruby_speak("No file name given.")
         return
     file = filename + ".txt"
-    ruby_speak(f"Are you sure you want to delete {file}?")
-    resp = input("Y/N: ").lower().strip()
+    resp = answers["confirm"].lower().strip()
     if resp == 'y':
         try:
             if os.path.exists(file):
@@ -206,60 +360,22 @@ def del_files():
 
 # Function to gather detailed system information including OS, CPU, RAM, disk, network, and battery.
 # Useful for diagnostics or reporting system status.
-def get_system_info():
-    info = {}
-    info["OS"] = platform.system()
-    info["OS Version"] = platform.version()
-    info["Release"] = platform.release()
-    info["Machine"] = platform.machine()
-    info["CPU"] = platform.processor()
-    # Use psutil when available, otherwise use safe fallbacks
-    if psutil is not None:
-        try:
-            info["Cores"] = psutil.cpu_count(logical=True)
-            info["CPU Usage %"] = psutil.cpu_percent(interval=1)
-            mem = psutil.virtual_memory()
-            info["RAM Total (GB)"] = round(mem.total / (1024**3), 2)
-            info["RAM Used (GB)"] = round(mem.used / (1024**3), 2)
-            disk = psutil.disk_usage('/')
-            info["Disk Total (GB)"] = round(disk.total / (1024**3), 2)
-            info["Disk Free (GB)"] = round(disk.free / (1024**3), 2)
-        except Exception:
-            psutil_fallback(info)
-    else:
-        psutil_fallback(info)
-    info["Hostname"] = socket.gethostname()
-    info["Local IP"] = socket.gethostbyname(socket.gethostname())
-    if hasattr(psutil, "sensors_battery"):
-        battery = psutil.sensors_battery()
-        if battery:
-            info["Battery%"] = battery.percent
-    return info
+def get_system_info(window=None):
+    """Return the latest system snapshot without blocking.
 
+    Readings come from a background sampler (see `ruby_sysinfo`). Pass
+    `window` (seconds) to also get min/avg/max of the changing metrics over
+    that period under the "Stats" key.
+    """
+    sampler = ruby_sysinfo.default_sampler()
+    info = sampler.snapshot()
+    if window:
+        info["Stats"] = sampler.stats(window)
+    return info
 
-def psutil_fallback(info: dict):
-    """Populate basic system info when psutil is not available."""
-    try:
-        info["Cores"] = os.cpu_count()
-    except Exception:
-        info["Cores"] = None
-    try:
-        # Cannot get CPU percent without psutil; set to None
-        info["CPU Usage %"] = None
-    except Exception:
-        info["CPU Usage %"] = None
-    try:
-        import shutil
-        disk = shutil.disk_usage('/')
-        info["Disk Total (GB)"] = round(disk.total / (1024**3), 2)
-        info["Disk Free (GB)"] = round(disk.free / (1024**3), 2)
-    except Exception:
-        info["Disk Total (GB)"] = None
-        info["Disk Free (GB)"] = None
-    try:
-        # RAM info not available without psutil
-        info["RAM Total (GB)"] = None
-        info["RAM Used (GB)"] = None
-    except Exception:
-        info["RAM Total (GB)"] = None
-        info["RAM Used (GB)"] = None
+# Function to show the latest system snapshot on screen.
+def print_system_info():
+    info = get_system_info()
+    lines = ["=== System Info ===", *(f"{k}: {v}" for k, v in info.items()), "====================="]
+    ruby_show("\n".join(lines))
+    return info
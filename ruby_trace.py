@@ -0,0 +1,254 @@
+import contextvars
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+from ruby_intent_cache import default_cache_dir
+from ruby_stats import percentile
+
+# Tracing is off unless RUBY_TRACE is set: "1" writes to the default trace
+# file under the cache directory, anything else is taken as the file path.
+TRACE_ENV = "RUBY_TRACE"
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+
+_current_turn = contextvars.ContextVar("ruby_trace_turn", default=None)
+
+
+class _NullSpan:
+    """Stands in for a span or turn while tracing is off; does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def span(self, stage, **attrs):
+        return self
+
+
+_NULL = _NullSpan()
+
+
+class Span:
+    """Times one stage of a turn between `__enter__` and `__exit__`."""
+
+    __slots__ = ("turn", "stage", "attrs", "started")
+
+    def __init__(self, turn, stage, attrs):
+        self.turn = turn
+        self.stage = stage
+        self.attrs = attrs
+        self.started = None
+
+    def __enter__(self):
+        self.started = self.turn.clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ended = self.turn.clock()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.turn._record(self.stage, self.started, ended, self.attrs)
+        return False
+
+    def set(self, **attrs):
+        """Attach attributes (e.g. the classification source) to the span."""
+        self.attrs.update(attrs)
+
+
+class Turn:
+    """One user turn; collects its spans and writes them when it ends.
+
+    While a turn is active, `ruby_trace.span()` anywhere in the same
+    context (including work submitted with `contextvars.copy_context()`)
+    records into it.
+    """
+
+    def __init__(self, tracer, turn_id, attrs):
+        self.tracer = tracer
+        self.clock = tracer.clock
+        self.id = turn_id
+        self.attrs = attrs
+        self.records = []
+        self._lock = threading.Lock()
+        self.started = None
+        self._token = None
+
+    def __enter__(self):
+        self.started = self.clock()
+        self._token = _current_turn.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ended = self.clock()
+        _current_turn.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self._record("turn", self.started, ended, self.attrs)
+        self.tracer.write(self.records)
+        return False
+
+    def span(self, stage, **attrs):
+        return Span(self, stage, attrs)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def _record(self, stage, started, ended, attrs):
+        record = {
+            "turn": self.id,
+            "stage": stage,
+            "start_ms": round((started - self.started) * 1000, 3),
+            "ms": round((ended - started) * 1000, 3),
+        }
+        record.update(attrs)
+        with self._lock:
+            self.records.append(record)
+
+
+class Tracer:
+    """
+    Writes per-turn stage spans to a size-rotated JSONL file.
+
+    Each line is one span: the turn id, the stage name ("match", "model",
+    "prompt", "action", "speech" or "turn" for the whole turn), its start
+    offset within the turn and its duration in milliseconds (monotonic
+    clock), plus any attributes set on it. When the file would grow past
+    `max_bytes` it is renamed to `<path>.1` (older files shift up to
+    `<path>.<backups>`) and a new file is started.
+
+    Args:
+        path (str): Trace file to append to.
+        max_bytes (int): Rotate once the file reaches this size.
+        backups (int): Rotated files to keep.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS, clock=time.monotonic):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.clock = clock
+        self._ids = itertools.count(1)
+        self._prefix = f"{int(time.time())}-{os.getpid()}"
+        self._lock = threading.Lock()
+
+    def turn(self, utterance=None, **attrs):
+        """Start a turn; use as a context manager around the whole turn."""
+        if utterance is not None:
+            attrs["utterance"] = utterance
+        return Turn(self, f"{self._prefix}-{next(self._ids)}", attrs)
+
+    def write(self, records):
+        if not records:
+            return
+        data = "".join(json.dumps(r) + "\n" for r in records).encode("utf-8")
+        with self._lock:
+            parent = os.path.dirname(self.path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                size = 0
+            if size and size + len(data) > self.max_bytes:
+                self._rotate()
+            with open(self.path, "ab") as f:
+                f.write(data)
+
+    def _rotate(self):
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def files(self):
+        """The trace file and its rotated backups that exist, oldest first."""
+        paths = [f"{self.path}.{i}" for i in range(self.backups, 0, -1)] + [self.path]
+        return [p for p in paths if os.path.exists(p)]
+
+
+def default_trace_path():
+    return os.path.join(default_cache_dir(), "trace.jsonl")
+
+
+_default_tracer = None
+_default_setting = None
+
+
+def default_tracer():
+    """Return the tracer configured by $RUBY_TRACE, or None when tracing is off."""
+    global _default_tracer, _default_setting
+    setting = os.environ.get(TRACE_ENV, "")
+    if setting != _default_setting:
+        _default_setting = setting
+        if setting in ("", "0"):
+            _default_tracer = None
+        else:
+            _default_tracer = Tracer(default_trace_path() if setting == "1" else setting)
+    return _default_tracer
+
+
+def turn(utterance=None, **attrs):
+    """Trace one turn with the default tracer (a no-op when tracing is off)."""
+    tracer = default_tracer()
+    if tracer is None:
+        return _NULL
+    return tracer.turn(utterance, **attrs)
+
+
+def span(stage, **attrs):
+    """Time a stage of the current turn; a no-op outside a traced turn."""
+    current = _current_turn.get()
+    if current is None:
+        return _NULL
+    return current.span(stage, **attrs)
+
+
+def summarize(paths):
+    """Per-stage latency summary of the given trace files.
+
+    Returns {stage: {"n", "mean", "p50", "p95", "p99", "max"}} in ms.
+    """
+    durations = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by a crash
+                durations.setdefault(record.get("stage"), []).append(record.get("ms", 0.0))
+    summary = {}
+    for stage, values in durations.items():
+        values.sort()
+        summary[stage] = {
+            "n": len(values),
+            "mean": round(sum(values) / len(values), 3),
+            "p50": round(percentile(values, 50), 3),
+            "p95": round(percentile(values, 95), 3),
+            "p99": round(percentile(values, 99), 3),
+            "max": values[-1],
+        }
+    return summary
+
+
+if __name__ == "__main__":
+    # Summarize a trace file (and its rotated backups):
+    #   python ruby_trace.py [path/to/trace.jsonl]
+    tracer = Tracer(sys.argv[1] if len(sys.argv) > 1 else (default_tracer() or Tracer(default_trace_path())).path)
+    print(json.dumps(summarize(tracer.files()), indent=2))
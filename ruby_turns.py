@@ -0,0 +1,70 @@
+import time
+
+import ruby_tools
+import ruby_trace
+from ruby_commands import registry
+from ruby_keymap import EXIT_WORDS, classify
+
+# Seconds a single turn may spend classifying before giving up on the model
+TURN_BUDGET = 8.0
+
+
+# Function to ask one of a command's prompts: speak the question, read the answer.
+def ask(prompt, text, answers):
+    ruby_tools.ruby_speak(text)
+    return input(prompt.label)
+
+
+# Function to answer an utterance that matched no command; returns True for a goodbye.
+def respond_unmatched(command):
+    if any(kw in command for kw in EXIT_WORDS):
+        ruby_tools.ruby_speak("Goodbye.")
+        return True
+    ruby_tools.ruby_speak("Sorry, I couldn't understand that.", block=False)
+    return False
+
+
+# Function to classify one utterance and run its command, asking prompts through `ask`.
+def run_turn(command, ask=ask, use_llama=True, budget=TURN_BUDGET, debug=True):
+    """Handle one utterance end to end.
+
+    Returns a dict with the detected command, how it was classified, the
+    prompt answers and per-stage timings in ms; "exit" is True when the
+    user said goodbye.
+    """
+    turn = {"text": command, "command": None, "source": "none", "confidence": 0.0,
+            "answers": {}, "exit": False, "ms": {}}
+    started = time.perf_counter()
+    # Per-stage timings also go to the trace file when RUBY_TRACE is set
+    with ruby_trace.turn(command):
+        with ruby_trace.span("match") as span:
+            result = classify(command, use_llama=use_llama, budget=budget)
+            span.set(source=result.source, confidence=round(result.confidence, 3), command=result.command)
+        matched = time.perf_counter()
+        turn.update(command=result.command, source=result.source, confidence=round(result.confidence, 3))
+        turn["ms"]["match"] = round((matched - started) * 1000, 3)
+        cmd_name = result.command
+        if debug:
+            print(f"[DEBUG] Detected command: {cmd_name} ({result.source}, {result.confidence:.2f})")
+
+        if cmd_name is None:
+            turn["exit"] = respond_unmatched(command)
+        else:
+            if result.source == "model":
+                ruby_tools.ruby_speak(f"I think you meant '{cmd_name.replace('_', ' ')}'.")
+
+            # Prompts and handler come from the registry. The handler is looked
+            # up by name the first time its command is used; ruby_tools itself
+            # is already loaded for speech, but plugin modules load only then
+            spec = registry.get(cmd_name)
+            if spec is None:
+                ruby_tools.ruby_speak("Sorry, I didn't understand that.", block=False)
+            else:
+                with ruby_trace.span("prompt", command=cmd_name):
+                    turn["answers"] = spec.collect(ask)
+                prompted = time.perf_counter()
+                with ruby_trace.span("action", command=cmd_name):
+                    spec.run(turn["answers"])
+                turn["ms"]["action"] = round((time.perf_counter() - prompted) * 1000, 3)
+    turn["ms"]["total"] = round((time.perf_counter() - started) * 1000, 3)
+    return turn
@@ -5,6 +5,8 @@ from unittest.mock import patch
 import tempfile
 import builtins
 
+import ruby_apps
+
 # Importing the methods to be tested
 from ruby_tools import (
     ruby_speak, take_note, open_app, get_time, clear_notes, countdown,
@@ -39,13 +41,21 @@ class TestRubyTools(unittest.TestCase):
             content = open(tmpfile.name).read()
             self.assertIn("Test note", content)
 
-    @patch('ruby_tools.os.system')
+    @patch('ruby_apps.launch')
     @patch('ruby_tools.ruby_speak')
-    def test_open_app(self, mock_speak, mock_system):
-        app_list = ["spotify", "chrome", "brave", "calc", "notes", "unknownapp"]
-        for app in app_list:
-            open_app(app)
-        self.assertEqual(mock_system.call_count, 5)
+    def test_open_app(self, mock_speak, mock_launch):
+        # Apps are looked up in the app index and started through ruby_apps.launch
+        with tempfile.TemporaryDirectory() as tmp:
+            apps = os.path.join(tmp, "Applications")
+            for name in ["Spotify", "Google Chrome", "Brave Browser", "Calculator", "Notes"]:
+                os.makedirs(os.path.join(apps, name + ".app"))
+            index = ruby_apps.AppIndex([apps], path=os.path.join(tmp, "apps.json"))
+            index.refresh()
+            with patch('ruby_apps.default_index', return_value=index):
+                app_list = ["spotify", "chrome", "brave", "calc", "notes", "unknownapp"]
+                for app in app_list:
+                    open_app(app)
+        self.assertEqual(mock_launch.call_count, 5)
         self.assertIn("Sorry, I don't know that app yet.", [c[0][0] for c in mock_speak.call_args_list])
 
     def test_get_time(self):
@@ -70,11 +80,15 @@ class TestRubyTools(unittest.TestCase):
         self.assertTrue(mock_speak.call_count >= 3)
 
     @patch('builtins.input', return_value='Documents')
-    @patch('ruby_tools.os.system')
+    @patch('ruby_folders.open_path')
     @patch('ruby_tools.ruby_speak')
-    def test_open_folder(self, mock_speak, mock_system, mock_input):
-        open_folder()
-        mock_system.assert_called_once()
+    def test_open_folder(self, mock_speak, mock_open_path, mock_input):
+        # A path under the home directory opens directly, without the folder index
+        with tempfile.TemporaryDirectory() as home:
+            os.makedirs(os.path.join(home, "Documents"))
+            with patch.dict(os.environ, {"HOME": home}):
+                open_folder()
+        mock_open_path.assert_called_once_with(os.path.join(home, "Documents"))
         mock_speak.assert_called()
 
     @patch('builtins.input', side_effect=['testfile', 'y'])
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+import ruby_intent_cache
+
+# Let tests import shared helpers such as the stub model server
+sys.path.insert(0, os.path.dirname(__file__))
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(monkeypatch, tmp_path):
+    # Keep on-disk caches out of the real home directory during tests
+    monkeypatch.setenv("RUBY_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(ruby_intent_cache, "_default_cache", None)
+    yield
@@ -0,0 +1,172 @@
+"""
+Minimal stand-in for the Ollama chat endpoint, for tests and benchmarks.
+
+Serves POST /api/chat over HTTP/1.1 keep-alive on 127.0.0.1 with
+scripted replies, injectable latency and injectable failures.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class OllamaStub:
+    """
+    Local stub model server.
+
+    Args:
+        reply: Reply text, or a callable taking the request body (dict)
+            and returning the reply text.
+        latency: Seconds to wait before answering, or {model: seconds}.
+        fail_first (int): Answer this many requests with HTTP 503 first.
+        load_time: Extra seconds the first request for a model takes, as
+            if loading it (or {model: seconds}); reported as
+            `load_duration`. `keep_alive: 0` unloads the model again.
+        token_latency (float): Seconds per generated word, so longer
+            replies take longer; `options.num_predict` cuts replies short
+            as it would on a real server.
+    """
+
+    def __init__(self, reply="unknown", latency=0.0, fail_first=0, load_time=0.0, token_latency=0.0):
+        self.reply = reply
+        self.latency = latency
+        self.token_latency = token_latency
+        self.fail_first = fail_first
+        self.load_time = load_time
+        self.loaded = set()
+        self.requests = []
+        # Words generated per answered request, and peak concurrent requests
+        self.generated = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this the
+            # body waits on a delayed ACK and every reply gains ~40ms
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                stub._handle(self, body)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def latency_for(self, model):
+        if isinstance(self.latency, dict):
+            return self.latency.get(model, 0.0)
+        return self.latency
+
+    def load_time_for(self, model):
+        if isinstance(self.load_time, dict):
+            return self.load_time.get(model, 0.0)
+        return self.load_time
+
+    def reply_for(self, body):
+        return self.reply(body) if callable(self.reply) else self.reply
+
+    def _handle(self, handler, body):
+        with self._lock:
+            self.requests.append(body)
+            failing = self.fail_first > 0
+            if failing:
+                self.fail_first -= 1
+        if failing:
+            handler.send_response(503)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            self._answer(handler, body)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _answer(self, handler, body):
+        model = body.get("model", "")
+        with self._lock:
+            loading = model not in self.loaded
+            self.loaded.add(model)
+            if body.get("keep_alive") in (0, "0", "0s"):
+                self.loaded.discard(model)
+        load = self.load_time_for(model) if loading else 0.0
+        time.sleep(load + self.latency_for(model))
+        # An empty message list only loads the model, like Ollama
+        text = self.reply_for(body) if body.get("messages") else ""
+        words = text.split(" ") if text else []
+        limit = (body.get("options") or {}).get("num_predict")
+        if limit is not None and limit >= 0:
+            words = words[:limit]
+            text = " ".join(words)
+        time.sleep(self.token_latency * len(words))
+        with self._lock:
+            self.generated.append(len(words))
+        load_duration = int((load or 0.001) * 1e9)
+        if not body.get("stream", True):
+            payload = json.dumps({
+                "model": model,
+                "message": {"role": "assistant", "content": text},
+                "done": True,
+                "load_duration": load_duration,
+                "eval_count": len(words),
+            }).encode("utf-8")
+            handler.send_response(200)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(payload)))
+            handler.end_headers()
+            handler.wfile.write(payload)
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-ndjson")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+        parts = [w if i == 0 else " " + w for i, w in enumerate(words)]
+        for part in parts:
+            line = json.dumps({"model": model, "message": {"role": "assistant", "content": part}, "done": False})
+            self._write_chunk(handler, line.encode("utf-8") + b"\n")
+        done = {"model": model, "done": True, "load_duration": load_duration, "eval_count": len(words)}
+        self._write_chunk(handler, json.dumps(done).encode("utf-8") + b"\n")
+        handler.wfile.write(b"0\r\n\r\n")
+        handler.wfile.flush()
+
+    @staticmethod
+    def _write_chunk(handler, data):
+        handler.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        handler.wfile.flush()
@@ -0,0 +1,45 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import run_benchmarks  # noqa: E402
+
+
+def test_percentiles_interpolate():
+    assert run_benchmarks.percentile([1.0, 2.0, 3.0, 4.0, 5.0], 50) == 3.0
+    assert run_benchmarks.percentile([0.0, 10.0], 95) == pytest.approx(9.5)
+
+
+def test_compare_flags_only_real_slowdowns():
+    baseline = {"results": {"a": {"p50": 1.0, "p95": 2.0}, "b": {"p50": 1.0, "p95": 2.0}}}
+    current = {"results": {"a": {"p50": 1.1, "p95": 2.1}, "b": {"p50": 1.0, "p95": 3.0}}}
+    report = run_benchmarks.compare(current, baseline, tolerance=0.25)
+    assert not report["a"]["regressed"]
+    assert report["b"]["regressed"] and report["b"]["metric"] == "p95"
+
+
+def test_suite_runs_offline(tmp_path):
+    out = tmp_path / "run.json"
+    args = ["--iterations", "5", "--model-iterations", "2", "--model-latency-ms", "1",
+            "--extra-commands", "20", "--notes", "10", "--output", str(out)]
+    assert run_benchmarks.main(args) == 0
+    # Tiny runs are noisy, so only check that a generous tolerance passes
+    assert run_benchmarks.main(args[:-2] + ["--baseline", str(out), "--cases", "match_command",
+                                             "--tolerance", "100"]) == 0
+
+
+def test_load_generator_reports_percentiles(monkeypatch, tmp_path, capsys):
+    import load_server
+    import ruby_speech
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ruby_speech, "_default_worker", None)
+    assert load_server.main(["--clients", "3", "--turns", "6"]) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert report["turns"] == 18 and report["errors"] == 0
+    assert report["latency_ms"]["p95"] >= report["latency_ms"]["p50"] > 0
+    assert report["server"]["turns"] == 18
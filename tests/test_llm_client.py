@@ -1,14 +1,284 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+
 import llm_client
+import ruby_stats
+from ollama_stub import OllamaStub
+
+
+def _unused_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_query_llama_returns_unknown_when_server_unreachable(monkeypatch):
+    # Nothing listens on this port; query_llama should return the conservative fallback
+    client = llm_client.AsyncLlamaClient(host=f"127.0.0.1:{_unused_port()}", retries=1, backoff=0.01)
+    monkeypatch.setattr(llm_client, "_default_client", client)
+    assert llm_client.query_llama("hello") == "unknown"
+
+
+def test_query_llama_reuses_connection(monkeypatch):
+    with OllamaStub(reply="get_time") as stub:
+        monkeypatch.setattr(llm_client, "_default_client", llm_client.AsyncLlamaClient(host=stub.url))
+        assert llm_client.query_llama("what time") == "get_time"
+        assert llm_client.query_llama("what time again", model="llama3") == "get_time"
+        assert stub.connections == 1
+        assert stub.requests[1]["model"] == "llama3"
+        assert stub.requests[0]["stream"] is False
+
+
+def test_retries_transient_failures():
+    async def scenario(url):
+        client = llm_client.AsyncLlamaClient(host=url, retries=2, backoff=0.01)
+        reply = await client.chat("mistral", [{"role": "user", "content": "hi"}])
+        await client.close()
+        return reply
+
+    with OllamaStub(reply="ok", fail_first=2) as stub:
+        reply = asyncio.run(scenario(stub.url))
+        assert reply["message"]["content"] == "ok"
+        assert len(stub.requests) == 3
+
+
+@pytest.mark.parametrize("response", [
+    b"garbage\r\n\r\n",
+    b"HTTP/1.1 200 OK\r\nContent-Length: lots\r\n\r\n",
+    b"HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\nnot json!",
+])
+def test_malformed_responses_are_retried_then_reported(response):
+    attempts = []
+
+    async def answer(reader, writer):
+        attempts.append(await reader.readuntil(b"\r\n\r\n"))
+        writer.write(response)
+        await writer.drain()
+        writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(answer, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        client = llm_client.AsyncLlamaClient(host=f"127.0.0.1:{port}", retries=1, backoff=0.01)
+        try:
+            with pytest.raises(llm_client.LlamaError, match="giving up after 2 attempts"):
+                await client.chat("mistral", [])
+        finally:
+            await client.close()
+            server.close()
+
+    asyncio.run(scenario())
+    assert len(attempts) == 2
+
+
+def test_deadline_and_concurrency_cap():
+    async def scenario(url):
+        client = llm_client.AsyncLlamaClient(host=url, max_concurrency=2)
+        with pytest.raises(llm_client.LlamaError, match="deadline"):
+            await client.chat("mistral", [], timeout=0.05)
+        await asyncio.gather(*[client.chat("mistral", [], timeout=5) for _ in range(4)])
+
+    with OllamaStub(reply="ok", latency=0.2) as stub:
+        asyncio.run(scenario(stub.url))
+        # The abandoned request may still be running on the stub when the
+        # others start, so at most three overlap there; never all five
+        assert 2 <= stub.max_in_flight <= 3
+
+
+def test_stream_llama_yields_pieces(monkeypatch):
+    with OllamaStub(reply="Hi there. How are you?") as stub:
+        monkeypatch.setattr(llm_client, "_default_client", llm_client.AsyncLlamaClient(host=stub.url))
+        pieces = list(llm_client.stream_llama("hello"))
+        assert "".join(pieces) == "Hi there. How are you?"
+        assert len(pieces) > 1
+
+
+def test_parse_keep_alive():
+    assert llm_client.parse_keep_alive("30m") == 1800
+    assert llm_client.parse_keep_alive("1h30m") == 5400
+    assert llm_client.parse_keep_alive("300") == 300
+    assert llm_client.parse_keep_alive(0) == 0
+    assert llm_client.parse_keep_alive(-1) is None
+    with pytest.raises(ValueError):
+        llm_client.parse_keep_alive("soon")
+
+
+def test_warm_loads_model_and_tracks_state():
+    async def scenario(url):
+        client = llm_client.AsyncLlamaClient(host=url, keep_alive="10m")
+        before = client.model_status("mistral")
+        warming = asyncio.ensure_future(client.warm("mistral"))
+        # Let warm() start; it is then waiting on the (slow) model load
+        await asyncio.sleep(0)
+        during = client.model_status("mistral")
+        stats = await warming
+        first_turn = await client.chat("mistral", [{"role": "user", "content": "hi"}])
+        await client.close()
+        return before, during, stats, first_turn, client.model_stats()
+
+    with OllamaStub(reply="ok", load_time=0.3) as stub:
+        before, during, stats, first_turn, all_stats = asyncio.run(scenario(stub.url))
+        assert (before, during, stats["status"]) == ("cold", "warming", "warm")
+        assert stats["loads"] == 1 and stats["last_load_ms"] >= 300
+        # The load was paid by the warm-up, not by the first real request
+        assert first_turn["load_duration"] / 1e6 < llm_client.LOADED_THRESHOLD_MS
+        assert all_stats["mistral"]["requests"] == 2 and all_stats["mistral"]["loads"] == 1
+        assert stub.requests[0]["messages"] == []
+        assert all(r["keep_alive"] == "10m" for r in stub.requests)
+
+
+def test_model_goes_cold_after_keep_alive_window():
+    async def scenario(url):
+        client = llm_client.AsyncLlamaClient(host=url, keep_alive="100ms")
+        parts = [p async for p in client.chat_stream("mistral", [{"role": "user", "content": "hi"}])]
+        warm = client.model_status("mistral")
+        await asyncio.sleep(0.15)
+        await client.close()
+        return parts, warm, client.model_status("mistral")
+
+    with OllamaStub(reply="ok") as stub:
+        parts, warm, later = asyncio.run(scenario(stub.url))
+        assert parts[-1]["done"] and warm == "warm" and later == "cold"
+
+
+def test_prewarm_primes_prompt_in_background(monkeypatch):
+    with OllamaStub(reply="ok", load_time=0.1) as stub:
+        monkeypatch.setattr(llm_client, "_default_client", llm_client.AsyncLlamaClient(host=stub.url))
+        future = llm_client.prewarm("mistral", prompt="fixed prefix")
+        assert future.result(timeout=5)["loads"] == 1
+        assert llm_client.model_status("mistral") == "warm"
+        assert stub.requests[0]["options"] == {"num_predict": 1}
+
+
+def test_parse_choice_is_strict():
+    choices = ["get_time", "take_note"]
+    assert llm_client.parse_choice('{"command": "get_time"}', choices) == "get_time"
+    assert llm_client.parse_choice('{"command": "unknown"}', choices) is None
+    for bad in ['get_time', '{"command": "get time"}', '{"cmd": "get_time"}', '["get_time"]', '{"command": 3}']:
+        with pytest.raises(llm_client.InvalidReplyError):
+            llm_client.parse_choice(bad, choices)
+
+
+def test_classify_llama_constrains_the_reply(monkeypatch):
+    chatty = "Sure! It sounds like you want to know the time, so the command is get_time. " * 4
+
+    def reply(body):
+        # Like a server honouring `format`: JSON when asked for it, prose otherwise
+        return '{"command": "get_time"}' if body.get("format") else chatty
+
+    with OllamaStub(reply=reply) as stub:
+        monkeypatch.setattr(llm_client, "_default_client", llm_client.AsyncLlamaClient(host=stub.url))
+        assert llm_client.classify_llama("what time", ["get_time", "take_note"]) == "get_time"
+        llm_client.query_llama("what time")
+
+        body = stub.requests[0]
+        assert body["format"]["properties"]["command"]["enum"] == ["get_time", "take_note", "unknown"]
+        assert body["options"] == {"temperature": 0, "num_predict": llm_client.CLASSIFY_NUM_PREDICT}
+        # Words the stub generated for each call: the constrained one stops early
+        constrained, free = stub.generated
+        assert constrained * 10 < free
+
+
+def test_classify_llama_rejects_rambling_model(monkeypatch):
+    # A model that ignores `format` is cut off at num_predict and its reply discarded
+    with OllamaStub(reply="get_time " * 200) as stub:
+        monkeypatch.setattr(llm_client, "_default_client", llm_client.AsyncLlamaClient(host=stub.url))
+        assert llm_client.classify_llama("what time", ["get_time"]) == "unknown"
+        assert stub.generated == [llm_client.CLASSIFY_NUM_PREDICT]
+
+
+def _hedge(fast_url, fallback_url, delay):
+    return llm_client.HedgedClassifier(
+        "fast", "big", delay=delay,
+        fast_client=llm_client.AsyncLlamaClient(host=fast_url, retries=0),
+        fallback_client=llm_client.AsyncLlamaClient(host=fallback_url, retries=0),
+    )
+
+
+def test_hedge_fast_model_answers_alone():
+    answer = '{"command": "get_time"}'
+    with OllamaStub(reply=answer, latency=0.01) as fast, OllamaStub(reply=answer) as big:
+        hedge = _hedge(fast.url, big.url, delay=30.0)
+        assert asyncio.run(hedge.classify("what time", ["get_time"])) == ("fast", "get_time")
+        assert big.requests == []
+        stats = hedge.stats()
+        assert stats["hedged"] == 0 and stats["models"]["fast"]["win_rate"] == 1.0
+
+
+def test_hedge_slow_fast_model_loses_and_is_cancelled():
+    answer = '{"command": "get_time"}'
+    release = threading.Event()
+
+    def stuck(body):
+        # The fast model never answers while the hedge is running
+        release.wait(10)
+        return answer
+
+    with OllamaStub(reply=stuck) as fast, OllamaStub(reply=answer, latency=0.05) as big:
+        hedge = _hedge(fast.url, big.url, delay=0.1)
+        try:
+            assert asyncio.run(hedge.classify("what time", ["get_time"], timeout=10)) == ("big", "get_time")
+        finally:
+            release.set()
+        stats = hedge.stats()
+        assert stats["hedged"] == 1
+        assert stats["models"]["fast"]["cancelled"] == 1 and stats["models"]["fast"]["wins"] == 0
+        assert stats["models"]["big"]["wins"] == 1 and stats["models"]["big"]["p50_ms"] >= 50
+
+
+def test_hedge_falls_back_at_once_on_invalid_reply():
+    with OllamaStub(reply='{"command": "dance"}') as fast, OllamaStub(reply='{"command": "unknown"}') as big:
+        # Were the fallback only asked after `delay`, the deadline would hit first
+        hedge = _hedge(fast.url, big.url, delay=60.0)
+        assert asyncio.run(hedge.classify("dance", ["get_time"], timeout=10)) == ("big", None)
+        assert hedge.stats()["models"]["fast"]["errors"] == 1
+
+
+def test_hedge_fast_unknown_waits_for_the_fallback():
+    unknown, answer = '{"command": "unknown"}', '{"command": "get_time"}'
+    with OllamaStub(reply=unknown) as fast, OllamaStub(reply=answer, latency=0.05) as big:
+        hedge = _hedge(fast.url, big.url, delay=60.0)
+        assert asyncio.run(hedge.classify("what time", ["get_time"], timeout=10)) == ("big", "get_time")
+        assert hedge.stats()["models"]["fast"]["wins"] == 0
+
+    with OllamaStub(reply=unknown) as fast, OllamaStub(reply=unknown) as big:
+        hedge = _hedge(fast.url, big.url, delay=60.0)
+        assert asyncio.run(hedge.classify("sing", ["get_time"], timeout=10))[1] is None
+        assert len(big.requests) == 1
+
+
+def test_hedge_suggests_delay_from_fast_latencies():
+    async def scenario(hedge):
+        for _ in range(5):
+            await hedge.classify("what time", ["get_time"])
+
+    answer = '{"command": "get_time"}'
+    with OllamaStub(reply=answer, latency=0.03) as fast, OllamaStub(reply=answer) as big:
+        hedge = _hedge(fast.url, big.url, delay=1.0)
+        assert hedge.suggest_delay() is None
+        asyncio.run(scenario(hedge))
+        latencies = sorted(hedge.models["fast"].latencies)
+        assert hedge.suggest_delay() == ruby_stats.percentile(latencies, 90) / 1000
+        assert hedge.suggest_delay() >= 0.03
 
 
-def test_query_llama_returns_unknown_when_no_ollama():
-    # If ollama isn't installed, query_llama should return the conservative fallback
-    # We don't modify environment; assert the behavior is safe.
-    resp = llm_client.query_llama("hello")
-    assert isinstance(resp, str)
-    # concrete behavior: when ollama missing, implementation returns "unknown"
-    if llm_client.ollama is None:
-        assert resp == "unknown"
-    else:
-        # If ollama exists, we at least expect a string
-        assert isinstance(resp, str)
+def test_classify_llama_uses_configured_hedge(monkeypatch):
+    with OllamaStub(reply='{"command": "take_note"}') as stub:
+        monkeypatch.setattr(llm_client, "_default_client", llm_client.AsyncLlamaClient(host=stub.url))
+        monkeypatch.setenv("RUBY_HEDGE_MODELS", "tiny,mistral")
+        monkeypatch.setenv("RUBY_HEDGE_DELAY", "0.5")
+        try:
+            assert llm_client.classify_llama("write this down", ["take_note"]) == "take_note"
+            assert stub.requests[0]["model"] == "tiny"
+            assert llm_client.default_hedge().delay == 0.5
+            # The winning model is reported so answers can be cached under it
+            assert llm_client.classify_llama_with_model("write this down", ["take_note"]) == ("tiny", "take_note")
+            assert llm_client.classifier_models() == ["tiny", "mistral"]
+        finally:
+            monkeypatch.delenv("RUBY_HEDGE_MODELS")
+            assert llm_client.default_hedge() is None
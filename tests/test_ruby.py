@@ -0,0 +1,84 @@
+import io
+import json
+
+import pytest
+
+import ruby
+import ruby_notes
+import ruby_speech
+import ruby_tools
+
+
+def test_batch_runs_commands_with_supplied_answers(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    lines = [
+        "what time is it",
+        json.dumps({"text": "please take a note", "answers": {"Y/N": "n", "note": "buy milk"}}),
+        json.dumps({"text": "start countdown", "answers": {"Duration:": "soon"}}),
+        "bye",
+        "never reached",
+    ]
+    out = io.StringIO()
+    results = ruby.run_batch(lines, out, use_llama=False)
+
+    assert [r["command"] for r in results] == ["get_time", "take_note", "countdown", None]
+    assert results[-1]["exit"] and results[-1]["spoken"] == ["Goodbye."]
+    assert results[1]["answers"] == {"session": "n", "note": "buy milk"}
+    # The status line comes before the note is asked for, then the handler confirms
+    assert results[1]["spoken"] == ["Do you want to start a new session?",
+                                    "Continuing in existing session. What should I write?", "Note saved."]
+    assert results[2]["spoken"] == ["How long should I countdown?", "Please enter a valid number."]
+    assert all(r["ms"]["total"] >= r["ms"]["match"] for r in results)
+    assert [json.loads(line)["index"] for line in out.getvalue().splitlines()] == [0, 1, 2, 3]
+    assert ruby_notes.notes_store(str(tmp_path / "notes.txt")).last(1)[0].body == "buy milk"
+
+
+def test_main_batch_reads_a_file(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(ruby_speech, "_default_worker", None)
+    monkeypatch.setattr(ruby_tools, "_console", None)
+    source = tmp_path / "turns.txt"
+    source.write_text("what time is it\nsing me a song\n")
+    output = tmp_path / "results.jsonl"
+    assert ruby.main(["--batch", str(source), "--output", str(output), "--no-llama"]) == 0
+    results = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [r["command"] for r in results] == ["get_time", None]
+    assert json.loads(capsys.readouterr().err)["turns"] == 2
+    # Batch runs never speak aloud, not even from background timers
+    assert isinstance(ruby_speech.default_worker()._candidates[0], ruby_speech.NullBackend)
+
+
+def test_main_batch_stdout_is_only_jsonl(monkeypatch, tmp_path, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ruby_speech, "_default_worker", None)
+    monkeypatch.setattr(ruby_tools, "_console", None)
+    ruby_notes.notes_store(str(tmp_path / "notes.txt")).append("buy milk")
+    source = tmp_path / "turns.txt"
+    source.write_text("\n".join([
+        "system info",
+        "read notes",
+        json.dumps({"text": "please search my notes", "answers": {"query": "milk"}}),
+    ]) + "\n")
+    assert ruby.main(["--batch", str(source), "--no-llama"]) == 0
+    # Handlers that only used to print() now report through the turn result
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [r["command"] for r in results] == ["get_system_info", "read_notes", "search_notes"]
+    assert results[0]["spoken"][0].startswith("=== System Info ===")
+    assert any(line.endswith("] buy milk") for line in results[1]["spoken"])
+    assert results[2]["spoken"][-1] == "I found 1 matching note."
+
+
+def test_main_batch_reports_unreadable_files(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(ruby_speech, "_default_worker", None)
+    monkeypatch.setattr(ruby_tools, "_console", None)
+    with pytest.raises(SystemExit) as exit:
+        ruby.main(["--batch", str(tmp_path / "missing.txt"), "--no-llama"])
+    assert exit.value.code == 2
+    assert "cannot read --batch file" in capsys.readouterr().err
+
+
+def test_summary_counts_unparsable_lines_apart():
+    results = [{"index": 0, "error": "bad input line: oops"},
+               {"index": 1, "text": "hi", "ms": {"total": 2.0}},
+               {"index": 2, "text": "boom", "error": "RuntimeError: boom"}]
+    summary = ruby._summary(results, 1.0)
+    assert (summary["turns"], summary["errors"], summary["parse_errors"]) == (2, 1, 1)
@@ -0,0 +1,76 @@
+import os
+import time
+
+import ruby_apps
+import ruby_tools
+
+
+def _make_apps(tmp_path):
+    mac = tmp_path / "Applications"
+    for name in ["Visual Studio Code", "Google Chrome", "Chrome Remote Desktop", "Calculator", "Spotify"]:
+        (mac / f"{name}.app").mkdir(parents=True)
+    linux = tmp_path / "applications"
+    linux.mkdir()
+    (linux / "firefox.desktop").write_text(
+        "[Desktop Entry]\nType=Application\nName=Firefox Web Browser\nExec=firefox --new-window %U\n"
+        "[Desktop Action new-private-window]\nName=Private\nExec=firefox --private-window\n"
+    )
+    (linux / "helper.desktop").write_text("[Desktop Entry]\nName=Helper\nExec=helper\nNoDisplay=true\n")
+    return [str(mac), str(linux)]
+
+
+def test_fuzzy_lookup(tmp_path):
+    index = ruby_apps.AppIndex(_make_apps(tmp_path), path=str(tmp_path / "apps.json"))
+    index.refresh()
+    assert index.find("open visual studio").name == "Visual Studio Code"
+    assert index.find("chrome").name == "Google Chrome"
+    assert index.find("calc").name == "Calculator"
+    assert index.find("spotfy").name == "Spotify"
+    assert index.find("firefox").argv == ["firefox", "--new-window"]
+    assert index.find("banana") is None
+    assert index.find("helper") is None
+
+
+def test_refresh_only_rescans_changed_directories(tmp_path):
+    roots = _make_apps(tmp_path)
+    path = str(tmp_path / "apps.json")
+    index = ruby_apps.AppIndex(roots, path=path)
+    assert index.refresh() == 2
+    assert index.refresh() == 0
+
+    (tmp_path / "Applications" / "Brave Browser.app").mkdir()
+    future = time.time() + 10
+    os.utime(roots[0], (future, future))
+    assert index.refresh() == 1
+    assert index.find("brave").name == "Brave Browser"
+
+    # A new process picks the persisted index up without rescanning
+    reloaded = ruby_apps.AppIndex(roots, path=path)
+    assert reloaded.refresh() == 0
+    assert reloaded.find("brave").name == "Brave Browser"
+
+
+def test_lookup_is_fast_with_many_apps(tmp_path):
+    apps = tmp_path / "Applications"
+    for i in range(2000):
+        (apps / f"Tool {i} Studio.app").mkdir(parents=True)
+    (apps / "Visual Studio Code.app").mkdir()
+    index = ruby_apps.AppIndex([str(apps)], path=str(tmp_path / "apps.json"))
+    index.refresh()
+    started = time.perf_counter()
+    for _ in range(20):
+        assert index.find("visual studio code").name == "Visual Studio Code"
+    assert (time.perf_counter() - started) / 20 < 0.005
+
+
+def test_open_app_launches_without_a_shell(monkeypatch, tmp_path):
+    index = ruby_apps.AppIndex(_make_apps(tmp_path), path=str(tmp_path / "apps.json"))
+    monkeypatch.setattr(ruby_apps, "_default_index", index)
+    launched, spoken = [], []
+    monkeypatch.setattr(ruby_apps, "launch", launched.append)
+    monkeypatch.setattr(ruby_tools, "ruby_speak", lambda text, **k: spoken.append(text))
+
+    assert ruby_tools.open_app("spotify").name == "Spotify"
+    assert launched[0].argv == ["open", "-a", str(tmp_path / "Applications" / "Spotify.app")]
+    assert ruby_tools.open_app("nothing like it") is None
+    assert spoken == ["Opening Spotify.", "Sorry, I don't know that app yet."]
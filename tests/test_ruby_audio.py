@@ -0,0 +1,123 @@
+import os
+import wave
+
+import ruby_audio
+import ruby_speech
+
+
+class WavRenderer:
+    """Headless renderer: writes a silent WAV whose length follows the text."""
+
+    name = "wav"
+    extension = ".wav"
+
+    def __init__(self, voice=None, rate=180):
+        self.voice = voice
+        self.rate = rate
+        self.rendered = []
+
+    def available(self):
+        return True
+
+    def render(self, text, path):
+        self.rendered.append(text)
+        with wave.open(path, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(8000)
+            w.writeframes(b"\0\0" * 100 * len(text))
+
+
+class RecordingPlayer:
+    def __init__(self):
+        self.played = []
+
+    def available(self):
+        return True
+
+    def play(self, path):
+        assert os.path.getsize(path) > 0
+        self.played.append(path)
+
+    def stop(self):
+        pass
+
+
+def test_phrases_render_once_per_voice_and_rate(tmp_path):
+    renderer = WavRenderer()
+    cache = ruby_audio.PhraseCache(renderer, str(tmp_path))
+    first = cache.get("Note saved.")
+    assert cache.get("Note saved.") == first
+    assert renderer.rendered == ["Note saved."]
+
+    renderer.rate = 200
+    assert cache.get("Note saved.") != first
+    assert renderer.rendered == ["Note saved.", "Note saved."]
+    assert cache.stats()["hits"] == 1
+
+
+def test_least_recently_used_audio_is_evicted(tmp_path):
+    renderer = WavRenderer()
+    size = len("phrase a") * 200 + 44  # frames plus WAV header
+    cache = ruby_audio.PhraseCache(renderer, str(tmp_path), max_bytes=int(size * 2.5))
+    a = cache.get("phrase a")
+    b = cache.get("phrase b")
+    cache.get("phrase a")  # a is now the most recent
+    cache.get("phrase c")
+    assert os.path.exists(a) and not os.path.exists(b)
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+    # Recency survives a restart
+    reopened = ruby_audio.PhraseCache(renderer, str(tmp_path), max_bytes=cache.max_bytes)
+    assert list(reopened._entries) == [os.path.basename(a), os.path.basename(cache.path("phrase c"))]
+
+
+def test_prewarm_skips_cached_phrases(tmp_path):
+    cache = ruby_audio.PhraseCache(WavRenderer(), str(tmp_path))
+    assert cache.prewarm(["Goodbye.", "Time's up!"]) == 2
+    assert cache.prewarm(["Goodbye.", "Time's up!", "1"]) == 1
+
+
+def test_cached_backend_replays_through_the_speech_worker(tmp_path):
+    renderer, player = WavRenderer(), RecordingPlayer()
+    cache = ruby_audio.PhraseCache(renderer, str(tmp_path), max_chars=20)
+    worker = ruby_speech.SpeechWorker(backends=[ruby_audio.CachedBackend(renderer, player, cache)])
+    worker.submit("Note saved.")
+    worker.submit("Note saved.| This sentence is too long to be worth caching.").wait(5)
+    worker.shutdown(5)
+    assert renderer.rendered == ["Note saved.", "This sentence is too long to be worth caching."]
+    assert len(player.played) == 3 and player.played[0] == player.played[1]
+    assert not os.path.exists(player.played[2])
+    assert cache.stats()["entries"] == 1
+
+
+def test_say_renderer_uses_the_live_voice_when_installed(tmp_path):
+    say = tmp_path / "say"
+    say.write_text("#!/bin/sh\n"
+                   "echo 'Albert              en_US    # Hello! My name is Albert.'\n"
+                   "echo 'Samantha            en_US    # Hello, my name is Samantha.'\n")
+    say.chmod(0o755)
+    renderer = ruby_audio.SayRenderer(voice="Samantha", executable=str(say))
+    assert renderer.available()
+    assert renderer.argv("Hi", "out.aiff")[3:5] == ["-v", "Samantha"]
+
+    missing = ruby_audio.SayRenderer(voice="Nobody", executable=str(say))
+    assert missing.available() and "-v" not in missing.argv("Hi", "out.aiff")
+
+
+def test_phrase_cache_and_voice_are_opt_in(monkeypatch):
+    monkeypatch.delenv("RUBY_SPEECH_CACHE", raising=False)
+    monkeypatch.delenv(ruby_audio.VOICE_ENV, raising=False)
+    monkeypatch.setattr(ruby_audio, "default_renderer", lambda: WavRenderer())
+    assert not any(isinstance(b, ruby_audio.CachedBackend) for b in ruby_speech.default_backends())
+    monkeypatch.setenv("RUBY_SPEECH_CACHE", "1")
+    assert isinstance(ruby_speech.default_backends()[0], ruby_audio.CachedBackend)
+
+
+def test_default_renderer_keeps_the_system_voice(monkeypatch):
+    monkeypatch.setattr(ruby_audio.sys, "platform", "linux")
+    monkeypatch.setattr(ruby_audio.EspeakRenderer, "available", lambda self: True)
+    monkeypatch.delenv(ruby_audio.VOICE_ENV, raising=False)
+    assert ruby_audio.default_renderer().voice is None
+    monkeypatch.setenv(ruby_audio.VOICE_ENV, "en-gb")
+    assert ruby_audio.default_renderer().voice == "en-gb"
@@ -0,0 +1,40 @@
+import pytest
+
+import ruby_classifier
+import ruby_keymap
+
+
+@pytest.fixture(params=["numpy", "pure"])
+def backend(request, monkeypatch):
+    if request.param == "numpy" and ruby_classifier.optional_numpy() is None:
+        pytest.skip("numpy not installed")
+    if request.param == "pure":
+        monkeypatch.setattr(ruby_classifier, "optional_numpy", lambda: None)
+    return request.param
+
+
+def test_paraphrases_classified_above_threshold(backend):
+    clf = ruby_classifier.IntentClassifier(ruby_keymap.keyword_map, threshold=0.5)
+    assert clf.classify("what is the time now")[0] == "get_time"
+    assert clf.classify("search for my notes about milk")[0] == "search_notes"
+    assert clf.classify("sing me a song")[0] is None
+
+
+def test_batch_matches_single_and_reports_savings(backend):
+    clf = ruby_classifier.IntentClassifier(ruby_keymap.keyword_map, threshold=0.5)
+    texts = ["remove my file", "tell me a joke", "please note this down for me"]
+    batch = clf.classify_batch(texts)
+    assert [c for c, _ in batch] == ["del_files", None, "take_note"]
+    for text, (cmd_name, score) in zip(texts, batch):
+        assert clf.classify(text)[1] == pytest.approx(score)
+    stats = clf.stats()
+    assert stats["consulted"] == 6 and stats["resolved"] == 4
+    assert stats["saved_fraction"] == pytest.approx(4 / 6)
+
+
+def test_margin_rejects_words_shared_by_commands(backend):
+    loose = ruby_classifier.IntentClassifier(ruby_keymap.keyword_map, threshold=0.5)
+    strict = ruby_classifier.IntentClassifier(ruby_keymap.keyword_map, threshold=0.5, margin=0.1)
+    assert loose.classify("my notes")[0] is not None
+    assert strict.classify("my notes")[0] is None
+    assert strict.classify("what is the time now")[0] == "get_time"
@@ -0,0 +1,74 @@
+import sys
+
+import pytest
+
+import ruby_commands
+import ruby_keymap
+import ruby_tools
+
+
+def test_keyword_map_follows_registry():
+    assert list(ruby_keymap.keyword_map) == [c.name for c in ruby_commands.registry]
+    # Every built-in handler resolves
+    for command in ruby_commands.registry:
+        assert callable(command.handler)
+
+
+def test_handlers_are_imported_lazily():
+    registry = ruby_commands.CommandRegistry()
+    command = registry.register("wave", ["wave hello"], "ruby_no_such_module:wave")
+    assert "ruby_no_such_module" not in sys.modules
+    with pytest.raises(ImportError):
+        command.handler
+
+
+def test_collect_skips_prompts_and_formats_questions():
+    command = ruby_commands.registry.get("del_files")
+    asked = []
+
+    def ask(prompt, text, answers):
+        asked.append(text)
+        return {"filename": "old", "confirm": "y"}[prompt.key]
+
+    assert command.collect(ask) == {"filename": "old", "confirm": "y"}
+    assert asked == ["What files do you want me to delete?", "Are you sure you want to delete old.txt?"]
+
+    # A blank file name skips the confirmation entirely
+    assert command.collect(lambda prompt, text, answers: "") == {"filename": ""}
+
+
+def test_run_passes_answers_to_handler(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ruby_tools, "ruby_speak", lambda *a, **k: None)
+    target = tmp_path / "todelete.txt"
+    target.write_text("remove me")
+    ruby_commands.registry.get("del_files").run({"filename": "todelete", "confirm": "y"})
+    assert not target.exists()
+
+
+def test_registering_updates_matching():
+    ruby_commands.registry.register("say_hello", ["wave hello"], lambda: "hi")
+    try:
+        assert ruby_keymap.match_command("please wave hello", use_llama=False) == "say_hello"
+    finally:
+        ruby_commands.registry.unregister("say_hello")
+    assert "say_hello" not in ruby_keymap.keyword_map
+
+
+def test_plugins_are_discovered_through_entry_points(monkeypatch, tmp_path):
+    # A minimal installed distribution advertising a "ruby.commands" entry point
+    (tmp_path / "ruby_weather.py").write_text(
+        "def register(registry):\n"
+        "    registry.register('weather', ['weather forecast'], 'ruby_weather:forecast')\n"
+        "def forecast():\n"
+        "    return 'sunny'\n"
+    )
+    dist = tmp_path / "ruby_weather-0.1.dist-info"
+    dist.mkdir()
+    (dist / "METADATA").write_text("Metadata-Version: 2.1\nName: ruby-weather\nVersion: 0.1\n")
+    (dist / "entry_points.txt").write_text("[ruby.commands]\nweather = ruby_weather:register\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    registry = ruby_commands.CommandRegistry()
+    registry.load_plugins()
+    assert registry.get("weather").run() == "sunny"
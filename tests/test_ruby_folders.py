@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+
+import ruby_folders
+import ruby_tools
+
+
+def _tree(root):
+    for rel in ["Work/Invoices", "Work/Projects/RubyMac", "Work/Projects/tax_returns_2023",
+                ".hidden/Invoices", "node_modules/Invoices", "a/b/c/deep"]:
+        os.makedirs(root / rel)
+    return root
+
+
+def _index(tmp_path, **kwargs):
+    return ruby_folders.FolderIndex([str(tmp_path / "home")], path=str(tmp_path / "folders.sqlite3"), **kwargs)
+
+
+def _touch(path):
+    future = time.time() + 10
+    os.utime(path, (future, future))
+
+
+def test_ranked_lookup_with_ignore_rules_and_depth(tmp_path):
+    home = _tree(tmp_path / "home")
+    index = _index(tmp_path, max_depth=3)
+    index.refresh()
+    assert index.find("my invoices folder") == str(home / "Work" / "Invoices")
+    assert [p for _, p in index.lookup("invoices")] == [str(home / "Work" / "Invoices")]
+    assert index.find("ruby mac") == str(home / "Work" / "Projects" / "RubyMac")
+    assert index.find("tax returns") == str(home / "Work" / "Projects" / "tax_returns_2023")
+    assert index.find("proj") == str(home / "Work" / "Projects")
+    assert index.find("c") == str(home / "a" / "b" / "c")
+    assert index.find("deep") is None  # below max_depth
+
+
+def test_refresh_only_relists_changed_directories(tmp_path):
+    home = _tree(tmp_path / "home")
+    index = _index(tmp_path)
+    first = index.refresh()
+    assert first["listed"] == first["visited"]
+    assert index.refresh()["listed"] == 0
+
+    os.makedirs(home / "Work" / "Receipts")
+    _touch(home / "Work")
+    assert index.refresh()["listed"] == 2  # Work itself and the new folder
+    assert index.find("receipts") == str(home / "Work" / "Receipts")
+
+    os.rmdir(home / "Work" / "Receipts")
+    _touch(home / "Work")
+    index.refresh()
+    assert index.find("receipts") is None
+
+    # Another process starts from the persisted index without crawling
+    reopened = _index(tmp_path)
+    assert reopened.find("invoices") == str(home / "Work" / "Invoices")
+    assert reopened.refresh()["listed"] == 0
+
+
+def test_open_folder_resolves_names_through_the_index(monkeypatch, tmp_path):
+    home = _tree(tmp_path / "home")
+    monkeypatch.setenv("HOME", str(home))
+    index = _index(tmp_path)
+    index.refresh()
+    monkeypatch.setattr(ruby_folders, "_default_index", index)
+    opened, spoken = [], []
+    monkeypatch.setattr(ruby_folders, "open_path", opened.append)
+    monkeypatch.setattr(ruby_tools, "ruby_speak", lambda text, **k: spoken.append(text))
+
+    assert ruby_tools.open_folder("Work/Projects") == str(home / "Work" / "Projects")
+    assert ruby_tools.open_folder("invoices") == str(home / "Work" / "Invoices")
+    assert ruby_tools.open_folder("nothing here") is None
+    assert opened == [str(home / "Work" / "Projects"), str(home / "Work" / "Invoices")]
+    assert spoken[-1] == "I couldn't find that folder."
+
+
+def test_first_lookup_never_waits_on_the_crawl(monkeypatch, tmp_path):
+    home = _tree(tmp_path / "home")
+    os.makedirs(home / "Documents")
+    monkeypatch.setenv("HOME", str(home))
+    index = _index(tmp_path)
+    release = threading.Event()
+    crawl = index.refresh
+    monkeypatch.setattr(index, "refresh", lambda: release.wait(5) and crawl())
+    monkeypatch.setattr(ruby_folders, "_default_index", index)
+    opened, spoken = [], []
+    monkeypatch.setattr(ruby_folders, "open_path", opened.append)
+    monkeypatch.setattr(ruby_tools, "ruby_speak", lambda text, **k: spoken.append(text))
+
+    # The crawl is running in the background: top-level names still resolve
+    assert ruby_folders.default_index() is index and index.refreshing
+    assert ruby_tools.open_folder("my documents folder") == str(home / "Documents")
+    assert ruby_tools.open_folder("invoices") is None
+    assert spoken[-1] == "I'm still indexing your folders. Please try again in a moment."
+
+    release.set()
+    index.refresh_in_background().join(5)
+    assert ruby_tools.open_folder("invoices") == str(home / "Work" / "Invoices")
+    assert opened == [str(home / "Documents"), str(home / "Work" / "Invoices")]
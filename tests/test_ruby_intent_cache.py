@@ -0,0 +1,86 @@
+import ruby_intent_cache
+from ruby_intent_cache import IntentCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_utterance_ignores_filler_and_punctuation():
+    assert ruby_intent_cache.normalize_utterance("What's the time, pls?") == "whats the time"
+    assert ruby_intent_cache.normalize_utterance("please") == "please"
+    assert ruby_intent_cache.normalize_utterance("Hey Ruby, set a timer thank you") == "set a timer"
+    # Politeness in the middle is part of the request
+    assert ruby_intent_cache.normalize_utterance("tell you a joke") == "tell you a joke"
+
+
+def test_normalize_utterance_keeps_other_scripts_apart():
+    normalize = ruby_intent_cache.normalize_utterance
+    assert normalize("Wie spät ist es?") == "wie spät ist es"
+    assert normalize("今何時") != normalize("メモを取って")
+    assert normalize("STRASSE") == normalize("straße")
+    assert len({normalize("thank you"), normalize("ok"), normalize("")}) == 3
+
+
+def test_empty_keys_are_never_cached():
+    cache = IntentCache(None)
+    cache.put("?!", "m", "fp", "get_time")
+    assert cache.get("...", "m", "fp") is None
+    assert cache.stats()["memory_entries"] == 0 and cache.stats()["misses"] == 0
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "intents.sqlite3")
+    cache = IntentCache(path)
+    cache.put("whats the time", "mistral", "fp1", "get_time")
+    cache.close()
+
+    reopened = IntentCache(path)
+    assert reopened.get("whats the time please", "mistral", "fp1") == "get_time"
+    assert reopened.get("whats the time", "llama3", "fp1") is None
+    stats = reopened.stats()
+    assert stats["disk_hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_ttl_expiry_and_lru_eviction():
+    clock = FakeClock()
+    cache = IntentCache(None, max_memory=2, ttl=60, clock=clock)
+    cache.put("a", "m", "fp", "get_time")
+    cache.put("b", "m", "fp", "take_note")
+    cache.get("a", "m", "fp")
+    cache.put("c", "m", "fp", "countdown")
+    # "b" was least recently used
+    assert cache.get("b", "m", "fp") is None
+    assert cache.get("a", "m", "fp") == "get_time"
+    clock.now += 61
+    assert cache.get("a", "m", "fp") is None
+
+
+def test_disk_size_bound(tmp_path):
+    cache = IntentCache(str(tmp_path / "i.sqlite3"), max_memory=1, max_disk=10)
+    for i in range(25):
+        cache.put(f"utterance {i}", "m", "fp", "get_time")
+    assert cache.stats()["disk_entries"] <= 10
+    assert cache.get("utterance 24", "m", "fp") == "get_time"
+
+
+def test_new_keymap_fingerprint_invalidates(tmp_path):
+    cache = IntentCache(str(tmp_path / "i.sqlite3"))
+    cache.put("open spotify", "m", "old", "open_app")
+    assert cache.get("open spotify", "m", "new") is None
+    assert cache.get("open spotify", "m", "old") is None
+    assert cache.stats()["disk_entries"] == 0
+
+
+def test_lookup_across_models_counts_once():
+    cache = IntentCache(None)
+    assert cache.get_any("sing a song", ["tiny", "mistral"], "fp1") is None
+    cache.put("what time", "mistral", "fp1", "get_time")
+    assert cache.get_any("what time", ["tiny", "mistral"], "fp1") == "get_time"
+    stats = cache.stats()
+    assert (stats["misses"], stats["memory_hits"]) == (1, 1)
@@ -1,4 +1,5 @@
 import ruby_keymap
+from ruby_commands import registry
 
 
 def test_direct_match():
@@ -13,5 +14,174 @@ def test_substring_fallback():
 
 def test_llama_fallback(monkeypatch):
     # when use_llama=True, monkeypatch the classifier to return a known command
-    monkeypatch.setattr(ruby_keymap, "query_llama", lambda prompt: "take_note")
+    monkeypatch.setattr(ruby_keymap, "classify_llama", lambda prompt, model="mistral": (model, "take_note"))
     assert ruby_keymap.match_command("something ambiguous", use_llama=True) == "take_note"
+
+
+def test_llama_answers_are_cached(monkeypatch):
+    calls = []
+
+    def fake_query(prompt, model="mistral"):
+        calls.append(prompt)
+        return model, "get_time"
+
+    monkeypatch.setattr(ruby_keymap, "classify_llama", fake_query)
+    assert ruby_keymap.match_command("whats the hour pls", use_llama=True) == "get_time"
+    assert ruby_keymap.match_command("What's the hour?", use_llama=True) == "get_time"
+    assert len(calls) == 1
+
+
+def _naive_match(mapping, text):
+    # Reference implementation of the original nested scan
+    for cmd_name, triggers in mapping.items():
+        for phrase in sorted(triggers, key=len, reverse=True):
+            if f" {phrase} " in f" {text} ":
+                return cmd_name
+    return None
+
+
+def test_index_matches_naive_scan_on_overlaps():
+    mapping = {
+        "a": ["deep dive"],
+        "b": ["take a deep breath", "a deep"],
+        "c": ["breath"],
+    }
+    index = ruby_keymap.IntentIndex(mapping)
+    for text in ["take a deep breath", "a deep dive", "breath", "deep", "take a deep dive now", "breathe"]:
+        assert index.match(text) == _naive_match(mapping, text)
+
+
+def test_runtime_phrases_go_through_the_registry():
+    registry.register("say_hello", ["wave hello"], lambda: "hi")
+    try:
+        registry.add_phrases("say_hello", ["greet everyone"])
+        assert ruby_keymap.keyword_map["say_hello"] == ["wave hello", "greet everyone"]
+        # Whatever classify matches, the registry can run
+        result = ruby_keymap.classify("please greet everyone", use_llama=False)
+        assert result.command == "say_hello" and registry.get(result.command).run() == "hi"
+        # Registering something else keeps the added phrase
+        registry.register("say_bye", ["wave bye"], lambda: "bye")
+        registry.unregister("say_bye")
+        assert ruby_keymap.match_command("greet everyone", use_llama=False) == "say_hello"
+    finally:
+        registry.unregister("say_hello")
+    assert "say_hello" not in ruby_keymap.keyword_map
+
+
+def test_classify_reports_source_and_single_model_call(monkeypatch):
+    calls = []
+
+    def fake_query(prompt, model="mistral"):
+        calls.append(prompt)
+        return model, "unknown"
+
+    monkeypatch.setattr(ruby_keymap, "classify_llama", fake_query)
+    assert ruby_keymap.classify("what time is it").source == "keyword"
+    result = ruby_keymap.classify("sing me a song")
+    assert result.command is None and result.source == "none"
+    assert len(calls) == 1
+
+
+def test_classify_respects_budget(monkeypatch):
+    import time
+
+    def slow_query(prompt, model="mistral"):
+        time.sleep(0.5)
+        return model, "get_time"
+
+    monkeypatch.setattr(ruby_keymap, "classify_llama", slow_query)
+    started = time.monotonic()
+    result = ruby_keymap.classify("hmm what hour", budget=0.05)
+    assert result.command is None
+    assert time.monotonic() - started < 0.4
+
+
+def test_local_classifier_answers_before_model(monkeypatch):
+    def no_model(prompt, model="mistral"):
+        raise AssertionError("model should not be queried")
+
+    monkeypatch.setattr(ruby_keymap, "classify_llama", no_model)
+    result = ruby_keymap.classify("please note this down for me")
+    assert result.command == "take_note" and result.source == "classifier"
+
+
+def test_classifier_prompt_keeps_a_stable_prefix():
+    first = ruby_keymap._classifier_prompt("what's the weather")
+    second = ruby_keymap._classifier_prompt("open my invoices")
+    prefix = ruby_keymap._classifier_prefix()
+    # The utterance comes last so the server can reuse the cached prefix
+    assert first.startswith(prefix) and second.startswith(prefix)
+    assert first.endswith('User says: "what\'s the weather"\n')
+
+
+def test_exit_words_never_reach_the_model(monkeypatch):
+    def no_model(prompt, model="mistral"):
+        raise AssertionError("the model should not be asked")
+
+    monkeypatch.setattr(ruby_keymap, "classify_llama", no_model)
+    for text in ["bye", "ok goodbye ruby", "quit"]:
+        assert ruby_keymap.classify(text) == (None, ruby_keymap.KEYWORD_CONFIDENCE, "exit")
+    # A command said together with an exit word still wins
+    assert ruby_keymap.classify("what time is it then bye").command == "get_time"
+
+
+def test_substring_fallback_has_its_own_source(monkeypatch):
+    class NoMatch:
+        def classify(self, text):
+            return None, 0.0
+
+    monkeypatch.setattr(ruby_keymap, "local_classifier", NoMatch)
+    result = ruby_keymap.classify("the get time thing", use_llama=False)
+    assert (result.command, result.source) == ("get_time", "substring")
+
+
+def test_ambiguous_inputs_never_clear_notes():
+    for text in ["notes", "my notes", "notes please", "new notes", "the notes", "all notes",
+                 "files", "files please", "clear", "clear it", "remove my file"]:
+        result = ruby_keymap.classify(text, use_llama=False)
+        assert result.command not in ("clear_notes", "del_files"), (text, result)
+    # Their own phrases still work
+    assert ruby_keymap.classify("please clear notes", use_llama=False).command == "clear_notes"
+
+
+def test_hedged_answers_are_cached_and_warmed_per_model(monkeypatch):
+    import llm_client
+
+    monkeypatch.setenv(llm_client.HEDGE_MODELS_ENV, "tiny,mistral")
+    calls = []
+
+    def fallback_answers(prompt, model="mistral"):
+        calls.append(prompt)
+        return "tiny", "get_time"
+
+    monkeypatch.setattr(ruby_keymap, "classify_llama", fallback_answers)
+    assert ruby_keymap.classify("whats the hour old chap").source == "model"
+    # Stored under the model that answered, and found there next time
+    fingerprint = ruby_keymap._keymap_hash
+    cache = ruby_keymap.default_cache()
+    assert cache.get("whats the hour old chap", "tiny", fingerprint) == "get_time"
+    assert cache.get("whats the hour old chap", "mistral", fingerprint) is None
+    assert ruby_keymap.classify("whats the hour old chap").source == "cache"
+    assert len(calls) == 1
+
+    warmed = []
+    monkeypatch.setattr(llm_client, "prewarm", lambda model, prompt=None: warmed.append(model))
+    ruby_keymap.prewarm_classifier()
+    assert warmed == ["tiny", "mistral"]
+
+
+def test_rebuild_index_still_takes_keyword_map_edits():
+    original = list(registry.get("get_time").phrases)
+    try:
+        ruby_keymap.keyword_map["get_time"].append("clock check")
+        ruby_keymap.rebuild_index()
+        assert registry.get("get_time").phrases[-1] == "clock check"
+        assert ruby_keymap.match_command("clock check", use_llama=False) == "get_time"
+
+        edited = dict(ruby_keymap.keyword_map, get_time=["hour please"], not_a_command=["x"])
+        ruby_keymap.rebuild_index(edited)
+        assert registry.get("get_time").phrases == ["hour please"]
+        assert "not_a_command" not in ruby_keymap.keyword_map
+    finally:
+        registry.replace_phrases("get_time", original)
+    assert ruby_keymap.keyword_map["get_time"] == original
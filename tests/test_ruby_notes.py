@@ -0,0 +1,131 @@
+import datetime
+
+import ruby_notes
+
+
+def _at(day, hour=9):
+    return datetime.datetime(2024, 5, day, hour, 0, 0)
+
+
+def test_append_keeps_text_format_and_indexes(tmp_path):
+    path = tmp_path / "notes.txt"
+    store = ruby_notes.NotesStore(str(path))
+    store.append("Buy milk and eggs", when=_at(1))
+    store.append("Call the dentist", when=_at(2))
+    store.append("milk the cows", when=_at(3))
+
+    text = path.read_text(encoding="utf-8")
+    assert text.startswith("\n" + "-" * 40 + "\n[2024-05-01 09:00:00]\nBuy milk and eggs\n")
+
+    assert [n.body for n in store.search("milk")] == ["milk the cows", "Buy milk and eggs"]
+    assert [n.body for n in store.search("MILK eggs")] == ["Buy milk and eggs"]
+    assert [n.body for n in store.search(start="2024-05-02", end="2024-05-02")] == ["Call the dentist"]
+    assert store.search("milk", end="2024-05-01")[0].body == "Buy milk and eggs"
+
+
+def test_index_catches_up_incrementally(tmp_path):
+    path = tmp_path / "notes.txt"
+    store = ruby_notes.NotesStore(str(path))
+    store.append("first note", when=_at(1))
+    # something else appends to the file directly
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(ruby_notes.format_note("written elsewhere", _at(2)))
+    assert store.index.sync() == 1
+    assert store.index.sync() == 0
+    assert [n.body for n in store.search("elsewhere")] == ["written elsewhere"]
+
+    # a replaced file is reindexed from scratch
+    path.write_text(ruby_notes.format_note("brand new", _at(3)), encoding="utf-8")
+    assert [n.body for n in store.search()] == ["brand new"]
+
+
+def test_clear_empties_file_and_index(tmp_path):
+    path = tmp_path / "notes.txt"
+    store = ruby_notes.NotesStore(str(path))
+    store.append("temporary")
+    store.clear()
+    assert path.read_text() == ""
+    assert store.search("temporary") == []
+
+
+def _write_notes(path, days):
+    with open(path, "w", encoding="utf-8") as f:
+        for day in days:
+            f.write(ruby_notes.format_note(f"note for day {day}\nsecond line", _at(day)))
+
+
+def test_last_notes_read_backwards(tmp_path):
+    path = tmp_path / "notes.txt"
+    _write_notes(path, range(1, 11))
+    last = list(ruby_notes.iter_last_notes(str(path), 3))
+    assert [n.body.splitlines()[0] for n in last] == ["note for day 10", "note for day 9", "note for day 8"]
+    assert list(ruby_notes.iter_last_notes(str(path), 50))[-1].timestamp == "2024-05-01 09:00:00"
+    assert list(ruby_notes.iter_last_notes(str(tmp_path / "missing.txt"), 3)) == []
+
+
+def test_range_reads_binary_search(tmp_path):
+    path = tmp_path / "notes.txt"
+    _write_notes(path, [1, 2, 2, 5, 7, 9, 12, 30])
+    days = lambda notes: [int(n.timestamp[8:10]) for n in notes]
+    assert days(ruby_notes.iter_notes_between(str(path), "2024-05-02", "2024-05-07")) == [2, 2, 5, 7]
+    assert days(ruby_notes.iter_notes_between(str(path), "2024-05-03", "2024-05-04")) == []
+    assert days(ruby_notes.iter_notes_between(str(path), "2024-05-10")) == [12, 30]
+    assert days(ruby_notes.iter_notes_between(str(path), end="2024-05-01")) == [1]
+    assert days(ruby_notes.iter_notes(str(path))) == [1, 2, 2, 5, 7, 9, 12, 30]
+
+
+def test_size_rotation_compresses_and_records_ranges(tmp_path):
+    import gzip
+
+    path = tmp_path / "notes.txt"
+    store = ruby_notes.NotesStore(str(path), rotate="size", max_bytes=200)
+    for day in range(1, 8):
+        store.append(f"entry {day} " + "x" * 40, when=_at(day))
+
+    segments = store.segments()
+    assert len(segments) >= 2
+    assert segments[0]["start"] == "2024-05-01 09:00:00"
+    assert all(s["file"].endswith(".txt.gz") for s in segments)
+    # sealed segments keep the plain-text block format
+    with gzip.open(tmp_path / "notes.segments" / segments[0]["file"], "rt", encoding="utf-8") as f:
+        assert f.read().startswith("\n" + "-" * 40 + "\n[2024-05-01 09:00:00]\nentry 1")
+    assert path.stat().st_size <= 200
+
+    # search, tail and range reads see sealed and active notes alike
+    assert [n.body.split()[1] for n in store.search("entry")] == ["7", "6", "5", "4", "3", "2", "1"]
+    assert [n.body.split()[1] for n in store.last(5)] == ["7", "6", "5", "4", "3"]
+
+    opened = []
+    original = store._open_segment
+    store._open_segment = lambda seg: opened.append(seg["file"]) or original(seg)
+    in_range = [n.body.split()[1] for n in store.between("2024-05-01", "2024-05-02")]
+    assert in_range == ["1", "2"]
+    # only segments whose recorded range overlaps the query were opened
+    assert opened == [s["file"] for s in segments if s["start"] < "2024-05-03"]
+    assert len(opened) < len(segments)
+
+
+def test_day_rotation_and_retention(tmp_path):
+    path = tmp_path / "notes.txt"
+    store = ruby_notes.NotesStore(str(path), rotate="day", compression="lzma", max_segments=2)
+    for day in (1, 1, 2, 3, 4):
+        store.append(f"day {day}", when=_at(day))
+    segments = store.segments()
+    # days 1, 2 and 3 were sealed; only the newest two segments are kept
+    assert [s["start"][:10] for s in segments] == ["2024-05-02", "2024-05-03"]
+    assert segments[0]["file"].endswith(".txt.xz")
+    assert [n.body for n in store.search("day")] == ["day 4", "day 3", "day 2"]
+
+    store.retention_days = 1
+    dropped = store.apply_retention(now=_at(4, hour=8))
+    assert [s["start"][:10] for s in dropped] == ["2024-05-02"]
+
+    store.clear()
+    assert store.segments() == [] and store.search() == []
+
+
+def test_shared_store_leaves_the_plain_file_alone_unless_asked(monkeypatch, tmp_path):
+    monkeypatch.delenv(ruby_notes.ROTATE_ENV, raising=False)
+    assert ruby_notes.notes_store(str(tmp_path / "plain.txt")).rotate is None
+    monkeypatch.setenv(ruby_notes.ROTATE_ENV, "day")
+    assert ruby_notes.notes_store(str(tmp_path / "rotated.txt")).rotate == "day"
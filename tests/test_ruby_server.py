@@ -0,0 +1,203 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+import ruby_notes
+import ruby_server
+from ruby_commands import registry
+
+
+async def _request(reader, writer, method, path, payload=None, raw=None, headers=None):
+    body = raw if raw is not None else (json.dumps(payload).encode("utf-8") if payload is not None else b"")
+    headers = {"Host": "localhost", "Content-Length": str(len(body)), **(headers or {})}
+    head = "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+    writer.write(f"{method} {path} HTTP/1.1\r\n{head}\r\n".encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split(b" ")[1])
+    length = 0
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+def _serve(scenario, **options):
+    async def main():
+        server = ruby_server.RubyServer(use_llama=False, **options)
+        await server.start(port=0)
+        host, port = server.address[:2]
+
+        async def connect():
+            return await asyncio.open_connection(host, port)
+
+        try:
+            return await scenario(server, connect)
+        finally:
+            await server.close()
+
+    return asyncio.run(main())
+
+
+def test_sessions_keep_their_own_prompt_state(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+    async def scenario(server, connect):
+        a, b = await connect(), await connect()
+        _, first = await _request(*a, "POST", "/v1/turn", {"text": "please take a note"})
+        session = first["session"]
+        # Another client's turn in between doesn't disturb the pending note
+        _, other = await _request(*b, "POST", "/v1/turn", {"text": "what time is it"})
+        _, second = await _request(*a, "POST", "/v1/turn", {"session": session, "text": "n"})
+        _, third = await _request(*a, "POST", "/v1/turn", {"session": session, "text": "buy milk"})
+        return first, other, second, third
+
+    first, other, second, third = _serve(scenario)
+    assert first["command"] == "take_note" and first["prompt"]["key"] == "session" and not first["done"]
+    assert first["spoken"] == ["Do you want to start a new session?"]
+    assert other["command"] == "get_time" and other["session"] != first["session"]
+    assert second["prompt"]["key"] == "note"
+    assert second["spoken"] == ["Continuing in existing session. What should I write?"]
+    assert third["done"] and third["answers"] == {"session": "n", "note": "buy milk"}
+    assert third["spoken"][-1] == "Note saved."
+    assert ruby_notes.notes_store(str(tmp_path / "notes.txt")).last(1)[0].body == "buy milk"
+
+
+def test_turns_run_concurrently():
+    # Each turn only finishes once all six are running at the same time;
+    # turns run one after another would break the barrier instead
+    barrier = threading.Barrier(6, timeout=10)
+    registry.register("slow_thing", ["do the slow thing"], barrier.wait)
+
+    async def scenario(server, connect):
+        async def one():
+            conn = await connect()
+            return await _request(*conn, "POST", "/v1/turn", {"text": "do the slow thing"})
+
+        results = await asyncio.gather(*[one() for _ in range(6)])
+        return results, server.stats()
+
+    try:
+        results, stats = _serve(scenario, workers=6)
+    finally:
+        registry.unregister("slow_thing")
+    assert all(status == 200 and r["command"] == "slow_thing" and "error" not in r for status, r in results)
+    assert not barrier.broken
+    assert stats["turns"] == 6 and stats["errors"] == 0
+
+
+def test_errors_and_unix_socket(tmp_path):
+    path = str(tmp_path / "ruby.sock")
+
+    async def main():
+        server = ruby_server.RubyServer(use_llama=False)
+        await server.start(path=path)
+        try:
+            conn = await asyncio.open_unix_connection(path)
+            health = await _request(*conn, "GET", "/v1/health")
+            missing = await _request(*conn, "POST", "/v1/turn", {"session": "nope", "text": "hi"})
+            created = await _request(*conn, "POST", "/v1/sessions")
+            closed = await _request(*conn, "DELETE", f"/v1/sessions/{created[1]['session']}")
+            bad = await _request(*conn, "POST", "/v1/turn", raw=b"{not json")
+            return health, missing, created, closed, bad
+        finally:
+            await server.close()
+
+    health, missing, created, closed, bad = asyncio.run(main())
+    assert health == (200, {"ok": True})
+    assert missing[0] == 404
+    assert created[0] == 201 and closed == (200, {"closed": created[1]["session"]})
+    assert bad[0] == 400
+
+
+@pytest.mark.parametrize("ttl, kept", [(60, 1), (0, 0)])
+def test_idle_sessions_expire(ttl, kept):
+    async def main():
+        server = ruby_server.RubyServer(use_llama=False, session_ttl=ttl)
+        server.open_session()
+        await asyncio.sleep(0.01)
+        server.open_session()
+        return len(server.sessions)
+
+    assert asyncio.run(main()) == kept + 1
+
+
+def test_turns_prune_idle_sessions():
+    async def main():
+        server = ruby_server.RubyServer(use_llama=False, session_ttl=0)
+        stale = server.open_session()
+        await asyncio.sleep(0.01)
+        result = await server.turn("what time is it")
+        return stale.id, result["session"], set(server.sessions)
+
+    stale, fresh, left = asyncio.run(main())
+    assert stale not in left and fresh in left
+
+
+@pytest.mark.parametrize("session", [{}, [], 7])
+def test_non_string_session_is_a_400(session):
+    async def scenario(server, connect):
+        conn = await connect()
+        return await _request(*conn, "POST", "/v1/turn", {"text": "hi", "session": session})
+
+    assert _serve(scenario) == (400, {"error": "\"session\" must be a string"})
+
+
+def test_unexpected_errors_are_answered_with_a_500(monkeypatch):
+    async def broken(method, path, body):
+        raise RuntimeError("boom")
+
+    async def scenario(server, connect):
+        monkeypatch.setattr(server, "dispatch", broken)
+        conn = await connect()
+        return await _request(*conn, "GET", "/v1/health")
+
+    assert _serve(scenario) == (500, {"error": "internal server error"})
+
+
+def test_print_only_commands_answer_over_the_api(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    ruby_notes.notes_store(str(tmp_path / "notes.txt")).append("buy milk")
+
+    async def scenario(server, connect):
+        conn = await connect()
+        _, info = await _request(*conn, "POST", "/v1/turn", {"text": "system info"})
+        _, notes = await _request(*conn, "POST", "/v1/turn", {"text": "read notes"})
+        return info, notes
+
+    info, notes = _serve(scenario)
+    assert info["spoken"] and info["spoken"][0].startswith("=== System Info ===")
+    assert notes["spoken"][-1] == "buy milk"
+
+
+def test_rejects_browser_and_rebound_requests():
+    async def scenario(server, connect):
+        results = {}
+        for name, headers in [("origin", {"Origin": "https://evil.example"}),
+                              ("rebound", {"Host": "evil.example:8765"}),
+                              ("ipv6", {"Host": "[::1]:8765"}),
+                              ("loopback", {"Host": "127.0.0.1:8765"})]:
+            conn = await connect()
+            results[name] = (await _request(*conn, "GET", "/v1/health", headers=headers))[0]
+        return results
+
+    assert _serve(scenario) == {"origin": 403, "rebound": 403, "ipv6": 200, "loopback": 200}
+
+
+@pytest.mark.parametrize("length", ["abc", "-5"])
+def test_bad_content_length_is_a_400(length):
+    async def scenario(server, connect):
+        conn = await connect()
+        return await _request(*conn, "POST", "/v1/turn", raw=b"{}", headers={"Content-Length": length})
+
+    status, payload = _serve(scenario)
+    assert status == 400 and payload == {"error": "invalid Content-Length"}
+
+
+def test_only_listens_on_loopback():
+    server = ruby_server.RubyServer(use_llama=False)
+    with pytest.raises(ValueError):
+        asyncio.run(server.start(host="0.0.0.0", port=0))
+
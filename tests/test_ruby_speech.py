@@ -0,0 +1,246 @@
+import threading
+import time
+
+import pytest
+
+import ruby_speech
+
+
+class FakeBackend:
+    name = "fake"
+
+    def __init__(self, gate=None):
+        self.opened = 0
+        self.spoken = []
+        self.stopped = 0
+        self.gate = gate
+        self.speaking = threading.Event()
+
+    def open(self):
+        self.opened += 1
+
+    def speak(self, segment):
+        self.spoken.append(segment)
+        self.speaking.set()
+        if self.gate is not None:
+            self.gate.wait(2)
+
+    def stop(self):
+        self.stopped += 1
+        if self.gate is not None:
+            self.gate.set()
+
+
+def test_engine_opened_once_and_segments_spoken_in_order():
+    backend = FakeBackend()
+    worker = ruby_speech.SpeechWorker([backend])
+    worker.submit("one|two").wait(2)
+    worker.submit("three").wait(2)
+    assert backend.opened == 1
+    assert backend.spoken == ["one", "two", "three"]
+    worker.shutdown(2)
+
+
+def test_non_blocking_handle_and_interrupt():
+    gate = threading.Event()
+    backend = FakeBackend(gate)
+    worker = ruby_speech.SpeechWorker([backend])
+    first = worker.submit("long sentence|never spoken")
+    queued = worker.submit("also dropped")
+    assert backend.speaking.wait(2)
+    assert not first.done
+    worker.interrupt()
+    assert first.wait(2) and first.cancelled
+    assert queued.wait(2) and queued.cancelled
+    assert backend.stopped == 1
+    assert backend.spoken == ["long sentence"]
+    worker.shutdown(2)
+
+
+def test_unavailable_backend_falls_back():
+    class Broken(FakeBackend):
+        def open(self):
+            raise OSError("no engine")
+
+    backend = FakeBackend()
+    worker = ruby_speech.SpeechWorker([Broken(), backend])
+    worker.submit("hello").wait(2)
+    assert worker.backend is backend
+    worker.shutdown(2)
+
+
+def test_a_failing_segment_only_mutes_its_own_utterance(capsys):
+    class Flaky(FakeBackend):
+        def speak(self, segment):
+            if segment == "boom":
+                raise OSError("afplay crashed")
+            super().speak(segment)
+
+    backend = Flaky()
+    worker = ruby_speech.SpeechWorker([backend])
+    worker.submit("boom|rest of it").wait(2)
+    worker.submit("next time").wait(2)
+    worker.shutdown(2)
+    # The failed utterance is printed; the following one uses the engine again
+    assert "Ruby says: boom" in capsys.readouterr().out
+    assert backend.spoken == ["next time"] and worker.backend is backend
+
+
+def test_chunk_sentences_cuts_at_sentence_and_clause_boundaries():
+    pieces = ["Hel", "lo there", ". How ", "are you? I am", " fine"]
+    assert list(ruby_speech.chunk_sentences(pieces)) == [
+        "Hello there.", "How are you?", "I am fine",
+    ]
+    long_clause = ["word, " * 20]
+    chunks = list(ruby_speech.chunk_sentences(long_clause, clause_min=30))
+    assert len(chunks) > 1 and all(len(c) <= 200 for c in chunks)
+
+
+class RenderPlayBackend:
+    """Pipelinable backend: rendering and playback each take `delay` seconds."""
+
+    name = "render-play"
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.events = []
+        self.discarded = []
+
+    def open(self):
+        pass
+
+    def prepare(self, segment):
+        self.events.append(("render", segment, time.monotonic()))
+        time.sleep(self.delay)
+        return segment
+
+    def play(self, prepared):
+        self.events.append(("play", prepared, time.monotonic()))
+        time.sleep(self.delay)
+        self.events.append(("played", prepared, time.monotonic()))
+
+    def discard(self, prepared):
+        self.discarded.append(prepared)
+
+    def speak(self, segment):
+        self.play(self.prepare(segment))
+
+    def stop(self):
+        pass
+
+
+class GatedBackend(RenderPlayBackend):
+    """Playback of a segment only ends once the next one has been rendered."""
+
+    def __init__(self, segments):
+        super().__init__(delay=0)
+        self.segments = segments
+        self.rendered = {seg: threading.Event() for seg in segments}
+        self.overlapped = []
+
+    def prepare(self, segment):
+        self.events.append(("render", segment))
+        self.rendered[segment].set()
+        return segment
+
+    def play(self, prepared):
+        self.events.append(("play", prepared))
+        following = self.segments.index(prepared) + 1
+        if following < len(self.segments):
+            # Without pipelining the next render only starts after this returns
+            self.overlapped.append(self.rendered[self.segments[following]].wait(5))
+        self.events.append(("played", prepared))
+
+
+def test_next_segment_renders_while_current_one_plays():
+    segments = ["one", "two", "three", "four"]
+    backend = GatedBackend(segments)
+    worker = ruby_speech.SpeechWorker(backends=[backend])
+    assert worker.submit("|".join(segments), pause=0.01).wait(30)
+    worker.shutdown(5)
+
+    # Every next segment was rendered while the current one was still playing,
+    # so the gap between them is the pause alone, not pause plus synthesis
+    assert backend.overlapped == [True, True, True]
+    order = backend.events.index
+    for prev, nxt in zip(segments, segments[1:]):
+        assert order(("render", nxt)) < order(("played", prev)) < order(("play", nxt))
+    assert [seg for kind, seg in backend.events if kind == "play"] == segments
+
+
+def test_interrupt_discards_the_prerendered_segment():
+    backend = RenderPlayBackend(delay=0.1)
+    worker = ruby_speech.SpeechWorker(backends=[backend])
+    handle = worker.submit("one|two", pause=1.0)
+    time.sleep(0.3)  # "one" has played; "two" is rendered and waiting out the pause
+    handle.cancel()
+    assert handle.wait(2)
+    worker.shutdown(5)
+    assert [seg for kind, seg, _ in backend.events if kind == "play"] == ["one"]
+    assert backend.discarded == ["two"]
+
+
+class FakeClock:
+    """Clock that moves only when speech plays or a pause is waited out."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.waits = []
+
+    def __call__(self):
+        return self.now
+
+    def event(self):
+        clock = self
+
+        class Event(threading.Event):
+            def wait(self, timeout=None):
+                if timeout is not None and not self.is_set():
+                    clock.waits.append(timeout)
+                    clock.now += timeout
+                return self.is_set()
+
+        return Event()
+
+
+class TimedBackend(FakeBackend):
+    """Every segment plays for exactly one second on the fake clock."""
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+        self.events = []
+
+    def speak(self, segment):
+        self.events.append(("play", segment, self.clock()))
+        self.clock.now += 1.0
+
+
+class PipelinedTimedBackend(TimedBackend):
+    def prepare(self, segment):
+        return segment
+
+    def play(self, prepared):
+        self.speak(prepared)
+
+    def discard(self, prepared):
+        pass
+
+
+@pytest.mark.parametrize("backend_class", [TimedBackend, PipelinedTimedBackend])
+def test_pause_between_segments_is_exact(monkeypatch, backend_class):
+    clock = FakeClock()
+
+    class Handle(ruby_speech.SpeechHandle):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._cancelled = clock.event()
+
+    monkeypatch.setattr(ruby_speech, "SpeechHandle", Handle)
+    backend = backend_class(clock)
+    worker = ruby_speech.SpeechWorker(backends=[backend], clock=clock)
+    assert worker.submit("one|two|three", pause=0.25).wait(5)
+    worker.shutdown(5)
+    # Each pause starts when the previous segment ends and lasts exactly `pause`
+    assert clock.waits == [0.25, 0.25]
+    assert [at for _, _, at in backend.events] == [0.0, 1.25, 2.5]
@@ -0,0 +1,71 @@
+import socket
+import time
+
+import ruby_sysinfo
+
+
+def test_snapshot_is_instant_and_has_static_fields():
+    sampler = ruby_sysinfo.SystemSampler(interval=60)
+    started = time.monotonic()
+    info = sampler.snapshot()
+    assert time.monotonic() - started < 0.5
+    for key in ("OS", "CPU", "Hostname", "Local IP", "RAM Total (GB)"):
+        assert key in info
+    assert "time" not in info
+
+
+def test_local_ip_does_not_use_dns(monkeypatch):
+    def no_dns(*args):
+        raise AssertionError("DNS lookup attempted")
+
+    monkeypatch.setattr(socket, "gethostbyname", no_dns)
+    assert isinstance(ruby_sysinfo.local_ip(), str)
+
+
+def test_ring_buffer_and_window_stats():
+    readings = iter([10.0, 30.0, 20.0, 90.0])
+
+    def fake_collect():
+        return {"time": time.time(), "CPU Usage %": next(readings), "RAM Used (GB)": None}
+
+    sampler = ruby_sysinfo.SystemSampler(history=3, collect=fake_collect)
+    for _ in range(4):
+        sampler._record()
+    assert sampler.latest()["CPU Usage %"] == 90.0
+    stats = sampler.stats(window=60)
+    # the oldest reading fell out of the ring buffer
+    assert stats["CPU Usage %"] == {"min": 20.0, "avg": 46.67, "max": 90.0}
+    assert "RAM Used (GB)" not in stats
+
+
+def test_cpu_counter_is_primed_before_the_first_reading():
+    events = []
+
+    def fake_collect():
+        events.append("collect")
+        return {"time": time.time(), "CPU Usage %": 12.5}
+
+    sampler = ruby_sysinfo.SystemSampler(interval=60, collect=fake_collect,
+                                         prime=lambda: events.append("prime"), warmup=0)
+    assert sampler.latest()["CPU Usage %"] == 12.5
+    assert events == ["prime", "collect"]
+
+    events.clear()
+    started = ruby_sysinfo.SystemSampler(interval=60, collect=fake_collect,
+                                         prime=lambda: events.append("prime"), warmup=0.05)
+    started.start()
+    try:
+        # The first request waits for the primed background sample instead of taking its own
+        assert started.latest()["CPU Usage %"] == 12.5
+        assert events == ["prime", "collect"]
+    finally:
+        started.stop(1)
+
+
+def test_sample_interval_comes_from_the_environment(monkeypatch):
+    monkeypatch.setenv(ruby_sysinfo.INTERVAL_ENV, "0.5")
+    assert ruby_sysinfo.sample_interval() == 0.5
+    monkeypatch.setenv(ruby_sysinfo.INTERVAL_ENV, "often")
+    assert ruby_sysinfo.sample_interval() == ruby_sysinfo.DEFAULT_INTERVAL
+    monkeypatch.delenv(ruby_sysinfo.INTERVAL_ENV)
+    assert ruby_sysinfo.sample_interval() == ruby_sysinfo.DEFAULT_INTERVAL
@@ -0,0 +1,65 @@
+import threading
+
+import ruby_timers
+
+
+class FakeClock:
+    """Monotonic clock that only moves when speech "takes time"."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            return self.now
+
+    def advance(self, seconds):
+        with self.lock:
+            self.now += seconds
+
+
+def test_slow_speech_skips_stale_ticks_without_drifting():
+    clock = FakeClock()
+    spoken = []
+
+    def slow_speak(text):
+        spoken.append((clock(), text))
+        # every announcement takes 2.5 ticks to say
+        clock.advance(2.5)
+
+    service = ruby_timers.TimerService(speak=slow_speak, clock=clock, tick=1.0)
+    timer = service.start(10)
+    assert timer.wait(2)
+    texts = [t for _, t in spoken]
+    assert texts[0] == "10"
+    assert texts[-1] == "Time's up!"
+    # ticks were coalesced instead of each number being read out late
+    assert len(texts) < 11
+    # nothing is announced after the deadline except "Time's up!"
+    assert all(at < timer.deadline for at, text in spoken[:-1])
+
+
+def test_concurrent_named_timers_list_and_cancel():
+    spoken = []
+    service = ruby_timers.TimerService(speak=spoken.append, tick=0.01)
+    tea = service.start(100, name="tea")
+    eggs = service.start(300, name="eggs")
+    assert [t.name for t in service.list()] == ["tea", "eggs"]
+    assert service.cancel("tea") is tea
+    assert tea.wait(1) and tea.cancelled
+    assert [t.name for t in service.list()] == ["eggs"]
+    assert service.cancel() is eggs
+    assert eggs.wait(1)
+    assert service.list() == []
+    assert not any("Time's up" in s for s in spoken)
+
+
+def test_auto_numbered_names_skip_names_already_in_use():
+    service = ruby_timers.TimerService(speak=lambda text: None, tick=0.01)
+    mine = service.start(100, name="timer 1")
+    auto = service.start(100)
+    assert auto.name == "timer 2"
+    service.cancel()
+    service.cancel()
+    assert mine.wait(1) and auto.wait(1)
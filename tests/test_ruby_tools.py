@@ -1,10 +1,10 @@
 import builtins
 import io
 import os
-import time
 import importlib
 import pytest
 
+import ruby_timers
 import ruby_tools
 
 
@@ -23,12 +23,22 @@ def test_countdown_with_numeric(monkeypatch):
         calls.append(msg)
 
     monkeypatch.setattr(ruby_tools, "ruby_speak", fake_speak)
-    # avoid actually sleeping
-    monkeypatch.setattr(time, "sleep", lambda s: None)
+    # run the background timer with 10ms ticks instead of seconds
+    service = ruby_timers.TimerService(speak=lambda text: ruby_tools.ruby_speak(text), tick=0.01)
+    monkeypatch.setattr(ruby_tools, "_timer_service", service)
 
-    ruby_tools.countdown("3")
+    timer = ruby_tools.countdown("3")
+    assert timer.wait(2)
     # expect countdown messages including "Time's up!"
-    assert any("Time's up" in c for c in calls) or any("Time's up" in c for c in calls)
+    assert calls[0] == "Starting countdown for 3 seconds now."
+    assert any("Time's up" in c for c in calls)
+
+
+def test_countdown_invalid_duration(monkeypatch):
+    calls = []
+    monkeypatch.setattr(ruby_tools, "ruby_speak", lambda msg, pause=0: calls.append(msg))
+    assert ruby_tools.countdown("soon") is None
+    assert calls == ["Please enter a valid number."]
 
 
 def test_take_note_new_session_and_write(monkeypatch, tmp_path):
@@ -74,3 +84,48 @@ def test_take_note_continuing_session(monkeypatch, tmp_path):
     notes = tmp_path / "notes.txt"
     assert notes.exists()
     assert "a quick note" in notes.read_text(encoding="utf-8")
+
+
+def test_speak_stream_starts_before_generation_ends(monkeypatch):
+    events = []
+
+    def fake_speak(msg, pause=0, block=True):
+        events.append(("speak", msg))
+
+    def tokens():
+        for piece in ["First sentence. ", "Second ", "sentence."]:
+            events.append(("token", piece))
+            yield piece
+
+    monkeypatch.setattr(ruby_tools, "ruby_speak", fake_speak)
+    text = ruby_tools.speak_stream(tokens())
+    assert text == "First sentence. Second sentence."
+    # the first sentence is spoken before the last token arrives
+    assert events.index(("speak", "First sentence.")) < events.index(("token", "sentence."))
+
+
+def test_search_notes_with_date_filter(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ruby_tools, "ruby_speak", lambda *a, **k: None)
+    inputs = iter(["n", "pick up the parcel"])
+    monkeypatch.setattr(builtins, "input", lambda prompt="": next(inputs))
+    ruby_tools.take_note()
+
+    assert [n.body for n in ruby_tools.search_notes("parcel")] == ["pick up the parcel"]
+    assert ruby_tools.search_notes("parcel to:2000-01-01") == []
+
+
+def test_countdown_reports_a_name_already_taken(monkeypatch):
+    calls = []
+    monkeypatch.setattr(ruby_tools, "ruby_speak", lambda msg, pause=0: calls.append(msg))
+
+    class Taken:
+        def list(self):
+            return []
+
+        def start(self, seconds, name=None):
+            raise ValueError(f"A timer named {name!r} is already running.")
+
+    monkeypatch.setattr(ruby_tools, "_timer_service", Taken())
+    assert ruby_tools.countdown("5", name="tea") is None
+    assert calls[-1] == "A timer called tea is already running."
@@ -0,0 +1,58 @@
+import json
+import time
+
+import ruby_keymap
+import ruby_trace
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_spans_are_written_per_turn(tmp_path):
+    tracer = ruby_trace.Tracer(str(tmp_path / "trace.jsonl"))
+    with tracer.turn("what time is it"):
+        with ruby_trace.span("match") as span:
+            span.set(source="keyword")
+        with ruby_trace.span("action", command="get_time"):
+            time.sleep(0.01)
+    records = _read(tracer.path)
+    assert [r["stage"] for r in records] == ["match", "action", "turn"]
+    assert records[0]["source"] == "keyword"
+    assert records[1]["ms"] >= 10 and records[1]["start_ms"] >= records[0]["start_ms"]
+    assert records[2]["utterance"] == "what time is it"
+    assert len({r["turn"] for r in records}) == 1
+
+
+def test_spans_are_noops_when_tracing_is_off(monkeypatch, tmp_path):
+    monkeypatch.delenv(ruby_trace.TRACE_ENV, raising=False)
+    with ruby_trace.turn("hello") as turn:
+        with ruby_trace.span("match") as span:
+            span.set(source="none")
+    assert turn is ruby_trace._NULL and span is ruby_trace._NULL
+    assert not list(tmp_path.rglob("*.jsonl"))
+
+
+def test_model_span_follows_the_turn_into_the_worker_thread(monkeypatch, tmp_path):
+    monkeypatch.setenv(ruby_trace.TRACE_ENV, str(tmp_path / "trace.jsonl"))
+    monkeypatch.setattr(ruby_keymap, "classify_llama", lambda prompt, model="mistral": ("tiny", "get_time"))
+    with ruby_trace.turn("whats the hour mate"):
+        assert ruby_keymap.classify("whats the hour mate", budget=5).command == "get_time"
+    model = [r for r in _read(tmp_path / "trace.jsonl") if r["stage"] == "model"]
+    # The span names the model that answered, e.g. a hedge's fallback
+    assert model and model[0]["model"] == "tiny"
+
+
+def test_rotation_and_summary(tmp_path):
+    tracer = ruby_trace.Tracer(str(tmp_path / "trace.jsonl"), max_bytes=2000, backups=2)
+    for i in range(200):
+        tracer.write([{"turn": str(i), "stage": "match", "ms": float(i)}])
+    files = tracer.files()
+    assert len(files) == 3 and files[-1] == tracer.path
+    assert all(len(open(p, "rb").read()) <= 2000 for p in files)
+
+    summary = ruby_trace.summarize(files)["match"]
+    assert summary["max"] == 199.0 and summary["p50"] <= summary["p95"] <= summary["p99"] <= 199.0
+    # The oldest spans were rotated out
+    assert summary["n"] < 200
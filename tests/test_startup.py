@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_optional_backends_are_not_imported_at_startup():
+    # Run in a fresh interpreter: this test session has imported them already
+    code = (
+        "import sys, ruby_tools, ruby_keymap, ruby_commands\n"
+        "print(','.join(m for m in ('llm_client', 'asyncio', 'pyttsx3', 'psutil', 'numpy') if m in sys.modules))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
+
+
+def test_startup_benchmark_parses_importtime():
+    sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+    try:
+        import bench_startup
+    finally:
+        sys.path.pop(0)
+    rows = bench_startup.parse_importtime(
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        450 | ruby_keymap\n"
+    )
+    assert rows == [("ruby_keymap", 120, 450)]